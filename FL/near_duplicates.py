@@ -0,0 +1,116 @@
+import re
+import hashlib
+from typing import Dict, List, Optional, Tuple
+
+HASH_BITS = 64
+SHINGLE_SIZE = 2
+LANE_LIMIT = 255
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+
+
+def _features(text: str) -> List[str]:
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return words
+    return [' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+
+BIT_LANES = bytes.maketrans(b'01', b'\x00\x01')
+
+
+def _feature_lanes(feature: str) -> int:
+    digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=HASH_BITS // 8).digest()
+    bits = format(int.from_bytes(digest, 'big'), f'0{HASH_BITS}b').encode('ascii').translate(BIT_LANES)
+    return int.from_bytes(bits, 'big')
+
+
+def simhash(text: str) -> Optional[int]:
+    features = _features(text or '')
+    if not features:
+        return None
+
+    counts = [0] * HASH_BITS
+    for start in range(0, len(features), LANE_LIMIT):
+        total = sum(_feature_lanes(feature) for feature in features[start:start + LANE_LIMIT])
+        for position, count in enumerate(total.to_bytes(HASH_BITS, 'big')):
+            counts[position] += count
+
+    half = len(features) / 2
+    return int(''.join('1' if count > half else '0' for count in counts), 2)
+
+
+def similarity(first: int, second: int) -> float:
+    return 1.0 - bin(first ^ second).count('1') / HASH_BITS
+
+
+def _band_ranges(count: int) -> List[Tuple[int, int]]:
+    count = max(1, min(count, HASH_BITS))
+    bounds = [round(i * HASH_BITS / count) for i in range(count + 1)]
+    return [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(count)]
+
+
+class NearDuplicateIndex:
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.max_distance = int((1.0 - threshold) * HASH_BITS)
+        self.bands = _band_ranges(self.max_distance + 1)
+        self.buckets: List[Dict[int, List[str]]] = [{} for _ in self.bands]
+        self.hashes: Dict[str, int] = {}
+        self.clusters: Dict[str, str] = {}
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.hashes
+
+    def _band_keys(self, value: int):
+        for band, (start, width) in enumerate(self.bands):
+            yield band, (value >> start) & ((1 << width) - 1)
+
+    def find(self, value: Optional[int]) -> Optional[str]:
+        if value is None:
+            return None
+
+        best_key = None
+        best_distance = self.max_distance + 1
+        for band, band_key in self._band_keys(value):
+            for key in self.buckets[band].get(band_key, ()):
+                distance = bin(value ^ self.hashes[key]).count('1')
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+                    if distance == 0:
+                        return best_key
+        return best_key
+
+    def cluster_of(self, key: str) -> Optional[str]:
+        return self.clusters.get(key)
+
+    def find_cluster(self, value: Optional[int]) -> Optional[str]:
+        key = self.find(value)
+        return self.clusters[key] if key is not None else None
+
+    def add(self, key: str, value: Optional[int], cluster_id: Optional[str] = None) -> str:
+        if key in self.hashes:
+            return self.clusters[key]
+
+        if cluster_id is None:
+            cluster_id = self.find_cluster(value) or key
+
+        self.clusters[key] = cluster_id
+        if value is not None:
+            self.hashes[key] = value
+            for band, band_key in self._band_keys(value):
+                self.buckets[band].setdefault(band_key, []).append(key)
+        return cluster_id
+
+    def stats(self) -> Dict[str, float]:
+        sizes = [len(keys) for buckets in self.buckets for keys in buckets.values()]
+        return {
+            'items': len(self.hashes),
+            'clusters': len(set(self.clusters.values())),
+            'bands': len(self.bands),
+            'max_distance': self.max_distance,
+            'avg_bucket': sum(sizes) / len(sizes) if sizes else 0.0
+        }
@@ -11,18 +11,62 @@ from datetime import datetime
 from yarl import URL
 import undetected_chromedriver as uc
 import re
+import sys
+from pathlib import Path
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from near_duplicates import NearDuplicateIndex, simhash
+from profiling import CycleProfiler
+from replay import FixtureRecorder, LISTING_SELECTOR
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from common.task_channel import TaskChannelPublisher, DEFAULT_BACKLOG
+from common.supervision import Heartbeat
+from common.metrics import REGISTRY, MetricsServer
+from common.tracing import mark, observe_trace, POSTED, DISCOVERED, DETAILS_FETCHED, PERSISTED, PARSER_STAGES
+from common.task_model import Task, parse_price, parse_count, publication_timestamp
+
+CYCLE_SECONDS = REGISTRY.histogram('fl_parser_cycle_seconds', 'Длительность цикла проверки ленты FL.ru')
+CYCLE_ERRORS = REGISTRY.counter('fl_parser_cycle_errors', 'Циклы проверки, завершившиеся ошибкой')
+PARSED_TASKS = REGISTRY.counter('fl_parser_tasks', 'Заказы из ленты FL.ru по результату обработки')
+DETAIL_FETCH_SECONDS = REGISTRY.histogram('fl_parser_detail_fetch_seconds', 'Время получения страницы заказа')
+STORED_TASKS = REGISTRY.gauge('fl_parser_stored_tasks', 'Заказов в processed_tasks.json')
+LAST_CYCLE = REGISTRY.gauge('fl_parser_last_cycle_timestamp_seconds', 'Время завершения последнего цикла проверки')
+PARSER_QUEUE_DEPTH = REGISTRY.gauge('fl_parser_queue_depth', 'Заказы, ожидающие передачи боту')
+
+PARSED_RESULTS = {
+    'found': 'found',
+    'new': 'new',
+    'duplicates': 'duplicate',
+    'near_duplicates': 'near_duplicate',
+    'has_executor': 'has_executor',
+    'skipped': 'skipped',
+    'detailed_info_obtained': 'detailed'
+}
 
 class WorkzilaParser:
-    def __init__(self, config_path: str = "config.json", cookies_path: str = "www.fl.ru_cookies.txt"):
+    def __init__(self, config_path: str = "config.json", cookies_path: str = "www.fl.ru_cookies.txt",
+                 task_queue: Optional[asyncio.Queue] = None, data_dir: Optional[str] = None):
         self.base_url = "https://www.fl.ru"
+        self.data_dir = data_dir or os.path.dirname(os.path.abspath(__file__))
+        self.tasks_path = os.path.join(self.data_dir, 'processed_tasks.json')
+        self.task_queue = task_queue
+        self.channel = None
+        self.profiler = CycleProfiler()
+        self.recorder = None
+        self.request_delay = (1, 3)
         self.ua = UserAgent()
         self.session = None
         self.config = self.load_config(config_path)
         self.cookies = self.load_cookies(cookies_path)
         self.processed_tasks = self.load_processed_tasks()
+        self.feed_path = os.path.join(self.data_dir, 'processed_tasks.jsonl')
+        self.unsaved_tasks = self.recover_from_feed()
+        self.history_save_batch = self.config.get('history_save_batch', 20)
+        self.next_seq = self.assign_sequence_numbers()
+        self.build_near_duplicate_indexes()
+        self.ensure_feed()
         self.categories = [
             {"name": "Сайты", "option_id": "vs1___option-0"},
             {"name": "Программирование", "option_id": "vs1___option-2"},
@@ -69,57 +113,161 @@ class WorkzilaParser:
         
         return cookies
 
-    def load_processed_tasks(self) -> Dict[str, Dict]:
+    def load_processed_tasks(self) -> Dict[str, Task]:
         try:
-            if os.path.exists('processed_tasks.json'):
-                with open('processed_tasks.json', 'r', encoding='utf-8') as f:
-                    return json.load(f)
+            if os.path.exists(self.tasks_path):
+                with open(self.tasks_path, 'r', encoding='utf-8') as f:
+                    tasks = json.load(f)
+                return {task_id: Task.from_record(record, task_id) for task_id, record in tasks.items()}
             return {}
         except Exception as e:
             print(f"Ошибка при загрузке истории заданий: {str(e)}")
             return {}
-            
-    def parse_publication_date(self, date_str: str) -> datetime:
+    
+    def recover_from_feed(self) -> int:
+        if not os.path.exists(self.feed_path):
+            return 0
+        
+        recovered = 0
         try:
-            main_date_str = date_str.split('[')[0].strip()
-            
-            pattern = r'(\d{2}\.\d{2}\.\d{4})\s*\|\s*(\d{2}:\d{2})'
-            match = re.search(pattern, main_date_str)
-            
-            if match:
-                date_part, time_part = match.groups()
-                return datetime.strptime(f"{date_part} {time_part}", "%d.%m.%Y %H:%M")
-            
-            return datetime.strptime(main_date_str, "%d.%m.%Y | %H:%M")
+            with open(self.feed_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    task_id = str(record.get('id') or '')
+                    if task_id and task_id not in self.processed_tasks:
+                        self.processed_tasks[task_id] = Task.from_record(record, task_id)
+                        recovered += 1
+        except OSError as e:
+            print(f"Ошибка при чтении ленты заказов: {str(e)}")
+        
+        if recovered:
+            print(f"Восстановлено из ленты заказов: {recovered}")
+        return recovered
             
-        except Exception as e:
-            print(f"Ошибка при парсинге даты '{date_str}': {e}")
-            return datetime.now()
+    def assign_sequence_numbers(self) -> int:
+        next_seq = max((task.seq or 0 for task in self.processed_tasks.values()), default=0) + 1
+        
+        unsequenced = [
+            (task_id, task) for task_id, task in self.processed_tasks.items()
+            if not task.seq
+        ]
+        unsequenced.sort(key=lambda x: x[1].published_ts)
+        for task_id, task in unsequenced:
+            task.seq = next_seq
+            next_seq += 1
+        
+        return next_seq
+    
+    def listing_text(self, task: Task) -> str:
+        return f"{task.title} {task.description}"
+    
+    def task_hashes(self, task: Task) -> Tuple[Optional[int], Optional[int]]:
+        description_hash = int(task.simhash, 16) if task.simhash else simhash(task.full_description)
+        listing_hash = int(task.listing_simhash, 16) if task.listing_simhash else simhash(self.listing_text(task))
+        return description_hash, listing_hash
+    
+    def index_task(self, task_id: str, task: Task, hashes: Optional[Tuple[Optional[int], Optional[int]]] = None) -> str:
+        description_hash, listing_hash = hashes or self.task_hashes(task)
+        cluster_id = self.description_index.add(task_id, description_hash, task.cluster_id)
+        self.listing_index.add(task_id, listing_hash, cluster_id)
+        return cluster_id
+    
+    def build_near_duplicate_indexes(self):
+        settings = self.config.get('near_duplicates', {})
+        self.near_duplicates_enabled = settings.get('enabled', True)
+        threshold = settings.get('threshold', 0.9)
+        
+        self.description_index = NearDuplicateIndex(threshold)
+        self.listing_index = NearDuplicateIndex(threshold)
+        for task_id, task in sorted(self.processed_tasks.items(), key=lambda x: x[1].seq or 0):
+            self.index_task(task_id, task)
+    
+    def find_near_duplicate(self, task: Task) -> Optional[str]:
+        if not self.near_duplicates_enabled:
+            return None
+        return self.listing_index.find(simhash(self.listing_text(task)))
     
     def save_processed_tasks(self):
         try:
-            for task_id, task_data in self.processed_tasks.items():
-                if 'responses_count' in task_data:
-                    del task_data['responses_count']
-                if 'responses_info' in task_data:
-                    del task_data['responses_info']
-            
             sorted_tasks = sorted(
                 self.processed_tasks.items(),
-                key=lambda x: self.parse_publication_date(x[1].get('publication_date', '')),
+                key=lambda x: x[1].published_ts,
                 reverse=True
             )
             
             self.processed_tasks = dict(sorted_tasks)
+            self.unsaved_tasks = 0
             
             print(f"Сохранено {len(self.processed_tasks)} заказов")
                     
-            with open('processed_tasks.json', 'w', encoding='utf-8') as f:
-                json.dump(self.processed_tasks, f, ensure_ascii=False, indent=2)
+            records = {task_id: task.to_record(with_id=False) for task_id, task in self.processed_tasks.items()}
+            with open(self.tasks_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
         except Exception as e:
             print(f"Ошибка при сохранении истории заданий: {str(e)}")
 
-    def is_task_processed(self, task_id: str, task_data: Dict) -> bool:
+    async def flush_processed_tasks(self):
+        if self.unsaved_tasks:
+            await asyncio.to_thread(self.save_processed_tasks)
+
+    def ensure_feed(self):
+        if os.path.exists(self.feed_path):
+            return
+        
+        try:
+            ordered_tasks = sorted(self.processed_tasks.values(), key=lambda task: task.seq)
+            with open(self.feed_path, 'w', encoding='utf-8') as f:
+                for task in ordered_tasks:
+                    f.write(json.dumps(task.to_record(), ensure_ascii=False) + '\n')
+            print(f"Лента заказов создана: {len(ordered_tasks)} записей")
+        except Exception as e:
+            print(f"Ошибка при создании ленты заказов: {str(e)}")
+    
+    def append_to_feed(self, task: Task):
+        try:
+            with open(self.feed_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(task.to_record(), ensure_ascii=False) + '\n')
+                f.flush()
+        except Exception as e:
+            print(f"Ошибка при записи в ленту заказов: {str(e)}")
+
+    async def start_channel(self):
+        settings = self.config.get('task_channel', {})
+        if not settings.get('enabled', False) or self.channel is not None:
+            return
+        
+        channel = TaskChannelPublisher(
+            settings.get('address', 'tcp://127.0.0.1:8765'),
+            latest_seq=self.next_seq - 1,
+            backlog=settings.get('backlog', DEFAULT_BACKLOG)
+        )
+        try:
+            await channel.start()
+            self.channel = channel
+        except OSError as e:
+            print(f"Не удалось открыть канал заказов: {e}. Бот получит заказы из файла")
+    
+    async def stop_channel(self):
+        if self.channel is not None:
+            await self.channel.stop()
+            self.channel = None
+    
+    async def publish_task(self, task_id: str):
+        record = self.processed_tasks[task_id].to_record()
+        if self.channel is not None:
+            self.channel.publish(record['seq'], record)
+        
+        if self.task_queue is None:
+            return
+        
+        if self.task_queue.full():
+            print(f"Очередь заказов заполнена ({self.task_queue.maxsize}), ожидаем бота...")
+        await self.task_queue.put(record)
+
+    def is_task_processed(self, task_id: str, task_data: Task) -> bool:
         if task_id in self.processed_tasks:
             return True
         return False
@@ -204,10 +352,13 @@ class WorkzilaParser:
     async def fetch_page(self, url: str) -> Optional[str]:
         await self.init_session()
         try:
-            await asyncio.sleep(random.uniform(1, 3))
+            await asyncio.sleep(random.uniform(*self.request_delay))
             async with self.session.get(url, headers=self.get_headers()) as response:
                 if response.status == 200:
-                    return await response.text()
+                    html = await response.text()
+                    if self.recorder is not None:
+                        self.recorder.save_detail(url, html)
+                    return html
                 print(f"Ошибка при получении страницы {url}: {response.status}")
                 return None
         except Exception as e:
@@ -280,32 +431,89 @@ class WorkzilaParser:
             print(traceback.format_exc())
             return detailed_info
 
-    def save_task(self, task: Dict):
-        task_id = task['id']
+    def save_task(self, task: Task, save_history: bool = True):
+        task_id = task.id
         
         if self.is_task_processed(task_id, task):
             print(f"Задание {task_id} уже было обработано ранее")
             return False
-            
-        self.processed_tasks[task_id] = {
-            'price': task['price'],
-            'price_text': task['price_text'],
-            'payment_type': task['payment_type'],
-            'description': task['description'],
-            'title': task['title'],
-            'url': task['url'],
-            'posted_time': task['posted_time'],
-            'views': task['views'],
-            'responses': task['responses'],
-            'full_description': task.get('full_description', ''),
-            'publication_date': task.get('publication_date', ''),
-            'processed_at': datetime.now().isoformat()
-        }
         
-        self.save_processed_tasks()
+        task.processed_at = datetime.now().isoformat()
+        task.seq = self.next_seq
+        task.published_ts = publication_timestamp(task)
+        self.processed_tasks[task_id] = task
+        self.next_seq += 1
+        
+        description_hash, listing_hash = simhash(task.full_description), simhash(self.listing_text(task))
+        task.simhash = format(description_hash, '016x') if description_hash is not None else ''
+        task.listing_simhash = format(listing_hash, '016x') if listing_hash is not None else ''
+        task.cluster_id = self.index_task(task_id, task, (description_hash, listing_hash))
+        if task.cluster_id != task_id:
+            print(f"Задание {task_id} похоже на ранее сохраненное {task.cluster_id}")
+        
+        mark(task, PERSISTED)
+        if save_history:
+            self.save_processed_tasks()
+        else:
+            self.unsaved_tasks += 1
+        self.append_to_feed(task)
+        observe_trace({POSTED: task.published_ts, **task.trace}, PARSER_STAGES)
         return True
     
-    async def parse_tasks(self) -> Tuple[List[Dict], Dict]:
+    async def store_task(self, task: Task) -> bool:
+        with self.profiler.span('save'):
+            saved = await asyncio.to_thread(self.save_task, task, False)
+            if saved:
+                await self.publish_task(task.id)
+            if self.unsaved_tasks >= self.history_save_batch:
+                await self.flush_processed_tasks()
+        return saved
+    
+    def click_body(self, driver):
+        driver.find_element(By.TAG_NAME, "body").click()
+    
+    def extract_listing_task(self, element, task_id: str) -> Task:
+        title_elem = element.find_element(By.CSS_SELECTOR, '.b-post__title a')
+        title = title_elem.text.strip()
+        task_url = title_elem.get_attribute('href')
+        
+        price_elem = element.find_element(By.CSS_SELECTOR, '.b-post__price .text-4')
+        price_text = price_elem.text.strip()
+        
+        price, task_type = parse_price(price_text)
+        
+        description = element.find_element(By.CSS_SELECTOR, '.b-post__txt.text-5').text.strip()
+        
+        time_elem = element.find_element(By.CSS_SELECTOR, '.text-gray-opacity-4')
+        posted_time = time_elem.text.strip()
+        
+        try:
+            views_elem = element.find_element(By.CSS_SELECTOR, 'span[title="Количество просмотров"] + .text-7')
+            views = parse_count(views_elem.text)
+        except:
+            views = None
+        
+        try:
+            responses_elem = element.find_element(By.CSS_SELECTOR, 'span[data-id="fl-view-count-href"]')
+            responses = parse_count(responses_elem.text) or 0
+        except:
+            responses = 0
+        
+        return Task(
+            id=task_id,
+            title=title,
+            price=price,
+            price_text=price_text,
+            payment_type=task_type,
+            description=description,
+            url=task_url,
+            posted_time=posted_time,
+            views=views,
+            responses=responses,
+            parsed_at=datetime.now().isoformat()
+        )
+    
+    async def parse_tasks(self) -> Tuple[List[Task], Dict]:
         print("\nНачинаю парсинг ленты заданий...")
         driver = None
         tasks = []
@@ -316,10 +524,12 @@ class WorkzilaParser:
             'duplicates': 0,
             'skipped': 0,
             'has_executor': 0,
+            'near_duplicates': 0,
             'detailed_info_obtained': 0
         }
         
         try:
+            self.profiler.phase('browser_start')
             options = uc.ChromeOptions()
             options.add_argument("--headless=new")
             options.add_argument("--no-sandbox")
@@ -327,53 +537,59 @@ class WorkzilaParser:
             options.add_argument("--start-maximized")
             
             print("Запускаю браузер в фоновом режиме...")
-            driver = uc.Chrome(
+            driver = await asyncio.to_thread(
+                uc.Chrome,
                 options=options,
                 headless=True
             )
             
+            self.profiler.phase('page_load')
             print("Открываю начальную страницу...")
-            driver.get(self.base_url)
-            time.sleep(2)
+            await asyncio.to_thread(driver.get, self.base_url)
+            await asyncio.sleep(2)
             
             url = f"{self.base_url}/projects/"
             print(f"\nПереходим на страницу с заданиями: {url}")
-            driver.get(url)
-            time.sleep(5)
+            await asyncio.to_thread(driver.get, url)
+            await asyncio.sleep(5)
             
+            self.profiler.phase('category_selection')
             print("\nНачинаю выбор категорий...")
             for category in self.categories:
                 try:
-                    dropdown = WebDriverWait(driver, 10).until(
+                    dropdown = await asyncio.to_thread(
+                        WebDriverWait(driver, 10).until,
                         EC.element_to_be_clickable((By.CSS_SELECTOR, "#vs1__combobox"))
                     )
-                    dropdown.click()
+                    await asyncio.to_thread(dropdown.click)
                     print(f"Открыл выпадающий список для выбора категории: {category['name']}")
-                    time.sleep(1)
+                    await asyncio.sleep(1)
                     
-                    options = WebDriverWait(driver, 5).until(
+                    options = await asyncio.to_thread(
+                        WebDriverWait(driver, 5).until,
                         EC.presence_of_all_elements_located((By.CSS_SELECTOR, ".vs__dropdown-option"))
                     )
                     
                     found = False
                     for option in options:
-                        if category['name'] in option.text:
-                            option.click()
+                        if category['name'] in await asyncio.to_thread(lambda: option.text):
+                            await asyncio.to_thread(option.click)
                             print(f"✓ Выбрана категория: {category['name']}")
                             found = True
-                            time.sleep(1.5)
+                            await asyncio.sleep(1.5)
                             break
                     
                     if not found:
                         print(f"✗ Не удалось найти категорию: {category['name']}")
-                        driver.find_element(By.TAG_NAME, "body").click()
+                        await asyncio.to_thread(self.click_body, driver)
                 except Exception as e:
                     print(f"✗ Ошибка при выборе категории {category['name']}: {str(e)}")
                     try:
-                        driver.find_element(By.TAG_NAME, "body").click()
+                        await asyncio.to_thread(self.click_body, driver)
                     except:
                         pass
             
+            self.profiler.phase('filter_apply')
             print("\nПрименяю выбранные фильтры...")
             try:
                 apply_button = None
@@ -386,11 +602,13 @@ class WorkzilaParser:
                 for selector in selectors:
                     try:
                         if selector.startswith("//"):
-                            button = WebDriverWait(driver, 3).until(
+                            button = await asyncio.to_thread(
+                                WebDriverWait(driver, 3).until,
                                 EC.element_to_be_clickable((By.XPATH, selector))
                             )
                         else:
-                            button = WebDriverWait(driver, 3).until(
+                            button = await asyncio.to_thread(
+                                WebDriverWait(driver, 3).until,
                                 EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
                             )
                         
@@ -402,13 +620,15 @@ class WorkzilaParser:
                         continue
                 
                 if apply_button:
-                    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", apply_button)
-                    time.sleep(1)
+                    await asyncio.to_thread(
+                        driver.execute_script, "arguments[0].scrollIntoView({block: 'center'});", apply_button
+                    )
+                    await asyncio.sleep(1)
                     
-                    apply_button.click()
+                    await asyncio.to_thread(apply_button.click)
                     print("✓ Кнопка 'Применить фильтр' нажата")
                     
-                    time.sleep(5)
+                    await asyncio.sleep(5)
                 else:
                     print("✗ Кнопка 'Применить фильтр' не найдена. Парсинг невозможен.")
                     return [], stats
@@ -418,22 +638,27 @@ class WorkzilaParser:
                 return [], stats
             
             print("Ожидаем загрузку результатов после применения фильтров...")
-            time.sleep(5)
+            await asyncio.sleep(5)
             
+            self.profiler.phase('listing_extraction')
             print("\nПолучаю список заданий...")
-            task_elements = driver.find_elements(By.CSS_SELECTOR, 'div[qa-project-name^="project-item"]')
+            task_elements = await asyncio.to_thread(
+                driver.find_elements, By.CSS_SELECTOR, LISTING_SELECTOR
+            )
             stats['found'] = len(task_elements)
+            if self.recorder is not None:
+                self.recorder.save_listing(await asyncio.to_thread(lambda: driver.page_source))
             
             if stats['found'] > 0:
                 print(f"✓ Найдено {stats['found']} заданий")
                 
                 for element in task_elements:
                     try:
-                        task_id = element.get_attribute('id').replace('project-item', '')
+                        task_id = (await asyncio.to_thread(element.get_attribute, 'id')).replace('project-item', '')
                         
                         has_executor = False
                         try:
-                            executor_text = element.text
+                            executor_text = await asyncio.to_thread(lambda: element.text)
                             if "Исполнитель определён" in executor_text:
                                 has_executor = True
                                 stats['has_executor'] += 1
@@ -442,107 +667,44 @@ class WorkzilaParser:
                         except:
                             pass
                         
-                        title_elem = element.find_element(By.CSS_SELECTOR, '.b-post__title a')
-                        title = title_elem.text.strip()
-                        task_url = title_elem.get_attribute('href')
-                        
-                        price_elem = element.find_element(By.CSS_SELECTOR, '.b-post__price .text-4')
-                        price_text = price_elem.text.strip()
-                        
-                        hourly_markers = ['₽/час', 'р/час', 'руб/час', 'р/ч']
-                        fixed_markers = ['/заказ', 'за проект']
-                        
-                        is_hourly = any(keyword in price_text.lower() for keyword in hourly_markers)
-                        is_fixed = any(keyword in price_text.lower() for keyword in fixed_markers)
-                        
-                        try:
-                            if 'договоренности' in price_text.lower():
-                                price = 0
-                                task_type = "negotiated"
-                            elif '—' in price_text:
-                                price_range = price_text.split('—')[0].strip()
-                                price = int(''.join(filter(str.isdigit, price_range)))
-                                
-                                if is_hourly:
-                                    task_type = "hourly"
-                                elif is_fixed:
-                                    task_type = "fixed"
-                                else:
-                                    task_type = "fixed"
-                            else:
-                                price = int(''.join(filter(str.isdigit, price_text)))
-                                
-                                if is_hourly:
-                                    task_type = "hourly"
-                                elif is_fixed:
-                                    task_type = "fixed"
-                                else:
-                                    task_type = "fixed"
-                                
-                        except:
-                            if 'договоренности' in price_text.lower():
-                                price = 0
-                                task_type = "negotiated"
-                            else:
-                                price = 0
-                                task_type = "unknown"
-                        
-                        description = element.find_element(By.CSS_SELECTOR, '.b-post__txt.text-5').text.strip()
-                        
-                        time_elem = element.find_element(By.CSS_SELECTOR, '.text-gray-opacity-4')
-                        posted_time = time_elem.text.strip()
-                        
-                        try:
-                            views_elem = element.find_element(By.CSS_SELECTOR, 'span[title="Количество просмотров"] + .text-7')
-                            views = views_elem.text.strip()
-                        except:
-                            views = "Нет данных"
-                        
-                        try:
-                            responses_elem = element.find_element(By.CSS_SELECTOR, 'span[data-id="fl-view-count-href"]')
-                            responses = responses_elem.text.strip()
-                        except:
-                            responses = "Нет ответов"
+                        task = await asyncio.to_thread(self.extract_listing_task, element, task_id)
+                        mark(task, DISCOVERED)
                         
-                        task = {
-                            'id': task_id,
-                            'title': title,
-                            'price': price,
-                            'price_text': price_text,
-                            'payment_type': task_type,
-                            'description': description,
-                            'url': task_url,
-                            'posted_time': posted_time,
-                            'views': views,
-                            'responses': responses,
-                            'parsed_at': datetime.now().isoformat()
-                        }
+                        print(f"\nОбработка задания: {task.title}")
+                        print(f"Цена: {task.price_text}")
                         
-                        print(f"\nОбработка задания: {title}")
-                        print(f"Цена: {price_text}")
+                        near_duplicate_of = None if task_id in self.processed_tasks else self.find_near_duplicate(task)
                         
                         if self.is_task_processed(task_id, task):
                             stats['duplicates'] += 1
                             print(f"→ Дубликат задания")
+                        elif near_duplicate_of:
+                            stats['near_duplicates'] += 1
+                            print(f"→ Повтор ранее сохраненного задания {near_duplicate_of}, детали не запрашиваются")
+                            task.near_duplicate_of = near_duplicate_of
+                            task.cluster_id = self.listing_index.cluster_of(near_duplicate_of)
+                            
+                            if await self.store_task(task):
+                                stats['new'] += 1
+                                tasks.append(task)
+                                print(f"→ Задание сохранено без детальной информации")
                         else:
                             print(f"→ Получение детальной информации о заказе")
-                            detailed_info = await self.parse_detailed_task(task_url)
+                            with DETAIL_FETCH_SECONDS.time(), self.profiler.span('detail_fetch'):
+                                detailed_info = await self.parse_detailed_task(task.url)
+                            mark(task, DETAILS_FETCHED)
                             
                             if detailed_info.get("has_executor", False):
                                 stats['has_executor'] += 1
                                 print(f"→ Задание {task_id} имеет исполнителя, пропускаем")
                                 continue
                             
-                            task.update({
-                                'full_description': detailed_info.get('full_description', ''),
-                                'responses_count': detailed_info.get('responses_count', 0),
-                                'responses_info': detailed_info.get('responses_info', ''),
-                                'publication_date': detailed_info.get('publication_date', '')
-                            })
+                            task.full_description = detailed_info.get('full_description', '')
+                            task.publication_date = detailed_info.get('publication_date', '')
                             
                             stats['detailed_info_obtained'] += 1
                             
-                            if self.save_task(task):
+                            if await self.store_task(task):
                                 stats['new'] += 1
                                 tasks.append(task)
                                 print(f"→ Задание сохранено с детальной информацией")
@@ -555,6 +717,7 @@ class WorkzilaParser:
                 print(f"Найдено заданий: {stats['found']}")
                 print(f"Новых заданий: {stats['new']}")
                 print(f"Дубликатов: {stats['duplicates']}")
+                print(f"Похожих на сохраненные: {stats['near_duplicates']}")
                 print(f"Пропущено с исполнителем: {stats['has_executor']}")
                 print(f"Пропущено по другим причинам: {stats['skipped']}")
                 print(f"Получено детальной информации: {stats['detailed_info_obtained']}")
@@ -571,9 +734,11 @@ class WorkzilaParser:
             return [], stats
             
         finally:
+            await self.flush_processed_tasks()
             if driver:
+                self.profiler.phase('browser_quit')
                 try:
-                    driver.quit()
+                    await asyncio.to_thread(driver.quit)
                     print("Браузер закрыт.")
                 except Exception:
                     pass
@@ -693,8 +858,10 @@ class WorkzilaParser:
         try:
             current_tasks = self.processed_tasks.copy()
             self.processed_tasks = self.load_processed_tasks()
+            self.next_seq = max(self.next_seq, self.assign_sequence_numbers())
             
             if current_tasks != self.processed_tasks:
+                self.build_near_duplicate_indexes()
                 print("\nОбнаружены изменения в processed_tasks.json")
                 print(f"Текущее количество записей: {len(self.processed_tasks)}")
                 
@@ -702,14 +869,15 @@ class WorkzilaParser:
             print(f"Ошибка при проверке processed_tasks.json: {str(e)}")
 
 class ParserManager:
-    def __init__(self, config_path=None, cookies_path=None):
+    def __init__(self, config_path=None, cookies_path=None, task_queue=None, profile=False):
         if config_path is None or cookies_path is None:
             import os
             script_dir = os.path.dirname(os.path.abspath(__file__))
             config_path = config_path or os.path.join(script_dir, "config.json")
             cookies_path = cookies_path or os.path.join(script_dir, "www.fl.ru_cookies.txt")
             
-        self.parser = WorkzilaParser(config_path=config_path, cookies_path=cookies_path)
+        self.parser = WorkzilaParser(config_path=config_path, cookies_path=cookies_path, task_queue=task_queue)
+        self.parser.profiler = CycleProfiler.from_config(self.parser.config, self.parser.data_dir, force=profile)
         self.is_running = False
         self.total_stats = {
             'total_parsed': 0,
@@ -717,11 +885,21 @@ class ParserManager:
             'total_duplicates': 0,
             'total_skipped': 0,
             'total_has_executor': 0,
+            'total_near_duplicates': 0,
             'total_detailed_info': 0
         }
         self.start_time = None
         self.last_check_time = None
         self.check_interval = 120
+        self.cycles = 0
+        self.heartbeat = Heartbeat('parser')
+        self.metrics_server = None
+        STORED_TASKS.set_function(lambda: len(self.parser.processed_tasks))
+        PARSER_QUEUE_DEPTH.set_function(lambda: self.parser.task_queue.qsize() if self.parser.task_queue else 0, queue='tasks')
+        PARSER_QUEUE_DEPTH.set_function(
+            lambda: sum(queue.qsize() for queue in self.parser.channel.subscribers.values()) if self.parser.channel else 0,
+            queue='channel'
+        )
     
     def format_duration(self, seconds):
         hours = seconds // 3600
@@ -741,17 +919,39 @@ class ParserManager:
         print(f"  • Сохранено новых заказов: {self.total_stats['total_new']}")
         print(f"  • Получено детальной информации: {self.total_stats.get('total_detailed_info', 0)}")
         print(f"  • Пропущено существующих: {self.total_stats['total_duplicates']}")
+        print(f"  • Похожих на сохраненные (без запроса деталей): {self.total_stats.get('total_near_duplicates', 0)}")
         print(f"  • Пропущено с исполнителем: {self.total_stats.get('total_has_executor', 0)}")
         print(f"  • Пропущено по фильтрам: {self.total_stats['total_skipped']}")
         print(f"\nВсего заказов в базе: {len(self.parser.processed_tasks)}")
         print(f"{'='*50}")
     
+    def start_metrics_server(self):
+        settings = self.parser.config.get('metrics', {})
+        if not settings.get('enabled', False) or self.metrics_server is not None:
+            return
+        
+        server = MetricsServer(REGISTRY, host=settings.get('host', '127.0.0.1'), port=settings.get('port', 9101))
+        try:
+            server.start()
+            self.metrics_server = server
+        except OSError as e:
+            print(f"Не удалось запустить сервер метрик: {e}")
+    
+    def stop_metrics_server(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+    
     def update_total_stats(self, stats: dict, tasks: List[Dict]):
+        for key, result in PARSED_RESULTS.items():
+            PARSED_TASKS.inc(stats.get(key, 0), result=result)
+        
         self.total_stats['total_parsed'] += stats['found']
         self.total_stats['total_new'] += stats['new']
         self.total_stats['total_duplicates'] += stats['duplicates']
         self.total_stats['total_skipped'] += stats['skipped']
         self.total_stats['total_has_executor'] = self.total_stats.get('total_has_executor', 0) + stats.get('has_executor', 0)
+        self.total_stats['total_near_duplicates'] = self.total_stats.get('total_near_duplicates', 0) + stats.get('near_duplicates', 0)
         self.total_stats['total_detailed_info'] = self.total_stats.get('total_detailed_info', 0) + stats.get('detailed_info_obtained', 0)
     
     async def run_parser(self):
@@ -761,15 +961,42 @@ class ParserManager:
         print("Браузер работает в фоновом режиме.")
         print(f"Интервал проверки новых заданий: {self.check_interval} секунд (2 минуты)")
         
+        if self.parser.profiler.enabled:
+            print(f"Профилирование циклов включено, результаты: {self.parser.profiler.output_path}")
+        
+        self.start_metrics_server()
+        await self.parser.start_channel()
+        self.heartbeat.ready(tasks=len(self.parser.processed_tasks))
+        try:
+            await self.check_loop()
+        finally:
+            await self.parser.stop_channel()
+            self.stop_metrics_server()
+    
+    async def check_loop(self):
         while self.is_running:
             try:
+                self.parser.profiler.start_cycle(self.cycles + 1)
                 self.parser.check_processed_tasks()
                 
-                tasks, stats = await self.parser.parse_tasks()
+                with CYCLE_SECONDS.time():
+                    tasks, stats = await self.parser.parse_tasks()
+                self.parser.profiler.finish_cycle(stats)
                 self.update_total_stats(stats, tasks)
                 
                 self.show_stats()
                 
+                self.cycles += 1
+                self.last_check_time = time.time()
+                LAST_CYCLE.set(self.last_check_time)
+                self.heartbeat.beat(
+                    cycles=self.cycles,
+                    last_cycle=self.last_check_time,
+                    found=stats['found'],
+                    new=stats['new'],
+                    tasks=len(self.parser.processed_tasks)
+                )
+                
                 print(f"\nСледующая проверка через {self.check_interval} секунд...")
                 print("Чтобы остановить программу, нажмите Ctrl+C")
                 for _ in range(self.check_interval):
@@ -778,19 +1005,23 @@ class ParserManager:
                     await asyncio.sleep(1)
                     
             except Exception as e:
+                CYCLE_ERRORS.inc()
+                self.parser.profiler.finish_cycle(error=str(e))
                 print(f"Ошибка при парсинге: {str(e)}")
                 import traceback
                 print(traceback.format_exc())
                 if self.is_running:
                     await asyncio.sleep(5)
 
-async def main():
+async def main(profile=False, record_dir=None):
     import os
     script_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(script_dir, "config.json")
     cookies_path = os.path.join(script_dir, "www.fl.ru_cookies.txt")
     
-    manager = ParserManager(config_path, cookies_path)
+    manager = ParserManager(config_path, cookies_path, profile=profile)
+    if record_dir:
+        manager.parser.recorder = FixtureRecorder(record_dir)
     
     try:
         print("\n=== ПАРСЕР FL.RU С АВТОМАТИЧЕСКИМ ВЫБОРОМ КАТЕГОРИЙ ===")
@@ -811,13 +1042,15 @@ async def main():
         await manager.parser.close_session()
         print("Работа завершена")
 
-async def main_test():
+async def main_test(record_dir=None):
     import os
     script_dir = os.path.dirname(os.path.abspath(__file__))
     config_path = os.path.join(script_dir, "config.json")
     cookies_path = os.path.join(script_dir, "www.fl.ru_cookies.txt")
     
     parser = WorkzilaParser(config_path=config_path, cookies_path=cookies_path)
+    if record_dir:
+        parser.recorder = FixtureRecorder(record_dir)
     
     try:
         await parser.init_session()
@@ -863,16 +1096,23 @@ async def test_categories():
         print(traceback.format_exc())
 
 if __name__ == "__main__":
-    import sys
+    import argparse
+    
+    argument_parser = argparse.ArgumentParser(description="Парсер заказов FL.ru")
+    argument_parser.add_argument("--test", action="store_true", help="Проверить разбор одной страницы заказа")
+    argument_parser.add_argument("--categories", action="store_true", help="Открыть браузер для отладки выбора категорий")
+    argument_parser.add_argument("--profile", action="store_true", help="Записывать профиль каждого цикла проверки")
+    argument_parser.add_argument("--record", metavar="DIR",
+                                 help="Сохранять HTML ленты и страниц заказов в каталог для офлайн-прогонов")
+    args = argument_parser.parse_args()
     
     try:
-        if len(sys.argv) > 1:
-            if sys.argv[1] == "--test":
-                asyncio.run(main_test())
-            elif sys.argv[1] == "--categories":
-                asyncio.run(test_categories())
+        if args.test:
+            asyncio.run(main_test(record_dir=args.record))
+        elif args.categories:
+            asyncio.run(test_categories())
         else:
-            asyncio.run(main())
+            asyncio.run(main(profile=args.profile, record_dir=args.record))
     except KeyboardInterrupt:
         print("\nПрограмма остановлена пользователем.")
     except Exception as e:
@@ -0,0 +1,242 @@
+import os
+import io
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import platform
+import subprocess
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_OUTPUT = 'profiling/cycles.jsonl'
+PROFILE_TOP = 25
+
+
+def build_id(path: str) -> str:
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=path, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ''
+    return result.stdout.strip() if result.returncode == 0 else ''
+
+
+def max_rss_kb() -> Optional[int]:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage // 1024 if sys.platform == 'darwin' else usage
+
+
+class CycleProfiler:
+    def __init__(self, output_path: Optional[str] = None, cprofile_every: int = 0,
+                 tracemalloc_every: int = 0, tracemalloc_top: int = 10):
+        self.enabled = output_path is not None
+        self.output_path = output_path
+        self.cprofile_every = cprofile_every
+        self.tracemalloc_every = tracemalloc_every
+        self.tracemalloc_top = tracemalloc_top
+        self.build = build_id(os.path.dirname(os.path.abspath(__file__))) if self.enabled else ''
+        self.cycle = None
+        self.started = 0.0
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.phase_name = None
+        self.phase_started = 0.0
+        self.phase_nested = 0.0
+        self.profile = None
+        self.snapshot = None
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], base_dir: str, force: bool = False) -> 'CycleProfiler':
+        settings = config.get('profiling', {})
+        if not force and not settings.get('enabled', False):
+            return cls()
+
+        output_path = settings.get('output') or DEFAULT_OUTPUT
+        if not os.path.isabs(output_path):
+            output_path = os.path.join(base_dir, output_path)
+        return cls(
+            output_path,
+            cprofile_every=int(settings.get('cprofile_every', 0)),
+            tracemalloc_every=int(settings.get('tracemalloc_every', 0)),
+            tracemalloc_top=int(settings.get('tracemalloc_top', 10))
+        )
+
+    def _add(self, name: str, seconds: float) -> None:
+        span = self.spans.setdefault(name, {'seconds': 0.0, 'count': 0})
+        span['seconds'] += seconds
+        span['count'] += 1
+
+    def start_cycle(self, cycle: int) -> None:
+        if not self.enabled:
+            return
+
+        self.cycle = cycle
+        self.spans = {}
+        self.phase_name = None
+        self.started = time.perf_counter()
+
+        if self.tracemalloc_every and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.cprofile_every and cycle % self.cprofile_every == 0:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def phase(self, name: Optional[str]) -> None:
+        if self.cycle is None:
+            return
+
+        now = time.perf_counter()
+        if self.phase_name is not None:
+            self._add(self.phase_name, now - self.phase_started - self.phase_nested)
+        self.phase_name = name
+        self.phase_started = now
+        self.phase_nested = 0.0
+
+    @contextmanager
+    def span(self, name: str):
+        if self.cycle is None:
+            yield
+            return
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self._add(name, elapsed)
+            if self.phase_name is not None:
+                self.phase_nested += elapsed
+
+    def _dump_profile(self) -> Dict[str, Any]:
+        self.profile.disable()
+        path = os.path.join(os.path.dirname(self.output_path), f'cycle-{self.cycle:05d}.prof')
+        self.profile.dump_stats(path)
+
+        stats = pstats.Stats(self.profile, stream=io.StringIO())
+        top = []
+        for (filename, line, function), (_, calls, total, cumulative, _) in sorted(
+            stats.stats.items(), key=lambda item: item[1][3], reverse=True
+        )[:PROFILE_TOP]:
+            top.append({
+                'function': f'{os.path.basename(filename)}:{line}({function})',
+                'calls': calls,
+                'total': round(total, 6),
+                'cumulative': round(cumulative, 6)
+            })
+        self.profile = None
+        return {'path': path, 'top': top}
+
+    def _diff_memory(self) -> Dict[str, Any]:
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>')
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        result: Dict[str, Any] = {'current': current, 'peak': peak, 'top': []}
+
+        if self.snapshot is not None:
+            for stat in snapshot.compare_to(self.snapshot, 'lineno')[:self.tracemalloc_top]:
+                frame = stat.traceback[0]
+                result['top'].append({
+                    'location': f'{frame.filename}:{frame.lineno}',
+                    'size_diff': stat.size_diff,
+                    'count_diff': stat.count_diff,
+                    'size': stat.size
+                })
+        self.snapshot = snapshot
+        return result
+
+    def finish_cycle(self, stats: Optional[Dict[str, Any]] = None, error: Optional[str] = None) -> None:
+        if self.cycle is None:
+            return
+
+        self.phase(None)
+        record: Dict[str, Any] = {
+            'cycle': self.cycle,
+            'timestamp': datetime.now().isoformat(),
+            'build': self.build,
+            'python': platform.python_version(),
+            'duration': round(time.perf_counter() - self.started, 6),
+            'spans': {
+                name: {'seconds': round(span['seconds'], 6), 'count': span['count']}
+                for name, span in self.spans.items()
+            },
+            'max_rss_kb': max_rss_kb()
+        }
+        if stats is not None:
+            record['stats'] = stats
+        if error is not None:
+            record['error'] = error
+
+        os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+        if self.profile is not None:
+            record['cprofile'] = self._dump_profile()
+        if self.tracemalloc_every and self.cycle % self.tracemalloc_every == 0:
+            record['tracemalloc'] = self._diff_memory()
+
+        with open(self.output_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        self.cycle = None
+
+
+def load_cycles(paths: List[str]) -> List[Dict[str, Any]]:
+    cycles = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    cycles.append(json.loads(line))
+    return cycles
+
+
+def median(values: List[float]) -> float:
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2
+
+
+def summarize(cycles: List[Dict[str, Any]]) -> str:
+    builds: Dict[str, List[Dict[str, Any]]] = {}
+    for cycle in cycles:
+        builds.setdefault(cycle.get('build') or '-', []).append(cycle)
+
+    lines = []
+    for build, records in builds.items():
+        lines.append(f"Сборка {build}: циклов {len(records)}, "
+                     f"медиана цикла {median([r['duration'] for r in records]):.2f} с, "
+                     f"макс. RSS {max(r.get('max_rss_kb') or 0 for r in records) // 1024} МБ")
+        names = []
+        for record in records:
+            names.extend(name for name in record['spans'] if name not in names)
+        for name in names:
+            seconds = [r['spans'][name]['seconds'] for r in records if name in r['spans']]
+            counts = [r['spans'][name]['count'] for r in records if name in r['spans']]
+            lines.append(f"  {name:<22} медиана {median(seconds):8.3f} с  вызовов {median(counts):6.1f}")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводка профилирования циклов парсера по сборкам")
+    parser.add_argument("paths", nargs='+', help="Файлы cycles.jsonl")
+    args = parser.parse_args()
+
+    print(summarize(load_cycles(args.paths)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+import os
+import re
+import json
+import random
+import asyncio
+import hashlib
+import argparse
+from collections import Counter
+from typing import Dict, List, Any, Optional
+from urllib.parse import urljoin
+
+from aiohttp import web
+from bs4 import BeautifulSoup
+from yarl import URL
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+
+LISTING_SELECTOR = 'div[qa-project-name^="project-item"]'
+LISTING_PATH = '/projects/'
+MANIFEST = 'manifest.json'
+PROJECT_ID_PATTERN = re.compile(r'/projects/(\d+)')
+
+
+class FixtureRecorder:
+    def __init__(self, fixtures_dir: str):
+        self.fixtures_dir = fixtures_dir
+        self.manifest_path = os.path.join(fixtures_dir, MANIFEST)
+        self.manifest = load_manifest(fixtures_dir)
+        os.makedirs(os.path.join(fixtures_dir, 'listings'), exist_ok=True)
+        os.makedirs(os.path.join(fixtures_dir, 'details'), exist_ok=True)
+
+    def _write(self, relative_path: str, html: str) -> None:
+        with open(os.path.join(self.fixtures_dir, relative_path), 'w', encoding='utf-8') as f:
+            f.write(html)
+
+    def _save_manifest(self) -> None:
+        temp_path = f'{self.manifest_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.manifest_path)
+
+    def save_listing(self, html: str) -> None:
+        relative_path = f"listings/{len(self.manifest['listings']) + 1:04d}.html"
+        self._write(relative_path, html)
+        self.manifest['listings'].append(relative_path)
+        self._save_manifest()
+        print(f"Записана страница ленты: {relative_path}")
+
+    def save_detail(self, url: str, html: str) -> None:
+        path = URL(url).path
+        match = PROJECT_ID_PATTERN.search(path)
+        name = match.group(1) if match else hashlib.sha1(path.encode('utf-8')).hexdigest()[:12]
+        relative_path = f'details/{name}.html'
+        self._write(relative_path, html)
+        self.manifest['details'][path] = relative_path
+        self._save_manifest()
+        print(f"Записана страница заказа: {relative_path}")
+
+
+def load_manifest(fixtures_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(fixtures_dir, MANIFEST), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+    manifest.setdefault('listings', [])
+    manifest.setdefault('details', {})
+    return manifest
+
+
+class SoupElement:
+    def __init__(self, tag, base_url: str = ''):
+        self.tag = tag
+        self.base_url = base_url
+
+    @property
+    def text(self) -> str:
+        return self.tag.get_text(' ', strip=True)
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        value = self.tag.get(name)
+        if isinstance(value, list):
+            value = ' '.join(value)
+        if value is not None and name in ('href', 'src'):
+            value = urljoin(self.base_url, value)
+        return value
+
+    def find_element(self, by: str, value: str) -> 'SoupElement':
+        if by != By.CSS_SELECTOR:
+            raise ValueError(f"Поддерживаются только CSS-селекторы: {by}")
+        tag = self.tag.select_one(value)
+        if tag is None:
+            raise NoSuchElementException(f"Элемент не найден: {value}")
+        return SoupElement(tag, self.base_url)
+
+    def find_elements(self, by: str, value: str) -> List['SoupElement']:
+        if by != By.CSS_SELECTOR:
+            raise ValueError(f"Поддерживаются только CSS-селекторы: {by}")
+        return [SoupElement(tag, self.base_url) for tag in self.tag.select(value)]
+
+
+def listing_elements(html: str, base_url: str) -> List[SoupElement]:
+    return SoupElement(BeautifulSoup(html, 'html.parser'), base_url).find_elements(By.CSS_SELECTOR, LISTING_SELECTOR)
+
+
+class ReplayServer:
+    def __init__(self, fixtures_dir: str, host: str = '127.0.0.1', port: int = 8090,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 42):
+        self.fixtures_dir = fixtures_dir
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.manifest = load_manifest(fixtures_dir)
+        self.pages: Dict[str, str] = {}
+        self.listings: List[str] = []
+        self.listing_position = 0
+        self.requests: Counter = Counter()
+        self.runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}'
+
+    def url_for(self, url: str) -> str:
+        return f'{self.base_url}{URL(url).path_qs}'
+
+    def load(self) -> None:
+        def read(relative_path: str) -> str:
+            with open(os.path.join(self.fixtures_dir, relative_path), 'r', encoding='utf-8') as f:
+                return f.read()
+
+        self.listings = [read(path) for path in self.manifest['listings']]
+        self.pages = {path: read(relative_path) for path, relative_path in self.manifest['details'].items()}
+
+    async def handle(self, request: web.Request) -> web.Response:
+        delay = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self.requests['error'] += 1
+            return web.Response(status=503)
+
+        if request.path == LISTING_PATH and self.listings:
+            html = self.listings[self.listing_position % len(self.listings)]
+            self.listing_position += 1
+            self.requests['listing'] += 1
+        elif request.path in self.pages:
+            html = self.pages[request.path]
+            self.requests['detail'] += 1
+        else:
+            self.requests['missing'] += 1
+            return web.Response(status=404)
+
+        return web.Response(text=html, content_type='text/html')
+
+    async def start(self) -> None:
+        self.load()
+        app = web.Application()
+        app.router.add_get('/{tail:.*}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def serve(args) -> None:
+    server = ReplayServer(args.fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate)
+    await server.start()
+    print(f"Записанные страницы FL.ru доступны на {server.base_url}: "
+          f"лент {len(server.listings)}, заказов {len(server.pages)}")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            if server.requests:
+                print(f"Запросы: {dict(server.requests)}")
+    finally:
+        await server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальная замена FL.ru на записанных страницах")
+    parser.add_argument("fixtures", help="Каталог, записанный parser.py --record")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,38 @@
 import os
+import re
+import sys
+import signal
+import secrets
 import logging
 import asyncio
-from typing import Dict, List, Any, Optional
+from functools import partial
+from typing import Dict, List, Any, Optional, Tuple
+from pathlib import Path
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup,
+    InlineQueryResultArticle, InputTextMessageContent
+)
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, 
-    MessageHandler, ContextTypes, ConversationHandler, filters
+    Application, CommandHandler, CallbackQueryHandler, InlineQueryHandler,
+    MessageHandler, TypeHandler, ContextTypes, ConversationHandler, filters
 )
-from database import Database
+from telegram.helpers import escape_markdown
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from database import Database, AsyncDatabase
 from task_processor import TaskProcessor
 from file_monitor import FileMonitor
-from datetime import datetime, time
+from subscription_index import SubscriptionIndex
+from send_scheduler import SendScheduler
+from digest import DigestCollector, split_messages
+from rollups import TASKS, PAYMENT_TYPE, PRICE_BUCKET, MATCHES, PAYMENT_TYPES, PRICE_BUCKETS
+from search import parse_search_query, match_expression, PAGE_SIZE, INLINE_PAGE_SIZE
+from datetime import datetime, time, timedelta
+from common.supervision import Heartbeat, READY
+from common.metrics import REGISTRY, MetricsServer
+from common.tracing import TraceReport, observe_trace, SUMMARIZED, DELIVERED, BOT_STAGES
 import telegram
 
 load_dotenv()
@@ -23,134 +44,390 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 KEYWORDS, PRICE_FILTER, PRICE_MIN = range(3)
+RECENT_LIMIT = 20
+
+NOTIFICATIONS = REGISTRY.counter('fl_bot_notifications', 'Уведомления о заказах по типу и результату отправки')
+INGESTED_TASKS = REGISTRY.counter('fl_bot_ingested_tasks', 'Новые заказы, загруженные ботом, по источнику')
+UPDATES = REGISTRY.counter('fl_bot_updates', 'Обработанные обновления Telegram')
+NOTIFY_PASS_SECONDS = REGISTRY.histogram('fl_bot_notify_pass_seconds', 'Длительность прохода рассылки уведомлений')
+DB_SECONDS = REGISTRY.histogram(
+    'fl_bot_db_seconds', 'Время запросов к базе данных',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+)
+QUEUE_DEPTH = REGISTRY.gauge('fl_bot_queue_depth', 'Глубина очередей бота')
 
 class FLNotifyBot:
-    def __init__(self):
+    def __init__(self, task_queue: Optional[asyncio.Queue] = None):
         self.token = os.getenv("TELEGRAM_BOT_TOKEN")
-        self.db = Database()
+        self.db = Database(cache_size=int(os.getenv("SETTINGS_CACHE_SIZE", "10000")))
+        self.adb = AsyncDatabase(self.db, observer=lambda method, seconds: DB_SECONDS.observe(seconds, method=method))
         self.task_processor = TaskProcessor(self.db)
-        self.file_monitor = FileMonitor(self.check_for_updates)
+        monitored_path = self.task_processor.feed_path if os.path.exists(self.task_processor.feed_path) else None
+        self.file_monitor = FileMonitor(self.check_for_updates, file_path=monitored_path)
         self.monitoring_active = False
+        self.channel_address = os.getenv("TASK_CHANNEL_ADDRESS")
+        self.task_queue = task_queue
+        self.queue_consumer = None
+        self.channel_subscriber = None
+        self.channel_task = None
+        self.heartbeat = Heartbeat('telegram_bot')
+        self.notify_lock: Optional[asyncio.Lock] = None
+        self.notify_chunk_size = int(os.getenv("NOTIFY_CHUNK_SIZE", "50"))
+        self.updates_handled = 0
+        self.last_update_at = None
+        self.metrics_server = None
+        QUEUE_DEPTH.set_function(lambda: self.sender.pending if self.sender else 0, queue='send')
+        QUEUE_DEPTH.set_function(lambda: len(self.digest), queue='digest')
+        QUEUE_DEPTH.set_function(lambda: self.task_queue.qsize() if self.task_queue else 0, queue='tasks')
+        self.sender = None
+        self.webhook_server = None
+        self.delivery_ttl = float(os.getenv("DELIVERY_TTL_DAYS", "30")) * 86400
+        self.rollup_retention_days = int(os.getenv("ROLLUP_RETENTION_DAYS", "90"))
+        self.digest = DigestCollector(
+            self.send_digest,
+            window=float(os.getenv("DIGEST_WINDOW", "300")),
+            max_items=int(os.getenv("DIGEST_MAX_ITEMS", "10"))
+        )
         
     async def check_for_updates(self):
         logger.info("Проверка обновлений в файле заказов")
-        users = self.db.get_users_with_notifications()
+        try:
+            new_ids = await self.adb.run(self.task_processor.ingest)
+            INGESTED_TASKS.inc(len(new_ids), source='feed')
+            logger.info(f"Загружено новых заказов: {len(new_ids)}")
+        except Exception as e:
+            logger.error(f"Ошибка при загрузке ленты заказов: {e}")
+        
+        await self.notify_new_tasks()
+    
+    async def consume_task_queue(self):
+        logger.info(f"Получение заказов из очереди парсера (размер {self.task_queue.maxsize})")
+        while True:
+            items = [await self.task_queue.get()]
+            while not self.task_queue.empty():
+                items.append(self.task_queue.get_nowait())
+            records = [item for item in items if item is not None]
+            
+            try:
+                new_ids = []
+                if len(records) < len(items):
+                    new_ids += await self.adb.run(self.task_processor.ingest)
+                    INGESTED_TASKS.inc(len(new_ids), source='feed')
+                    logger.info(f"Лента заказов перечитана, новых заказов: {len(new_ids)}")
+                if records:
+                    queued_ids = await self.adb.run(self.task_processor.ingest_records, records)
+                    INGESTED_TASKS.inc(len(queued_ids), source='queue')
+                    new_ids += queued_ids
+                    logger.info(f"Получено из очереди заказов: {len(records)}, новых: {len(queued_ids)}")
+                if new_ids:
+                    await self.notify_new_tasks()
+            except Exception as e:
+                logger.error(f"Ошибка при обработке заказов из очереди: {e}")
+            finally:
+                for _ in items:
+                    self.task_queue.task_done()
+    
+    async def request_resync(self):
+        await self.task_queue.put(None)
+    
+    async def start_channel_subscriber(self):
+        from common.task_channel import TaskChannelSubscriber
+        
+        cursor = await self.adb.get_latest_source_seq()
+        self.channel_subscriber = TaskChannelSubscriber(
+            self.channel_address, cursor, self.task_queue.put, self.request_resync
+        )
+        self.channel_task = asyncio.create_task(self.channel_subscriber.run())
+        logger.info(f"Подписка на канал заказов {self.channel_address} с заказа #{cursor}")
+    
+    async def notify_new_tasks(self):
+        if self.notify_lock is None:
+            self.notify_lock = asyncio.Lock()
+        async with self.notify_lock:
+            with NOTIFY_PASS_SECONDS.time():
+                await self.run_notify_pass()
+    
+    async def run_notify_pass(self):
+        users = await self.adb.get_users_with_notifications()
         
         if not users:
             logger.info("Нет пользователей с включенными уведомлениями")
             return
             
         logger.info(f"Найдено {len(users)} пользователей с включенными уведомлениями")
+        
+        latest_seq = await self.adb.get_latest_seq()
+        if latest_seq is None:
+            logger.info("В базе пока нет заказов")
+            return
+        
+        cursors = [user['last_sent_seq'] for user in users if user.get('last_sent_seq') is not None]
+        tasks = []
+        if cursors:
+            tasks = await self.adb.run(self.task_processor.get_new_tasks, min(cursors), latest_seq)
+        logger.info(f"Новых заказов с последней проверки: {len(tasks)}")
+        
+        index = SubscriptionIndex.from_users(users)
+        for user in users:
+            if user.get('last_sent_seq') is None:
+                logger.info(f"Инициализирован курсор заказов для пользователя {user.get('user_id')}: {latest_seq}")
+        
+        for start in range(0, len(tasks), self.notify_chunk_size):
+            chunk = tasks[start:start + self.notify_chunk_size]
+            await self.notify_chunk(users, chunk, index)
+            
+            chunk_seq = chunk[-1][0]
+            advanced = await self.adb.advance_cursors(chunk_seq, initialize=False)
+            self.heartbeat.beat(notify_seq=chunk_seq, notify_latest_seq=latest_seq)
+            logger.info(f"Обработаны заказы до #{chunk_seq} из #{latest_seq}, курсор передвинут у {advanced} пользователей")
+        
+        advanced = await self.adb.advance_cursors(latest_seq)
+        logger.info(f"Курсор {advanced} пользователей передвинут до заказа #{latest_seq}")
+        
+        cache_stats = await self.adb.cache_stats()
+        logger.info(
+            f"Кэш настроек: {cache_stats['size']}/{cache_stats['max_size']}, "
+            f"попаданий {cache_stats['hit_ratio']:.1%} ({cache_stats['hits']}/{cache_stats['hits'] + cache_stats['misses']}), "
+            f"вытеснений {cache_stats['evictions']}"
+        )
+    
+    async def notify_chunk(self, users: List[Dict[str, Any]], tasks: List[Tuple[int, str, Dict[str, Any]]],
+                           index: SubscriptionIndex):
+        deliveries = []
+        delivered = []
+        matches = {}
+        summarized = []
+        pending = []
+        digest_items = []
             
         for user in users:
             user_id = user.get('user_id')
-            logger.info(f"Проверка уведомлений для пользователя {user_id}")
-            notifications = self.task_processor.get_notifications_for_user(user_id)
-            
-            if not notifications:
-                logger.info(f"Нет новых уведомлений для пользователя {user_id}")
+            matched = self.task_processor.match_tasks(user, tasks, index)
+            if not matched:
                 continue
+            
+            delivered_fingerprints = await self.adb.delivered_fingerprints(
+                user_id, self.task_processor.matched_fingerprints(matched)
+            )
+            matched = self.task_processor.drop_delivered(matched, delivered_fingerprints)
+            if matched:
+                pending.append((user, matched))
+        
+        to_summarize = {task_id: task for _, matched in pending for _, task_id, task in matched}
+        if to_summarize:
+            logger.info(f"Подготовка кратких описаний для {len(to_summarize)} заказов")
+            await self.task_processor.summarize_tasks(to_summarize)
+        
+        for user, matched in pending:
+            user_id = user.get('user_id')
+            notifications = await self.task_processor.build_notifications(matched)
                 
             logger.info(f"Найдено {len(notifications)} новых уведомлений для пользователя {user_id}")
+            matches[(MATCHES, str(user_id))] = len(notifications)
+            summarized.extend(
+                (notification['task_id'], SUMMARIZED, notification['trace'][SUMMARIZED])
+                for notification in notifications
+            )
             
-            is_first_time = user.get('last_sent_id') is None or user.get('last_sent_id') == ''
-            if is_first_time and notifications:
-                last_task_id = notifications[-1]['task_id']
-                self.db.update_last_sent_id(user_id, last_task_id)
-                logger.info(f"Инициализирован последний ID заказа для пользователя {user_id}: {last_task_id}")
+            if user.get('digest_enabled') == 1:
+                digest_items.extend((user_id, notification) for notification in notifications)
+                NOTIFICATIONS.inc(len(notifications), kind='digest', result='queued')
                 continue
             
-            last_task_id = None
-            
             for notification in notifications:
-                try:
-                    task_id = notification['task_id']
-                    last_task_id = task_id
-                    
-                    await self.send_task_notification(user_id, notification)
-                    logger.info(f"Отправлено уведомление {task_id} для пользователя {user_id}")
-                    
-                    await asyncio.sleep(0.5)
-                    
-                except Exception as e:
-                    logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+                deliveries.append(asyncio.ensure_future(self.send_task_notification(user_id, notification)))
+                delivered.append((user_id, notification))
+        
+        await self.adb.add_rollups(matches)
+        await self.adb.record_trace_stages(summarized)
+        
+        if digest_items:
+            await self.adb.queue_digest_items(digest_items)
+            for user_id, notification in digest_items:
+                self.digest.add(user_id, notification)
+        
+        if deliveries:
+            logger.info(f"В очереди отправки {len(deliveries)} уведомлений")
+            results = await asyncio.gather(*deliveries)
+            self.log_sender_stats()
             
-            if last_task_id:
-                self.db.update_last_sent_id(user_id, last_task_id)
-                logger.info(f"Обновлен последний ID заказа для пользователя {user_id}: {last_task_id}")
+            ledger = [
+                (user_id, fingerprint, notification['task_id'])
+                for (user_id, notification), sent in zip(delivered, results) if sent
+                for fingerprint in notification.get('fingerprints', [])
+            ]
+            await self.adb.record_deliveries(ledger)
     
-    async def send_task_notification(self, user_id: int, notification: Dict[str, Any]):
+    def format_price(self, notification: Dict[str, Any]) -> str:
         price_info = notification['price_text']
         if 'По договоренности' in price_info and notification.get('price', 0) == 0:
-            price_display = "💰 Цена: По договоренности"
-        else:
-            price = notification.get('price', 0)
-            price_display = f"💰 Цена: {price_info} ({price} руб.)" if price > 0 else f"💰 Цена: {price_info}"
-            
+            return "💰 Цена: По договоренности"
+        
+        price = notification.get('price', 0)
+        return f"💰 Цена: {price_info} ({price} руб.)" if price > 0 else f"💰 Цена: {price_info}"
+    
+    async def send_task_notification(self, user_id: int, notification: Dict[str, Any]):
         message = (
             f"📌 {notification['ai_description']}\n\n"
-            f"{price_display}\n"
+            f"{self.format_price(notification)}\n"
             f"📅 Дата публикации: {notification['publication_date']}\n"
             f"🔗 [Перейти к заказу]({notification['url']})"
         )
         
         try:
-            await self.application.bot.send_message(
-                chat_id=user_id,
+            await self.sender.submit(
+                user_id,
                 text=message,
                 parse_mode='Markdown',
                 disable_web_page_preview=True
             )
             
             logger.info(f"Отправлено уведомление для пользователя {user_id}, задача: {notification['task_id']}")
+            NOTIFICATIONS.inc(kind='instant', result='sent')
+            self.trace_delivery(notification)
+            return True
         except Exception as e:
             logger.error(f"Ошибка при отправке уведомления пользователю {user_id}: {e}")
+            NOTIFICATIONS.inc(kind='instant', result='failed')
+            return False
+    
+    def format_digest_entry(self, notification: Dict[str, Any], description: str) -> str:
+        return (
+            f"📌 {escape_markdown(description)}\n"
+            f"{self.format_price(notification)}\n"
+            f"🔗 [Перейти к заказу]({notification['url']})"
+        )
+    
+    async def send_digest(self, user_id: int, notifications: List[Dict[str, Any]]):
+        entries = [
+            (partial(self.format_digest_entry, notification), notification['ai_description'])
+            for notification in notifications
+        ]
+        messages = split_messages(f"📬 *Подборка новых заказов: {len(notifications)}*", entries)
+        
+        ledger = []
+        for text, included in messages:
+            try:
+                await self.sender.submit(
+                    user_id,
+                    text=text,
+                    parse_mode='Markdown',
+                    disable_web_page_preview=True
+                )
+            except Exception as e:
+                logger.error(f"Ошибка при отправке подборки пользователю {user_id}: {e}")
+                NOTIFICATIONS.inc(len(included), kind='digest', result='failed')
+                continue
+            
+            NOTIFICATIONS.inc(len(included), kind='digest', result='sent')
+            for position in included:
+                notification = notifications[position]
+                self.trace_delivery(notification)
+                ledger.extend(
+                    (user_id, fingerprint, notification['task_id'])
+                    for fingerprint in notification.get('fingerprints', [])
+                )
+        
+        logger.info(
+            f"Отправлена подборка пользователю {user_id}: {len(notifications)} заказов в {len(messages)} сообщениях"
+        )
+        await self.adb.finish_digest(user_id, [notification['task_id'] for notification in notifications], ledger)
+    
+    def trace_delivery(self, notification: Dict[str, Any]):
+        trace = notification.get('trace')
+        if trace:
+            observe_trace({**trace, DELIVERED: datetime.now().timestamp()}, BOT_STAGES)
+    
+    def log_sender_stats(self):
+        stats = self.sender.stats()
+        logger.info(
+            f"Очередь отправки: {stats['queue_depth']} в очереди, {stats['in_flight']} отправляется, "
+            f"отправлено {stats['sent']}, ошибок {stats['failed']}, повторов {stats['retries']}; "
+            f"задержка доставки p50={stats['latency_p50']:.2f}с p95={stats['latency_p95']:.2f}с "
+            f"p99={stats['latency_p99']:.2f}с"
+        )
     
     async def send_daily_report(self):
         logger.info("Отправка ежедневного отчета")
-        users = self.db.get_users_with_notifications()
+        users = await self.adb.get_users_with_notifications()
         
         if not users:
             logger.info("Нет пользователей с включенными уведомлениями для отправки ежедневного отчета")
             return
         
-        today = datetime.now()
-        message = (
-            f"🔔 *ЕЖЕДНЕВНЫЙ ОТЧЕТ* 🔔\n\n"
-            f"📊 ═════════════════════ 📊\n"
-            f"📌 *ЗАКАЗЫ ЗА ПРЕДЫДУЩИЙ ДЕНЬ*\n"
-            f"📅 Дата: {today.strftime('%d.%m.%Y')}\n"
-            f"═══════════════════════════\n\n"
-            f"🔍 *НОВЫЕ ЗАКАЗЫ СЕГОДНЯ* 🔍\n"
-            f"═══════════════════════════"
-        )
+        report_day = (datetime.now() - timedelta(days=1)).date()
+        rollup = await self.adb.get_daily_rollup(report_day.isoformat())
+        summary = self.format_daily_summary(report_day, rollup)
+        user_matches = rollup.get(MATCHES, {})
         
-        for user in users:
-            user_id = user.get('user_id')
+        async def send_report(user_id):
+            message = (
+                f"{summary}\n\n"
+                f"🎯 *Подходящих вам заказов:* {user_matches.get(str(user_id), 0)}"
+            )
             try:
-                await self.application.bot.send_message(
-                    chat_id=user_id,
+                await self.sender.submit(
+                    user_id,
                     text=message,
                     parse_mode='Markdown'
                 )
                 logger.info(f"Отправлен ежедневный отчет пользователю {user_id}")
             except Exception as e:
                 logger.error(f"Ошибка при отправке ежедневного отчета пользователю {user_id}: {e}")
-            
-            await asyncio.sleep(0.5)
+        
+        await asyncio.gather(*(send_report(user.get('user_id')) for user in users))
+        self.log_sender_stats()
+    
+    def format_daily_summary(self, day, rollup: Dict[str, Dict[str, int]]) -> str:
+        lines = [
+            "🔔 *ЕЖЕДНЕВНЫЙ ОТЧЕТ* 🔔\n",
+            "📊 ═════════════════════ 📊",
+            "📌 *ЗАКАЗЫ ЗА ПРЕДЫДУЩИЙ ДЕНЬ*",
+            f"📅 Дата: {day.strftime('%d.%m.%Y')}",
+            "═══════════════════════════\n",
+            f"🔍 *Новых заказов:* {rollup.get(TASKS, {}).get('', 0)}"
+        ]
+        
+        payment_types = rollup.get(PAYMENT_TYPE, {})
+        if payment_types:
+            lines.append("\n💳 *По типу оплаты:*")
+            for key, label in PAYMENT_TYPES.items():
+                if payment_types.get(key):
+                    lines.append(f"  • {label}: {payment_types[key]}")
+        
+        price_buckets = rollup.get(PRICE_BUCKET, {})
+        if price_buckets:
+            lines.append("\n💰 *По бюджету:*")
+            for key, _, _, label in PRICE_BUCKETS:
+                if price_buckets.get(key):
+                    lines.append(f"  • {label}: {price_buckets[key]}")
+        
+        lines.append("═══════════════════════════")
+        return "\n".join(lines)
     
     async def _send_daily_report_job(self, context):
         await self.send_daily_report()
+        await self.prune_delivery_ledger()
+        await self.adb.prune_rollups(
+            (datetime.now() - timedelta(days=self.rollup_retention_days)).date().isoformat()
+        )
+    
+    async def prune_delivery_ledger(self):
+        removed = await self.adb.prune_deliveries(self.delivery_ttl)
+        logger.info(f"Удалено устаревших записей журнала доставки: {removed}")
+        removed = await self.adb.prune_traces(self.delivery_ttl)
+        logger.info(f"Удалено устаревших записей трассировки заказов: {removed}")
     
     async def start(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         user_id = update.effective_user.id
         username = update.effective_user.username or update.effective_user.first_name
         
-        if not self.db.user_exists(user_id):
-            self.db.add_user(user_id)
+        if not await self.adb.user_exists(user_id):
+            await self.adb.add_user(user_id)
         
-        settings = self.db.get_user_settings(user_id)
+        settings = await self.adb.get_user_settings(user_id)
         notifications_enabled = settings.get('notifications_enabled', 0) == 1
+        digest_enabled = settings.get('digest_enabled', 0) == 1
         
         keyboard = [
             [InlineKeyboardButton("🔍 Изменить ключевые слова", callback_data="set_keywords")],
@@ -162,6 +439,11 @@ class FLNotifyBot:
         else:
             keyboard.append([InlineKeyboardButton("🔔 Включить авторассылку", callback_data="toggle_notifications_on")])
         
+        if digest_enabled:
+            keyboard.append([InlineKeyboardButton("📨 Присылать заказы по одному", callback_data="toggle_digest_off")])
+        else:
+            keyboard.append([InlineKeyboardButton("📬 Присылать заказы подборкой", callback_data="toggle_digest_on")])
+        
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         await update.message.reply_text(
@@ -173,17 +455,18 @@ class FLNotifyBot:
         )
         
         if not self.monitoring_active:
-            latest_id = self.task_processor.get_latest_task_id()
-            if latest_id:
-                self.db.update_last_sent_id(user_id, latest_id)
-                logger.info(f"Инициализирован последний ID заказа для пользователя {user_id}: {latest_id}")
+            latest_seq = await self.adb.get_latest_seq()
+            if latest_seq is not None:
+                await self.adb.set_cursor(user_id, latest_seq)
+                logger.info(f"Инициализирован курсор заказов для пользователя {user_id}: {latest_seq}")
     
     async def menu(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         query = update.callback_query
         user_id = query.from_user.id
         
-        settings = self.db.get_user_settings(user_id)
+        settings = await self.adb.get_user_settings(user_id)
         notifications_enabled = settings.get('notifications_enabled', 0) == 1
+        digest_enabled = settings.get('digest_enabled', 0) == 1
         
         keyboard = [
             [InlineKeyboardButton("🔍 Изменить ключевые слова", callback_data="set_keywords")],
@@ -195,6 +478,11 @@ class FLNotifyBot:
         else:
             keyboard.append([InlineKeyboardButton("🔔 Включить авторассылку", callback_data="toggle_notifications_on")])
         
+        if digest_enabled:
+            keyboard.append([InlineKeyboardButton("📨 Присылать заказы по одному", callback_data="toggle_digest_off")])
+        else:
+            keyboard.append([InlineKeyboardButton("📬 Присылать заказы подборкой", callback_data="toggle_digest_on")])
+        
         reply_markup = InlineKeyboardMarkup(keyboard)
         
         keywords_text = ", ".join(settings.get('keywords', [])) or "не указаны"
@@ -218,7 +506,8 @@ class FLNotifyBot:
             "📋 Ваши текущие настройки:\n\n"
             f"🔑 Ключевые слова: {keywords_text}\n"
             f"💰 Фильтр по цене: {price_text}\n"
-            f"🔔 Авторассылка: {'Включена' if notifications_enabled else 'Выключена'}\n\n"
+            f"🔔 Авторассылка: {'Включена' if notifications_enabled else 'Выключена'}\n"
+            f"📬 Подборки: {'Включены' if digest_enabled else 'Выключены'}\n\n"
             "Выберите действие:"
         )
         
@@ -243,7 +532,7 @@ class FLNotifyBot:
         await query.answer()
         
         user_id = query.from_user.id
-        settings = self.db.get_user_settings(user_id)
+        settings = await self.adb.get_user_settings(user_id)
         
         current_keywords = ", ".join(settings.get('keywords', [])) or "не указаны"
         
@@ -262,7 +551,7 @@ class FLNotifyBot:
         
         keywords = [keyword.strip() for keyword in text.split(',') if keyword.strip()]
         
-        self.db.update_keywords(user_id, keywords)
+        await self.adb.update_keywords(user_id, keywords)
         
         keyboard = [[InlineKeyboardButton("◀️ Вернуться в меню", callback_data="menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -281,7 +570,7 @@ class FLNotifyBot:
         await query.answer()
         
         user_id = query.from_user.id
-        settings = self.db.get_user_settings(user_id)
+        settings = await self.adb.get_user_settings(user_id)
         price_filters = settings.get('price_filters', ['any'])
         
         keyboard = [
@@ -356,7 +645,7 @@ class FLNotifyBot:
             return PRICE_MIN
             
         elif callback_data == "price_save":
-            self.db.update_price_filters(user_id, price_filters, context.user_data.get('price_min', 0))
+            await self.adb.update_price_filters(user_id, price_filters, context.user_data.get('price_min', 0))
             
             filter_names = []
             if 'any' in price_filters:
@@ -437,7 +726,7 @@ class FLNotifyBot:
                 
             context.user_data['price_min'] = price_min
             
-            self.db.update_price_filters(user_id, price_filters, price_min)
+            await self.adb.update_price_filters(user_id, price_filters, price_min)
             
             filter_names = []
             if 'any' in price_filters:
@@ -477,15 +766,15 @@ class FLNotifyBot:
         
         enable = callback_data == "toggle_notifications_on"
         
-        self.db.toggle_notifications(user_id, enable)
+        await self.adb.toggle_notifications(user_id, enable)
         
         if enable:
-            latest_id = self.task_processor.get_latest_task_id()
-            if latest_id:
-                self.db.update_last_sent_id(user_id, latest_id)
-                logger.info(f"Инициализирован последний ID заказа для пользователя {user_id}: {latest_id}")
+            latest_seq = await self.adb.get_latest_seq()
+            if latest_seq is not None:
+                await self.adb.set_cursor(user_id, latest_seq)
+                logger.info(f"Инициализирован курсор заказов для пользователя {user_id}: {latest_seq}")
                 
-            if not self.monitoring_active:
+            if self.task_queue is None and not self.monitoring_active:
                 self.file_monitor.start()
                 self.monitoring_active = True
                 logger.info("Мониторинг файла запущен")
@@ -498,6 +787,169 @@ class FLNotifyBot:
             else:
                 logger.error(f"Ошибка при обновлении сообщения: {e}")
     
+    async def toggle_digest(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        
+        user_id = query.from_user.id
+        enable = query.data == "toggle_digest_on"
+        
+        await self.adb.toggle_digest(user_id, enable)
+        if not enable:
+            self.digest.flush(user_id)
+        
+        try:
+            await self.menu(update, context)
+        except telegram.error.BadRequest as e:
+            if "Message is not modified" in str(e):
+                logger.info(f"Сообщение уже имеет актуальное содержимое для пользователя {user_id}")
+            else:
+                logger.error(f"Ошибка при обновлении сообщения: {e}")
+    
+    async def find_tasks(self, search: Dict[str, Any], offset: int,
+                         page_size: int = PAGE_SIZE) -> Tuple[List[Tuple[int, str, Dict[str, Any]]], bool]:
+        since = None
+        if search.get('days'):
+            since = (datetime.now() - timedelta(days=search['days'])).timestamp()
+        
+        results = await self.adb.search_tasks(
+            match_expression(search['terms']),
+            search.get('price_min'),
+            search.get('price_max'),
+            since,
+            page_size + 1,
+            offset
+        )
+        return results[:page_size], len(results) > page_size
+    
+    def format_task_entry(self, position: int, task: Dict[str, Any], title: Optional[str] = None) -> str:
+        title = escape_markdown(title or task.get('title') or 'Без названия')
+        price_text = escape_markdown(task.get('price_text') or 'Цена не указана')
+        entry = f"{position}. *{title}*\n💰 {price_text}\n"
+        if task.get('publication_date'):
+            entry += f"📅 {escape_markdown(task['publication_date'])}\n"
+        return entry + f"🔗 [Перейти к заказу]({task.get('url', '')})"
+    
+    async def recent(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        argument = context.args[0].lower() if context.args else ''
+        hours = re.fullmatch(r'(\d+)ч', argument)
+        
+        if hours:
+            since = (datetime.now() - timedelta(hours=int(hours.group(1)))).timestamp()
+            tasks = await self.adb.run(self.task_processor.since, since)
+            tasks = tasks[::-1][:RECENT_LIMIT]
+            header = f"🕒 Заказы за последние {hours.group(1)} ч."
+        else:
+            count = min(int(argument), RECENT_LIMIT) if argument.isdigit() else 5
+            tasks = await self.adb.run(self.task_processor.latest, count)
+            header = "🕒 Последние заказы"
+        
+        if not tasks:
+            await update.message.reply_text("Заказов за этот период нет")
+            return
+        
+        entries = [
+            (partial(self.format_task_entry, position, task), task.get('title') or 'Без названия')
+            for position, (_, _, task) in enumerate(tasks, 1)
+        ]
+        for text, _ in split_messages(f"{header}:", entries):
+            await update.message.reply_text(
+                text,
+                parse_mode='Markdown',
+                disable_web_page_preview=True
+            )
+    
+    async def render_search_page(self, search: Dict[str, Any], offset: int) -> Tuple[str, Optional[InlineKeyboardMarkup]]:
+        results, has_more = await self.find_tasks(search, offset)
+        if not results:
+            return ("🔍 Ничего не найдено" if offset == 0 else "🔍 Больше результатов нет"), None
+        
+        entries = [self.format_task_entry(position, task) for position, (_, _, task) in enumerate(results, offset + 1)]
+        text = f"🔍 Результаты поиска ({offset + 1}–{offset + len(results)}):\n\n" + "\n\n".join(entries)
+        
+        buttons = []
+        if offset > 0:
+            buttons.append(InlineKeyboardButton("◀️ Назад", callback_data=f"search_page_{max(0, offset - PAGE_SIZE)}"))
+        if has_more:
+            buttons.append(InlineKeyboardButton("Вперед ▶️", callback_data=f"search_page_{offset + PAGE_SIZE}"))
+        
+        return text, InlineKeyboardMarkup([buttons]) if buttons else None
+    
+    async def search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        search = parse_search_query(' '.join(context.args or []))
+        
+        if not search['terms'] and search['price_min'] is None and search['price_max'] is None and not search['days']:
+            await update.message.reply_text(
+                "🔍 Поиск по заказам\n\n"
+                "Отправьте /search и слова для поиска, например:\n"
+                "/search телеграм бот от:5000 дней:7\n\n"
+                "от:N — бюджет от N рублей\n"
+                "до:N — бюджет до N рублей\n"
+                "дней:N — только заказы за последние N дней"
+            )
+            return
+        
+        context.user_data['search'] = search
+        text, reply_markup = await self.render_search_page(search, 0)
+        await update.message.reply_text(
+            text,
+            parse_mode='Markdown',
+            reply_markup=reply_markup,
+            disable_web_page_preview=True
+        )
+    
+    async def search_page(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        await query.answer()
+        
+        search = context.user_data.get('search')
+        if not search:
+            await query.edit_message_text("Результаты поиска устарели, повторите команду /search")
+            return
+        
+        offset = int(query.data.rsplit('_', 1)[1])
+        text, reply_markup = await self.render_search_page(search, offset)
+        try:
+            await query.edit_message_text(
+                text,
+                parse_mode='Markdown',
+                reply_markup=reply_markup,
+                disable_web_page_preview=True
+            )
+        except telegram.error.BadRequest as e:
+            if "Message is not modified" not in str(e):
+                logger.error(f"Ошибка при обновлении результатов поиска: {e}")
+    
+    async def inline_search(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        inline_query = update.inline_query
+        search = parse_search_query(inline_query.query)
+        if not search['terms']:
+            await inline_query.answer([], cache_time=5)
+            return
+        
+        offset = int(inline_query.offset or 0)
+        results, has_more = await self.find_tasks(search, offset, INLINE_PAGE_SIZE)
+        
+        articles = []
+        for _, task_id, task in results:
+            title = task.get('title') or 'Без названия'
+            price_text = task.get('price_text') or 'Цена не указана'
+            articles.append(InlineQueryResultArticle(
+                id=task_id,
+                title=title,
+                description=f"{price_text} · {task.get('description', '')[:100]}",
+                url=task.get('url') or None,
+                input_message_content=InputTextMessageContent(
+                    f"📌 {title}\n💰 {price_text}\n🔗 {task.get('url', '')}"
+                )
+            ))
+        
+        await inline_query.answer(
+            articles,
+            cache_time=30,
+            next_offset=str(offset + len(results)) if has_more else ''
+        )
+    
     async def cancel(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
         keyboard = [[InlineKeyboardButton("◀️ Вернуться в меню", callback_data="menu")]]
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -509,9 +961,178 @@ class FLNotifyBot:
         
         return ConversationHandler.END
     
-    def run(self):
-        application = Application.builder().token(self.token).build()
+    def start_metrics_server(self):
+        port = os.getenv("METRICS_PORT")
+        if not port or self.metrics_server is not None:
+            return
+        
+        server = MetricsServer(REGISTRY, host=os.getenv("METRICS_HOST", "127.0.0.1"), port=int(port))
+        try:
+            server.start()
+            self.metrics_server = server
+        except OSError as e:
+            logger.error(f"Не удалось запустить сервер метрик на порту {port}: {e}")
+    
+    async def _post_init(self, application: Application):
+        self.start_metrics_server()
+        new_ids = await self.adb.run(self.task_processor.ingest)
+        logger.info(f"Лента заказов синхронизирована, новых заказов: {len(new_ids)}")
+        await self.prune_delivery_ledger()
+        
+        digest_items = await self.adb.get_digest_items()
+        if digest_items:
+            logger.info(f"Восстановлено заказов из неотправленных подборок: {len(digest_items)}")
+            for user_id, notification in digest_items:
+                self.digest.add(user_id, notification)
+        
+        if self.task_queue is None and self.channel_address:
+            self.task_queue = asyncio.Queue(maxsize=int(os.getenv("TASK_QUEUE_SIZE", "1000")))
+        if self.task_queue is not None:
+            self.queue_consumer = asyncio.create_task(self.consume_task_queue())
+            if self.channel_address:
+                await self.start_channel_subscriber()
+            return
+        
+        users_with_notifications = await self.adb.get_users_with_notifications()
+        if users_with_notifications:
+            logger.info(f"Обнаружено {len(users_with_notifications)} пользователей с включенными уведомлениями")
+            self.file_monitor.start(asyncio.get_running_loop())
+            self.monitoring_active = True
+            logger.info("Мониторинг файла запущен автоматически")
+        else:
+            logger.info("Нет пользователей с включенными уведомлениями, мониторинг файла не запущен")
+    
+    async def _post_stop(self, application: Application):
+        if self.channel_task is not None:
+            self.channel_task.cancel()
+            await asyncio.gather(self.channel_task, return_exceptions=True)
+            self.channel_task = None
+        if self.queue_consumer is not None:
+            self.queue_consumer.cancel()
+            await asyncio.gather(self.queue_consumer, return_exceptions=True)
+            self.queue_consumer = None
+        if len(self.digest):
+            logger.info(f"Отправка накопленных подборок: {len(self.digest)} заказов")
+        await self.digest.flush_all()
+    
+    async def _post_shutdown(self, application: Application):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+        if self.monitoring_active:
+            self.file_monitor.stop()
+            self.monitoring_active = False
+        if self.sender:
+            await self.sender.close()
+        self.adb.close()
+        logger.info("Соединения с базой данных закрыты")
+    
+    async def track_update(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        self.updates_handled += 1
+        self.last_update_at = datetime.now().timestamp()
+        UPDATES.inc()
+    
+    async def _heartbeat_job(self, context):
+        details = {'updates': self.updates_handled, 'last_update': self.last_update_at}
+        if self.heartbeat.state != READY:
+            self.heartbeat.ready(**details)
+        else:
+            self.heartbeat.beat(**details)
+    
+    def log_webhook_stats(self, server):
+        stats = server.stats()
+        logger.info(
+            f"Вебхук: обработано {stats['updates']} обновлений, отклонено {stats['rejected']}, "
+            f"ошибок {stats['errors']}; время обработки p50={stats['latency_p50'] * 1000:.1f}мс "
+            f"p95={stats['latency_p95'] * 1000:.1f}мс p99={stats['latency_p99'] * 1000:.1f}мс"
+        )
+    
+    async def _log_webhook_stats_job(self, context):
+        if self.webhook_server is not None:
+            self.log_webhook_stats(self.webhook_server)
+    
+    async def serve(self, application: Application, stop_event: Optional[asyncio.Event] = None):
+        if stop_event is None:
+            stop_event = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.add_signal_handler(signal_number, stop_event.set)
+                except (NotImplementedError, RuntimeError):
+                    pass
+        
+        await application.initialize()
+        await self._post_init(application)
+        await application.start()
+        
+        try:
+            if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+                await self.start_webhook(application)
+            else:
+                await application.updater.start_polling()
+                logger.info("Бот запущен в режиме опроса")
+            
+            await stop_event.wait()
+        finally:
+            if self.webhook_server is not None:
+                await self.webhook_server.stop()
+                self.log_webhook_stats(self.webhook_server)
+            elif application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            await self._post_stop(application)
+            await application.shutdown()
+            await self._post_shutdown(application)
+    
+    async def start_webhook(self, application: Application):
+        from webhook_server import WebhookServer
+        
+        server = WebhookServer(
+            application,
+            host=os.getenv("WEBHOOK_HOST", "0.0.0.0"),
+            port=int(os.getenv("WEBHOOK_PORT", "8443")),
+            path=os.getenv("WEBHOOK_PATH", "/telegram"),
+            secret_token=os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+        )
+        webhook_url = os.getenv("WEBHOOK_URL")
+        
+        try:
+            if not webhook_url:
+                raise ValueError("не задан WEBHOOK_URL")
+            await server.start()
+            await application.bot.set_webhook(
+                url=webhook_url,
+                secret_token=server.secret_token,
+                allowed_updates=Update.ALL_TYPES
+            )
+            self.webhook_server = server
+            application.job_queue.run_repeating(self._log_webhook_stats_job, interval=300, first=300)
+            logger.info(f"Бот запущен в режиме вебхука: {webhook_url}")
+        except Exception as e:
+            logger.error(f"Не удалось запустить вебхук ({e}), бот переключается на опрос")
+            await server.stop()
+            await application.updater.start_polling()
+            logger.info("Бот запущен в режиме опроса")
+    
+    def build_application(self) -> Application:
+        builder = Application.builder().token(self.token)
+        base_url = os.getenv("TELEGRAM_API_BASE_URL")
+        if base_url:
+            builder = builder.base_url(base_url)
+        
+        application = (
+            builder
+            .post_init(self._post_init)
+            .post_stop(self._post_stop)
+            .post_shutdown(self._post_shutdown)
+            .build()
+        )
         self.application = application
+        self.sender = SendScheduler(
+            application.bot.send_message,
+            global_rate=float(os.getenv("SEND_GLOBAL_RATE", "30")),
+            per_chat_rate=float(os.getenv("SEND_PER_CHAT_RATE", "1"))
+        )
         
         keywords_handler = ConversationHandler(
             entry_points=[CallbackQueryHandler(self.set_keywords_start, pattern="^set_keywords$")],
@@ -530,22 +1151,19 @@ class FLNotifyBot:
             fallbacks=[CommandHandler("cancel", self.cancel)]
         )
         
+        application.add_handler(TypeHandler(Update, self.track_update), group=-1)
         application.add_handler(CommandHandler("start", self.start))
         application.add_handler(CommandHandler("menu", self.start))
+        application.add_handler(CommandHandler("search", self.search))
+        application.add_handler(CommandHandler("recent", self.recent))
+        application.add_handler(CallbackQueryHandler(self.search_page, pattern="^search_page_"))
+        application.add_handler(InlineQueryHandler(self.inline_search))
         application.add_handler(keywords_handler)
         application.add_handler(price_filter_handler)
         application.add_handler(CallbackQueryHandler(self.toggle_notifications, pattern="^toggle_notifications_"))
+        application.add_handler(CallbackQueryHandler(self.toggle_digest, pattern="^toggle_digest_"))
         application.add_handler(CallbackQueryHandler(self.menu, pattern="^menu$"))
         
-        users_with_notifications = self.db.get_users_with_notifications()
-        if users_with_notifications:
-            logger.info(f"Обнаружено {len(users_with_notifications)} пользователей с включенными уведомлениями")
-            self.file_monitor.start()
-            self.monitoring_active = True
-            logger.info("Мониторинг файла запущен автоматически")
-        else:
-            logger.info("Нет пользователей с включенными уведомлениями, мониторинг файла не запущен")
-        
         target_time = time(0, 0, 0)
         application.job_queue.run_daily(
             self._send_daily_report_job,
@@ -553,13 +1171,49 @@ class FLNotifyBot:
         )
         logger.info("Запланирована отправка ежедневного отчета в 00:00")
         
-        logger.info("Бот запущен")
-        application.run_polling()
+        application.job_queue.run_repeating(self._heartbeat_job, interval=30, first=0)
+        
+        return application
+    
+    def run(self):
+        application = self.build_application()
+        
+        if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+            try:
+                asyncio.run(self.serve(application))
+            except KeyboardInterrupt:
+                pass
+        else:
+            logger.info("Бот запущен в режиме опроса")
+            application.run_polling()
 
     def update_price_filter(self, user_id: int, price_filter: str, price_min: int = 0) -> None:
         price_filters = [price_filter] if price_filter else ['any']
         self.db.update_price_filters(user_id, price_filters, price_min)
 
+def print_trace_report(days: float):
+    db = Database()
+    since = datetime.now() - timedelta(days=days)
+    report = TraceReport()
+    for trace, delivered in db.get_traces_since(since.timestamp()):
+        report.add(trace, delivered)
+    db.close()
+    
+    print(f"Задержка доставки заказов с {since.strftime('%d.%m.%Y %H:%M')}")
+    print(report.render())
+
 if __name__ == "__main__":
-    bot = FLNotifyBot()
-    bot.run() 
\ No newline at end of file
+    import argparse
+    
+    argument_parser = argparse.ArgumentParser(description="Telegram бот уведомлений о заказах FL.ru")
+    argument_parser.add_argument("--trace", action="store_true",
+                                 help="Показать задержки заказов по этапам от публикации до доставки и выйти")
+    argument_parser.add_argument("--trace-days", type=float, default=1.0,
+                                 help="За сколько последних дней строить отчет --trace")
+    args = argument_parser.parse_args()
+    
+    if args.trace:
+        print_trace_report(args.trace_days)
+    else:
+        bot = FLNotifyBot()
+        bot.run() 
\ No newline at end of file
@@ -1,161 +1,812 @@
 import sqlite3
 import json
-from typing import List, Dict, Any, Optional, Tuple
+import time
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from subscription_index import normalize_keyword
+from settings_cache import SettingsCache
+from rollups import task_rollup_keys, task_day, task_price
+from common.task_model import publication_timestamp
+
+USER_COLUMNS = 'user_id, price_min, notifications_enabled, last_sent_seq, digest_enabled'
 
 class Database:
-    def __init__(self, db_path="user_data.db"):
+    def __init__(self, db_path="user_data.db", synchronous="NORMAL", cache_size=10000):
         self.db_path = db_path
+        self.synchronous = synchronous
+        self.settings_cache = SettingsCache(cache_size)
+        self._enabled_user_ids: Optional[List[int]] = None
+        self.fts_enabled = True
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self._legacy_cursors = False
         self._create_tables()
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=256
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.synchronous}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'connection', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.connection = conn
+            self._local.depth = 0
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connection
+        if self._local.depth:
+            self._local.depth += 1
+            try:
+                yield conn.cursor()
+            finally:
+                self._local.depth -= 1
+            return
+
+        conn.execute("BEGIN IMMEDIATE")
+        self._local.depth = 1
+        try:
+            yield conn.cursor()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            self._local.depth = 0
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+
     def _create_tables(self):
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.transaction() as cursor:
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                keywords TEXT,
+                price_filters TEXT,
+                price_min INTEGER DEFAULT 0,
+                notifications_enabled INTEGER DEFAULT 0,
+                last_sent_id TEXT
+            )
+            ''')
+
+            cursor.execute("PRAGMA table_info(users)")
+            columns = [info[1] for info in cursor.fetchall()]
+
+            if 'price_filter' in columns and 'price_filters' not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN price_filters TEXT DEFAULT '[]'")
+
+                cursor.execute("SELECT user_id, price_filter FROM users")
+                rows = cursor.fetchall()
+
+                cursor.executemany(
+                    "UPDATE users SET price_filters = ? WHERE user_id = ?",
+                    [(json.dumps([price_filter] if price_filter else []), user_id) for user_id, price_filter in rows]
+                )
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_keywords (
+                user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                keyword TEXT NOT NULL,
+                term TEXT NOT NULL,
+                PRIMARY KEY (user_id, position)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_keywords_term ON user_keywords(term)")
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS user_price_filters (
+                user_id INTEGER NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                filter TEXT NOT NULL,
+                PRIMARY KEY (user_id, position)
+            ) WITHOUT ROWID
+            ''')
+
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_users_notifications ON users(notifications_enabled) "
+                "WHERE notifications_enabled = 1"
+            )
+
+            cursor.execute("PRAGMA table_info(tasks)")
+            task_columns = [info[1] for info in cursor.fetchall()]
+            legacy_tasks = bool(task_columns) and 'seq' not in task_columns
+            if legacy_tasks:
+                cursor.execute("ALTER TABLE tasks RENAME TO tasks_legacy")
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                task_id TEXT NOT NULL UNIQUE,
+                source_seq INTEGER,
+                data TEXT NOT NULL,
+                ingested_at TEXT NOT NULL
+            )
+            ''')
+
+            if legacy_tasks:
+                cursor.execute('''
+                INSERT INTO tasks (task_id, data, ingested_at)
+                SELECT task_id, data, ingested_at FROM tasks_legacy ORDER BY rowid
+                ''')
+                cursor.execute("DROP TABLE tasks_legacy")
+
+            cursor.execute("PRAGMA table_info(tasks)")
+            task_columns = [info[1] for info in cursor.fetchall()]
+            if 'price' not in task_columns:
+                cursor.execute("ALTER TABLE tasks ADD COLUMN price INTEGER")
+                cursor.execute("UPDATE tasks SET price = CAST(json_extract(data, '$.price') AS INTEGER)")
+            if 'published_ts' not in task_columns:
+                cursor.execute("ALTER TABLE tasks ADD COLUMN published_ts REAL")
+                cursor.executemany(
+                    "UPDATE tasks SET published_ts = ? WHERE seq = ?",
+                    [(publication_timestamp(json.loads(data)), seq)
+                     for seq, data in cursor.execute("SELECT seq, data FROM tasks").fetchall()]
+                )
+
+            try:
+                cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+                    title, description, full_description,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3 4'
+                )
+                ''')
+            except sqlite3.OperationalError as e:
+                print(f"Полнотекстовый поиск недоступен: {e}")
+                self.fts_enabled = False
+
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_ingested_at ON tasks(ingested_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_published_ts ON tasks(published_ts)")
+
+            if self.fts_enabled and cursor.execute("SELECT 1 FROM tasks_fts LIMIT 1").fetchone() is None:
+                cursor.execute('''
+                INSERT INTO tasks_fts (rowid, title, description, full_description)
+                SELECT seq, json_extract(data, '$.title'), json_extract(data, '$.description'),
+                       json_extract(data, '$.full_description')
+                FROM tasks
+                ''')
+
+            if 'last_sent_seq' not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN last_sent_seq INTEGER")
+            self._legacy_cursors = cursor.execute('''
+            SELECT 1 FROM users WHERE last_sent_seq IS NULL AND last_sent_id IS NOT NULL AND last_sent_id != '' LIMIT 1
+            ''').fetchone() is not None
+            self._resolve_legacy_cursors(cursor)
+
+            if 'digest_enabled' not in columns:
+                cursor.execute("ALTER TABLE users ADD COLUMN digest_enabled INTEGER DEFAULT 0")
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS feed_state (
+                feed TEXT PRIMARY KEY,
+                byte_offset INTEGER NOT NULL,
+                inode INTEGER,
+                head TEXT
+            )
+            ''')
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS deliveries (
+                user_id INTEGER NOT NULL,
+                fingerprint INTEGER NOT NULL,
+                task_id TEXT,
+                sent_at REAL NOT NULL,
+                PRIMARY KEY (user_id, fingerprint)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_sent_at ON deliveries(sent_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_deliveries_task_id ON deliveries(task_id)")
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS task_traces (
+                task_id TEXT NOT NULL,
+                stage TEXT NOT NULL,
+                ts REAL NOT NULL,
+                PRIMARY KEY (task_id, stage)
+            ) WITHOUT ROWID
+            ''')
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_task_traces_stage_ts ON task_traces(stage, ts)")
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS digest_items (
+                user_id INTEGER NOT NULL,
+                task_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                queued_at REAL NOT NULL,
+                PRIMARY KEY (user_id, task_id)
+            )
+            ''')
+
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                day TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value INTEGER NOT NULL,
+                PRIMARY KEY (day, metric, key)
+            ) WITHOUT ROWID
+            ''')
+
+            cursor.execute("PRAGMA user_version")
+            user_version = cursor.fetchone()[0]
+            if user_version < 1:
+                self._migrate_json_columns(cursor)
+            if user_version < 2:
+                self._backfill_rollups(cursor)
+                cursor.execute("PRAGMA user_version = 2")
+
+    def _resolve_legacy_cursors(self, cursor: sqlite3.Cursor) -> None:
+        if not self._legacy_cursors or cursor.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is None:
+            return
+
         cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            user_id INTEGER PRIMARY KEY,
-            keywords TEXT,
-            price_filters TEXT,
-            price_min INTEGER DEFAULT 0,
-            notifications_enabled INTEGER DEFAULT 0,
-            last_sent_id TEXT
+        UPDATE users SET last_sent_seq = COALESCE(
+            (SELECT seq FROM tasks WHERE tasks.task_id = users.last_sent_id),
+            (SELECT MAX(seq) FROM tasks)
         )
+        WHERE last_sent_seq IS NULL AND last_sent_id IS NOT NULL AND last_sent_id != ''
         ''')
-        
-        cursor.execute("PRAGMA table_info(users)")
-        columns = [info[1] for info in cursor.fetchall()]
-        
-        if 'price_filter' in columns and 'price_filters' not in columns:
-            cursor.execute("ALTER TABLE users ADD COLUMN price_filters TEXT DEFAULT '[]'")
-            
-            cursor.execute("SELECT user_id, price_filter FROM users")
-            rows = cursor.fetchall()
-            
-            for user_id, price_filter in rows:
-                price_filters = [price_filter] if price_filter else []
-                cursor.execute(
-                    "UPDATE users SET price_filters = ? WHERE user_id = ?",
-                    (json.dumps(price_filters), user_id)
-                )
-        
-        conn.commit()
-        conn.close()
+        self._legacy_cursors = False
+        self.settings_cache.invalidate()
+        print(f"Курсоры {cursor.rowcount} пользователей перенесены со старого last_sent_id")
+
+    def _backfill_rollups(self, cursor: sqlite3.Cursor) -> None:
+        rollups = Counter()
+        for data, ingested_at in cursor.execute("SELECT data, ingested_at FROM tasks").fetchall():
+            try:
+                record = json.loads(data)
+                ingested = datetime.fromisoformat(ingested_at)
+            except (TypeError, ValueError):
+                continue
+            day = task_day(record, ingested)
+            rollups.update((day, metric, key) for metric, key in task_rollup_keys(record))
+        self._add_rollups(cursor, rollups)
+
+    def _migrate_json_columns(self, cursor: sqlite3.Cursor) -> None:
+        cursor.execute("SELECT user_id, keywords, price_filters FROM users")
+        rows = cursor.fetchall()
+
+        for user_id, keywords_json, price_filters_json in rows:
+            try:
+                keywords = json.loads(keywords_json) if keywords_json else []
+            except ValueError:
+                keywords = []
+            try:
+                price_filters = json.loads(price_filters_json) if price_filters_json is not None else ['any']
+            except ValueError:
+                price_filters = ['any']
+
+            self._write_keywords(cursor, user_id, keywords)
+            self._write_price_filters(cursor, user_id, price_filters)
+
+    def _write_keywords(self, cursor: sqlite3.Cursor, user_id: int, keywords: List[str]) -> None:
+        cursor.execute('DELETE FROM user_keywords WHERE user_id = ?', (user_id,))
+        cursor.executemany(
+            'INSERT INTO user_keywords (user_id, position, keyword, term) VALUES (?, ?, ?, ?)',
+            [(user_id, position, keyword, normalize_keyword(keyword)) for position, keyword in enumerate(keywords)]
+        )
+
+    def _write_price_filters(self, cursor: sqlite3.Cursor, user_id: int, price_filters: List[str]) -> None:
+        cursor.execute('DELETE FROM user_price_filters WHERE user_id = ?', (user_id,))
+        cursor.executemany(
+            'INSERT INTO user_price_filters (user_id, position, filter) VALUES (?, ?, ?)',
+            [(user_id, position, price_filter) for position, price_filter in enumerate(price_filters)]
+        )
+
+    def _fetch_user_lists(self, query: str, params: Tuple = ()) -> Dict[int, List[str]]:
+        result: Dict[int, List[str]] = {}
+        for user_id, value in self.connection.execute(query, params):
+            result.setdefault(user_id, []).append(value)
+        return result
 
     def add_user(self, user_id: int) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-        INSERT OR IGNORE INTO users 
-        (user_id, keywords, price_filters, notifications_enabled, last_sent_id) 
-        VALUES (?, ?, ?, ?, ?)
-        ''', (user_id, json.dumps([]), json.dumps(['any']), 0, ''))
-        
-        conn.commit()
-        conn.close()
-    
+        with self.transaction() as cursor:
+            cursor.execute('''
+            INSERT OR IGNORE INTO users
+            (user_id, notifications_enabled)
+            VALUES (?, ?)
+            ''', (user_id, 0))
+
+            if cursor.rowcount:
+                self._write_price_filters(cursor, user_id, ['any'])
+
+        self.settings_cache.invalidate(user_id)
+
     def user_exists(self, user_id: int) -> bool:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone() is not None
-        
-        conn.close()
-        return result
-    
+        cursor = self.connection.execute('SELECT 1 FROM users WHERE user_id = ?', (user_id,))
+        return cursor.fetchone() is not None
+
     def get_user_settings(self, user_id: int) -> Dict[str, Any]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        settings = self.settings_cache.get(user_id)
+        if settings is not None:
+            return settings
+
+        cursor = self.connection.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE user_id = ?', (user_id,))
         row = cursor.fetchone()
-        
-        conn.close()
-        
+
         if not row:
             return {}
-        
+
         settings = dict(row)
-        settings['keywords'] = json.loads(settings['keywords'])
-        
-        if 'price_filters' in settings:
-            settings['price_filters'] = json.loads(settings['price_filters'])
-        else:
-            old_filter = settings.get('price_filter', 'any')
-            settings['price_filters'] = [old_filter] if old_filter else ['any']
-        
+        settings['keywords'] = self._fetch_user_lists(
+            'SELECT user_id, keyword FROM user_keywords WHERE user_id = ? ORDER BY position', (user_id,)
+        ).get(user_id, [])
+        settings['price_filters'] = self._fetch_user_lists(
+            'SELECT user_id, filter FROM user_price_filters WHERE user_id = ? ORDER BY position', (user_id,)
+        ).get(user_id, [])
+
+        self.settings_cache.put(user_id, settings)
         return settings
-    
+
     def update_keywords(self, user_id: int, keywords: List[str]) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET keywords = ? WHERE user_id = ?', 
-            (json.dumps(keywords), user_id)
-        )
-        
-        conn.commit()
-        conn.close()
-    
+        with self.transaction() as cursor:
+            self._write_keywords(cursor, user_id, keywords)
+
+        self.settings_cache.update(user_id, keywords=keywords)
+
     def update_price_filters(self, user_id: int, price_filters: List[str], price_min: int = 0) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET price_filters = ?, price_min = ? WHERE user_id = ?', 
-            (json.dumps(price_filters), price_min, user_id)
-        )
-        
-        conn.commit()
-        conn.close()
-    
+        with self.transaction() as cursor:
+            cursor.execute('UPDATE users SET price_min = ? WHERE user_id = ?', (price_min, user_id))
+            self._write_price_filters(cursor, user_id, price_filters)
+
+        self.settings_cache.update(user_id, price_filters=price_filters, price_min=price_min)
+
     def toggle_notifications(self, user_id: int, enabled: bool) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            'UPDATE users SET notifications_enabled = ? WHERE user_id = ?', 
-            (1 if enabled else 0, user_id)
+        with self.transaction() as cursor:
+            cursor.execute(
+                'UPDATE users SET notifications_enabled = ? WHERE user_id = ?',
+                (1 if enabled else 0, user_id)
+            )
+            changed = cursor.rowcount
+
+        self.settings_cache.update(user_id, notifications_enabled=1 if enabled else 0)
+
+        enabled_user_ids = self._enabled_user_ids
+        if changed and enabled_user_ids is not None:
+            if enabled and user_id not in enabled_user_ids:
+                self._enabled_user_ids = enabled_user_ids + [user_id]
+            elif not enabled and user_id in enabled_user_ids:
+                self._enabled_user_ids = [uid for uid in enabled_user_ids if uid != user_id]
+
+    def toggle_digest(self, user_id: int, enabled: bool) -> None:
+        with self.transaction() as cursor:
+            cursor.execute(
+                'UPDATE users SET digest_enabled = ? WHERE user_id = ?',
+                (1 if enabled else 0, user_id)
+            )
+
+        self.settings_cache.update(user_id, digest_enabled=1 if enabled else 0)
+
+    def set_cursor(self, user_id: int, seq: Optional[int]) -> None:
+        with self.transaction() as cursor:
+            cursor.execute('UPDATE users SET last_sent_seq = ? WHERE user_id = ?', (seq, user_id))
+
+        self.settings_cache.update(user_id, last_sent_seq=seq)
+
+    def advance_cursors(self, seq: int, initialize: bool = True) -> int:
+        with self.transaction() as cursor:
+            cursor.execute(f'''
+                UPDATE users SET last_sent_seq = ?
+                WHERE notifications_enabled = 1 AND ({'last_sent_seq IS NULL OR ' if initialize else ''}last_sent_seq < ?)
+            ''', (seq, seq))
+            advanced = cursor.rowcount
+
+        self.settings_cache.advance_cursors(seq, initialize)
+        return advanced
+
+    def get_users_with_notifications(self) -> List[Dict[str, Any]]:
+        enabled_user_ids = self._enabled_user_ids
+        if enabled_user_ids is not None:
+            users = []
+            for user_id in enabled_user_ids:
+                settings = self.settings_cache.get(user_id)
+                if settings is None:
+                    break
+                users.append(settings)
+            else:
+                return users
+
+        cursor = self.connection.cursor()
+        cursor.row_factory = sqlite3.Row
+        cursor.execute(f'SELECT {USER_COLUMNS} FROM users WHERE notifications_enabled = 1')
+        users = [dict(row) for row in cursor.fetchall()]
+
+        keywords = self._fetch_user_lists('''
+            SELECT k.user_id, k.keyword FROM user_keywords k
+            JOIN users u ON u.user_id = k.user_id
+            WHERE u.notifications_enabled = 1
+            ORDER BY k.user_id, k.position
+        ''')
+        price_filters = self._fetch_user_lists('''
+            SELECT f.user_id, f.filter FROM user_price_filters f
+            JOIN users u ON u.user_id = f.user_id
+            WHERE u.notifications_enabled = 1
+            ORDER BY f.user_id, f.position
+        ''')
+
+        for user in users:
+            user['keywords'] = keywords.get(user['user_id'], [])
+            user['price_filters'] = price_filters.get(user['user_id'], [])
+            self.settings_cache.put(user['user_id'], user)
+
+        if len(users) <= self.settings_cache.max_size:
+            self._enabled_user_ids = [user['user_id'] for user in users]
+        else:
+            self._enabled_user_ids = None
+
+        return users
+
+    def get_feed_state(self, feed: str) -> Optional[Dict[str, Any]]:
+        row = self.connection.execute(
+            'SELECT byte_offset, inode, head FROM feed_state WHERE feed = ?', (feed,)
+        ).fetchone()
+        if not row:
+            return None
+        return {'offset': row[0], 'inode': row[1], 'head': row[2]}
+
+    def ingest_tasks(self, records: List[Dict[str, Any]], feed: Optional[str] = None,
+                     state: Optional[Dict[str, Any]] = None) -> List[str]:
+        new_ids = []
+        now = datetime.now()
+        ingested_at = now.isoformat()
+        rollups = Counter()
+
+        with self.transaction() as cursor:
+            for record in records:
+                task_id = str(record['id'])
+                data = json.dumps({key: value for key, value in record.items() if key != 'id'}, ensure_ascii=False)
+
+                price = task_price(record)
+                published_ts = publication_timestamp(record)
+
+                cursor.execute(
+                    'INSERT OR IGNORE INTO tasks (task_id, source_seq, data, ingested_at, price, published_ts) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (task_id, record.get('seq'), data, ingested_at, price, published_ts)
+                )
+                if cursor.rowcount:
+                    new_ids.append(task_id)
+                    day = task_day(record, now)
+                    rollups.update((day, metric, key) for metric, key in task_rollup_keys(record))
+                    self._index_task(cursor, cursor.lastrowid, record)
+                    self._record_trace(cursor, task_id, record, published_ts, now.timestamp())
+                    continue
+
+                cursor.execute(
+                    'UPDATE tasks SET data = ?, price = ?, published_ts = ? WHERE task_id = ? AND data != ?',
+                    (data, price, published_ts, task_id, data)
+                )
+                if cursor.rowcount:
+                    seq = cursor.execute('SELECT seq FROM tasks WHERE task_id = ?', (task_id,)).fetchone()[0]
+                    self._index_task(cursor, seq, record, replace=True)
+
+            if feed is not None and state is not None:
+                cursor.execute(
+                    'INSERT OR REPLACE INTO feed_state (feed, byte_offset, inode, head) VALUES (?, ?, ?, ?)',
+                    (feed, state['offset'], state.get('inode'), state.get('head'))
+                )
+
+            self._add_rollups(cursor, rollups)
+            if new_ids:
+                self._resolve_legacy_cursors(cursor)
+
+        return new_ids
+
+    def _record_trace(self, cursor: sqlite3.Cursor, task_id: str, record: Dict[str, Any],
+                      published_ts: float, ingested_ts: float) -> None:
+        stages = dict(record.get('trace') or {})
+        if published_ts:
+            stages['posted'] = published_ts
+        stages['ingested'] = ingested_ts
+        cursor.executemany(
+            'INSERT OR IGNORE INTO task_traces (task_id, stage, ts) VALUES (?, ?, ?)',
+            [(task_id, stage, ts) for stage, ts in stages.items() if isinstance(ts, (int, float))]
         )
-        
-        conn.commit()
-        conn.close()
-    
-    def update_last_sent_id(self, user_id: int, task_id: str) -> None:
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+
+    def record_trace_stages(self, stages: List[Tuple[str, str, float]]) -> None:
+        if not stages:
+            return
+        with self.transaction() as cursor:
+            cursor.executemany('INSERT OR IGNORE INTO task_traces (task_id, stage, ts) VALUES (?, ?, ?)', stages)
+
+    def get_task_traces(self, task_ids: List[str]) -> Dict[str, Dict[str, float]]:
+        traces: Dict[str, Dict[str, float]] = {}
+        task_ids = list(task_ids)
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            rows = self.connection.execute(
+                f'SELECT task_id, stage, ts FROM task_traces WHERE task_id IN ({",".join("?" * len(chunk))})', chunk
+            )
+            for task_id, stage, ts in rows:
+                traces.setdefault(task_id, {})[stage] = ts
+        return traces
+
+    def get_traces_since(self, since_ts: float) -> List[Tuple[Dict[str, float], List[float]]]:
+        task_ids = [row[0] for row in self.connection.execute(
+            "SELECT task_id FROM task_traces WHERE stage = 'ingested' AND ts >= ?", (since_ts,)
+        )]
+        traces = self.get_task_traces(task_ids)
+
+        deliveries: Dict[str, List[float]] = {}
+        for start in range(0, len(task_ids), 500):
+            chunk = task_ids[start:start + 500]
+            rows = self.connection.execute(
+                f'SELECT task_id, MIN(sent_at) FROM deliveries WHERE task_id IN ({",".join("?" * len(chunk))}) '
+                'GROUP BY task_id, user_id', chunk
+            )
+            for task_id, sent_at in rows:
+                deliveries.setdefault(task_id, []).append(sent_at)
+
+        return [(traces.get(task_id, {}), deliveries.get(task_id, [])) for task_id in task_ids]
+
+    def prune_traces(self, ttl_seconds: float) -> int:
+        with self.transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM task_traces WHERE task_id IN "
+                "(SELECT task_id FROM task_traces WHERE stage = 'ingested' AND ts < ?)",
+                (time.time() - ttl_seconds,)
+            )
+            return cursor.rowcount
+
+    def _index_task(self, cursor: sqlite3.Cursor, seq: int, record: Dict[str, Any], replace: bool = False) -> None:
+        if not self.fts_enabled:
+            return
+
+        if replace:
+            cursor.execute('DELETE FROM tasks_fts WHERE rowid = ?', (seq,))
         cursor.execute(
-            'UPDATE users SET last_sent_id = ? WHERE user_id = ?', 
-            (task_id, user_id)
+            'INSERT INTO tasks_fts (rowid, title, description, full_description) VALUES (?, ?, ?, ?)',
+            (seq, record.get('title', ''), record.get('description', ''), record.get('full_description', ''))
         )
-        
-        conn.commit()
-        conn.close()
-    
-    def get_users_with_notifications(self) -> List[Dict[str, Any]]:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT * FROM users WHERE notifications_enabled = 1')
-        rows = cursor.fetchall()
-        
-        users = []
-        for row in rows:
-            user = dict(row)
-            user['keywords'] = json.loads(user['keywords'])
-            
-            if 'price_filters' in user:
-                user['price_filters'] = json.loads(user['price_filters'])
-            else:
-                old_filter = user.get('price_filter', 'any')
-                user['price_filters'] = [old_filter] if old_filter else ['any']
-            
-            users.append(user)
-        
-        conn.close()
-        return users
\ No newline at end of file
+
+    def search_tasks(self, match: Optional[str], price_min: Optional[int] = None, price_max: Optional[int] = None,
+                     since: Optional[float] = None, limit: int = 5, offset: int = 0,
+                     candidates: int = 2000) -> List[Tuple[int, str, Dict[str, Any]]]:
+        conditions = []
+        params: List[Any] = []
+
+        if since is not None:
+            conditions.append('t.published_ts >= ?')
+            params.append(since)
+        if price_min is not None:
+            conditions.append('t.price >= ?')
+            params.append(price_min)
+        if price_max is not None:
+            conditions.append('t.price <= ?')
+            params.append(price_max)
+
+        if not match:
+            query = 'SELECT t.seq, t.task_id, t.data FROM tasks t'
+            if conditions:
+                query += ' WHERE ' + ' AND '.join(conditions)
+            query += ' ORDER BY t.seq DESC LIMIT ? OFFSET ?'
+            rows = self.connection.execute(query, params + [limit, offset])
+            return [(seq, task_id, json.loads(data)) for seq, task_id, data in rows]
+
+        if not self.fts_enabled:
+            return []
+
+        source = 'FROM tasks_fts JOIN tasks t ON t.seq = tasks_fts.rowid WHERE tasks_fts MATCH ?'
+        params.insert(0, match)
+        for condition in conditions:
+            source += f' AND {condition}'
+
+        oldest = self.connection.execute(
+            f'SELECT tasks_fts.rowid {source} ORDER BY tasks_fts.rowid DESC LIMIT 1 OFFSET ?',
+            params + [candidates - 1]
+        ).fetchone()
+        if oldest is not None:
+            source += ' AND tasks_fts.rowid >= ?'
+            params.append(oldest[0])
+
+        rows = self.connection.execute(
+            f'SELECT t.seq, t.task_id, t.data {source} '
+            'ORDER BY bm25(tasks_fts, 5.0, 2.0, 1.0), t.seq DESC LIMIT ? OFFSET ?',
+            params + [limit, offset]
+        )
+        return [(seq, task_id, json.loads(data)) for seq, task_id, data in rows]
+
+    def _add_rollups(self, cursor: sqlite3.Cursor, counts: Dict[Tuple[str, str, str], int]) -> None:
+        cursor.executemany('''
+            INSERT INTO daily_rollups (day, metric, key, value) VALUES (?, ?, ?, ?)
+            ON CONFLICT (day, metric, key) DO UPDATE SET value = value + excluded.value
+        ''', [(day, metric, key, value) for (day, metric, key), value in counts.items() if value])
+
+    def add_rollups(self, counts: Dict[Tuple[str, str], int], day: Optional[str] = None) -> None:
+        if not counts:
+            return
+
+        day = day or datetime.now().date().isoformat()
+        with self.transaction() as cursor:
+            self._add_rollups(cursor, {(day, metric, key): value for (metric, key), value in counts.items()})
+
+    def get_daily_rollup(self, day: str) -> Dict[str, Dict[str, int]]:
+        rollup: Dict[str, Dict[str, int]] = {}
+        for metric, key, value in self.connection.execute(
+            'SELECT metric, key, value FROM daily_rollups WHERE day = ?', (day,)
+        ):
+            rollup.setdefault(metric, {})[key] = value
+        return rollup
+
+    def prune_rollups(self, before_day: str) -> int:
+        with self.transaction() as cursor:
+            cursor.execute('DELETE FROM daily_rollups WHERE day < ?', (before_day,))
+            return cursor.rowcount
+
+    def get_tasks_since(self, after_seq: int, until_seq: Optional[int] = None) -> List[Tuple[int, str, Dict[str, Any]]]:
+        query = 'SELECT seq, task_id, data FROM tasks WHERE seq > ?'
+        params = [after_seq]
+        if until_seq is not None:
+            query += ' AND seq <= ?'
+            params.append(until_seq)
+        query += ' ORDER BY seq'
+
+        return [(seq, task_id, json.loads(data)) for seq, task_id, data in self.connection.execute(query, params)]
+
+    def get_task_timestamps(self, after_seq: int = 0) -> List[Tuple[int, float]]:
+        return self.connection.execute(
+            'SELECT seq, published_ts FROM tasks WHERE seq > ? ORDER BY seq', (after_seq,)
+        ).fetchall()
+
+    def get_tasks_by_seqs(self, seqs: List[int]) -> List[Tuple[int, str, Dict[str, Any]]]:
+        tasks = {}
+        for start in range(0, len(seqs), 500):
+            chunk = seqs[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            for seq, task_id, data in self.connection.execute(
+                f'SELECT seq, task_id, data FROM tasks WHERE seq IN ({placeholders})', chunk
+            ):
+                tasks[seq] = (seq, task_id, json.loads(data))
+        return [tasks[seq] for seq in seqs if seq in tasks]
+
+    def get_latest_seq(self) -> Optional[int]:
+        return self.connection.execute('SELECT MAX(seq) FROM tasks').fetchone()[0]
+
+    def get_latest_source_seq(self) -> int:
+        return self.connection.execute('SELECT MAX(source_seq) FROM tasks').fetchone()[0] or 0
+
+    def get_latest_task_id(self) -> Optional[str]:
+        row = self.connection.execute('SELECT task_id FROM tasks ORDER BY seq DESC LIMIT 1').fetchone()
+        return row[0] if row else None
+
+    def delivered_fingerprints(self, user_id: int, fingerprints: List[int]) -> List[int]:
+        fingerprints = list(fingerprints)
+        delivered = []
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            delivered.extend(row[0] for row in self.connection.execute(
+                f'SELECT fingerprint FROM deliveries WHERE user_id = ? AND fingerprint IN ({placeholders})',
+                [user_id, *chunk]
+            ))
+        return delivered
+
+    def record_deliveries(self, deliveries: List[Tuple[int, int, str]], sent_at: Optional[float] = None) -> None:
+        if not deliveries:
+            return
+
+        sent_at = sent_at if sent_at is not None else time.time()
+        with self.transaction() as cursor:
+            cursor.executemany(
+                'INSERT OR REPLACE INTO deliveries (user_id, fingerprint, task_id, sent_at) VALUES (?, ?, ?, ?)',
+                [(user_id, fingerprint, task_id, sent_at) for user_id, fingerprint, task_id in deliveries]
+            )
+
+    def queue_digest_items(self, items: List[Tuple[int, Dict[str, Any]]]) -> None:
+        if not items:
+            return
+
+        queued_at = time.time()
+        with self.transaction() as cursor:
+            cursor.executemany(
+                'INSERT OR REPLACE INTO digest_items (user_id, task_id, data, queued_at) VALUES (?, ?, ?, ?)',
+                [(user_id, notification['task_id'], json.dumps(notification, ensure_ascii=False), queued_at)
+                 for user_id, notification in items]
+            )
+
+    def get_digest_items(self) -> List[Tuple[int, Dict[str, Any]]]:
+        rows = self.connection.execute('SELECT user_id, data FROM digest_items ORDER BY rowid').fetchall()
+        return [(user_id, json.loads(data)) for user_id, data in rows]
+
+    def finish_digest(self, user_id: int, task_ids: List[str], deliveries: List[Tuple[int, int, str]]) -> None:
+        with self.transaction() as cursor:
+            self.record_deliveries(deliveries)
+            cursor.executemany(
+                'DELETE FROM digest_items WHERE user_id = ? AND task_id = ?',
+                [(user_id, task_id) for task_id in task_ids]
+            )
+
+    def prune_deliveries(self, ttl_seconds: float) -> int:
+        with self.transaction() as cursor:
+            cursor.execute('DELETE FROM deliveries WHERE sent_at < ?', (time.time() - ttl_seconds,))
+            return cursor.rowcount
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self.settings_cache.stats()
+
+    def get_users_by_keyword(self, keyword: str, enabled_only: bool = True) -> List[int]:
+        query = '''
+            SELECT DISTINCT k.user_id FROM user_keywords k
+            JOIN users u ON u.user_id = k.user_id
+            WHERE k.term = ?
+        '''
+        if enabled_only:
+            query += ' AND u.notifications_enabled = 1'
+
+        return [row[0] for row in self.connection.execute(query, (normalize_keyword(keyword),))]
+
+    def get_keyword_terms(self) -> List[Tuple[str, int]]:
+        return self.connection.execute('''
+            SELECT k.term, COUNT(*) FROM user_keywords k
+            JOIN users u ON u.user_id = k.user_id
+            WHERE u.notifications_enabled = 1
+            GROUP BY k.term
+            ORDER BY COUNT(*) DESC
+        ''').fetchall()
+
+
+class AsyncDatabase:
+    def __init__(self, db: Database, observer: Optional[Callable[[str, float], None]] = None):
+        self.db = db
+        self.observer = observer
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="database")
+
+    async def _execute(self, name: str, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        finally:
+            if self.observer is not None:
+                self.observer(name, time.perf_counter() - started)
+
+    def __getattr__(self, name):
+        attribute = getattr(self.db, name)
+        if not callable(attribute):
+            return attribute
+
+        async def call(*args, **kwargs):
+            return await self._execute(name, attribute, *args, **kwargs)
+
+        return call
+
+    async def run(self, func, *args, **kwargs):
+        return await self._execute(getattr(func, '__name__', 'run'), func, *args, **kwargs)
+
+    def close(self) -> None:
+        self._executor.submit(self.db.close).result()
+        self._executor.shutdown(wait=True)
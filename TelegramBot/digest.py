@@ -0,0 +1,86 @@
+import asyncio
+from typing import Dict, List, Any, Tuple, Callable
+
+MESSAGE_LIMIT = 4096
+ELLIPSIS = '…'
+
+Entry = Tuple[Callable[[str], str], str]
+
+
+def fit_entry(render: Callable[[str], str], text: str, budget: int) -> str:
+    entry = render(text)
+    if len(entry) <= budget:
+        return entry
+
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if len(render(f"{text[:middle]}{ELLIPSIS}")) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return render(f"{text[:low]}{ELLIPSIS}")
+
+
+def split_messages(header: str, entries: List[Entry], limit: int = MESSAGE_LIMIT) -> List[Tuple[str, List[int]]]:
+    messages = []
+    text = header
+    included = []
+    budget = limit - len(header) - 2
+
+    for position, (render, raw_text) in enumerate(entries):
+        entry = fit_entry(render, raw_text, budget)
+
+        if included and len(text) + 2 + len(entry) > limit:
+            messages.append((text, included))
+            text = header
+            included = []
+
+        text = f"{text}\n\n{entry}"
+        included.append(position)
+
+    if included:
+        messages.append((text, included))
+    return messages
+
+
+class DigestCollector:
+    def __init__(self, flush, window: float = 300.0, max_items: int = 10):
+        self.flush_callback = flush
+        self.window = window
+        self.max_items = max_items
+        self.pending: Dict[int, List[Dict[str, Any]]] = {}
+        self.timers: Dict[int, asyncio.TimerHandle] = {}
+        self.flushing = set()
+
+    def __len__(self) -> int:
+        return sum(len(items) for items in self.pending.values())
+
+    def add(self, user_id: int, notification: Dict[str, Any]) -> None:
+        items = self.pending.setdefault(user_id, [])
+        items.append(notification)
+
+        if len(items) >= self.max_items:
+            self.flush(user_id)
+        elif user_id not in self.timers:
+            loop = asyncio.get_running_loop()
+            self.timers[user_id] = loop.call_later(self.window, self.flush, user_id)
+
+    def flush(self, user_id: int) -> None:
+        timer = self.timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+
+        items = self.pending.pop(user_id, None)
+        if not items:
+            return
+
+        task = asyncio.get_running_loop().create_task(self.flush_callback(user_id, items))
+        self.flushing.add(task)
+        task.add_done_callback(self.flushing.discard)
+
+    async def flush_all(self) -> None:
+        for user_id in list(self.pending):
+            self.flush(user_id)
+        if self.flushing:
+            await asyncio.gather(*self.flushing, return_exceptions=True)
@@ -1,48 +1,114 @@
 import os
 import time
 import asyncio
-from threading import Thread
+import traceback
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from dotenv import load_dotenv
 
 load_dotenv()
 
-loop = asyncio.new_event_loop()
+class TaskFileHandler(FileSystemEventHandler):
+    def __init__(self, file_name, notify):
+        self.file_name = file_name
+        self.notify = notify
 
-def run_async_callback(callback):
-    asyncio.set_event_loop(loop)
-    loop.run_until_complete(callback())
+    def _matches(self, path) -> bool:
+        return bool(path) and os.path.basename(path) == self.file_name
 
-class TaskFileHandler(FileSystemEventHandler):
-    def __init__(self, callback):
-        self.callback = callback
-        self.last_modified = time.time()
-        
     def on_modified(self, event):
-        if not event.is_directory and event.src_path.endswith(os.getenv("DATA_FILE_PATH").split('/')[-1]):
-            current_time = time.time()
-            if current_time - self.last_modified > 1:
-                self.last_modified = current_time
-                thread = Thread(target=run_async_callback, args=(self.callback,))
-                thread.daemon = True
-                thread.start()
-                print(f"Файл {event.src_path} изменен, запущена обработка обновлений")
+        if not event.is_directory and self._matches(event.src_path):
+            self.notify(event.src_path)
+
+    def on_created(self, event):
+        self.on_modified(event)
+
+    def on_moved(self, event):
+        if not event.is_directory and self._matches(getattr(event, 'dest_path', '')):
+            self.notify(event.dest_path)
 
 class FileMonitor:
-    def __init__(self, callback):
-        data_file_path = os.getenv("DATA_FILE_PATH")
+    def __init__(self, callback, file_path=None, debounce=None, max_delay=None):
+        data_file_path = file_path or os.getenv("DATA_FILE_PATH")
         self.file_path = os.path.abspath(data_file_path)
         self.directory = os.path.dirname(self.file_path)
-        self.event_handler = TaskFileHandler(callback)
+        self.callback = callback
+        self.debounce = debounce if debounce is not None else float(os.getenv("FILE_MONITOR_DEBOUNCE", "1.0"))
+        self.max_delay = max_delay if max_delay is not None else float(os.getenv("FILE_MONITOR_MAX_DELAY", "10.0"))
+        self.event_handler = TaskFileHandler(os.path.basename(self.file_path), self._on_file_event)
+        self.observer = None
+        self.loop = None
+        self._timer = None
+        self._burst_started = None
+        self._running = None
+        self._pending = False
+        self.events = 0
+        self.passes = 0
+
+    def _on_file_event(self, path):
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self):
+        self.events += 1
+        now = time.monotonic()
+        if self._burst_started is None:
+            self._burst_started = now
+
+        if self._timer is not None:
+            self._timer.cancel()
+
+        delay = min(self.debounce, max(0.0, self._burst_started + self.max_delay - now))
+        self._timer = self.loop.call_later(delay, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        self._burst_started = None
+
+        if self._running is not None and not self._running.done():
+            self._pending = True
+            return
+
+        self._running = self.loop.create_task(self._run_callback())
+
+    async def _run_callback(self):
+        while True:
+            self._pending = False
+            self.passes += 1
+            print(f"Файл {self.file_path} изменен, запущена обработка обновлений")
+            try:
+                await self.callback()
+            except Exception as e:
+                print(f"Ошибка при обработке обновлений: {e}")
+                print(traceback.format_exc())
+
+            if not self._pending:
+                break
+
+    def trigger(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._schedule)
+
+    def start(self, loop=None):
+        if self.observer is not None:
+            return
+
+        self.loop = loop or asyncio.get_running_loop()
         self.observer = Observer()
-        
-    def start(self):
         self.observer.schedule(self.event_handler, self.directory, recursive=False)
         self.observer.start()
         print(f"Начат мониторинг файла: {self.file_path}")
-        
+
     def stop(self):
+        if self.observer is None:
+            return
+
         self.observer.stop()
         self.observer.join()
-        print("Мониторинг файла остановлен") 
\ No newline at end of file
+        self.observer = None
+
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        print("Мониторинг файла остановлен")
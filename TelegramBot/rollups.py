@@ -0,0 +1,53 @@
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+
+TASKS = 'tasks'
+PAYMENT_TYPE = 'payment_type'
+PRICE_BUCKET = 'price_bucket'
+MATCHES = 'matches'
+
+PAYMENT_TYPES = {
+    'fixed': 'Фиксированная оплата',
+    'hourly': 'Почасовая оплата',
+    'negotiated': 'По договоренности',
+    'unknown': 'Не определен'
+}
+
+PRICE_BUCKETS: List[Tuple[str, int, Optional[int], str]] = [
+    ('negotiated', 0, 0, 'Без цены'),
+    ('starter', 1, 4999, 'до 5 000 руб.'),
+    ('basic_plus', 5000, 9999, '5 000 – 9 999 руб.'),
+    ('pro', 10000, 19999, '10 000 – 19 999 руб.'),
+    ('business', 20000, 39999, '20 000 – 39 999 руб.'),
+    ('enterprise', 40000, None, 'от 40 000 руб.')
+]
+
+
+def task_price(task: Dict[str, Any]) -> int:
+    try:
+        return int(task.get('price') or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def price_bucket(task: Dict[str, Any]) -> str:
+    price = task_price(task)
+    for key, low, high, _ in PRICE_BUCKETS:
+        if price >= low and (high is None or price <= high):
+            return key
+    return PRICE_BUCKETS[0][0]
+
+
+def task_day(task: Dict[str, Any], default: datetime) -> str:
+    try:
+        return datetime.fromisoformat(task.get('processed_at') or '').date().isoformat()
+    except (TypeError, ValueError):
+        return default.date().isoformat()
+
+
+def task_rollup_keys(task: Dict[str, Any]) -> List[Tuple[str, str]]:
+    return [
+        (TASKS, ''),
+        (PAYMENT_TYPE, task.get('payment_type') or 'unknown'),
+        (PRICE_BUCKET, price_bucket(task))
+    ]
@@ -0,0 +1,34 @@
+import re
+from typing import Dict, List, Any, Optional
+
+WORD_PATTERN = re.compile(r'\w+', re.UNICODE)
+FILTER_PATTERN = re.compile(r'^(от|до|дней):(\d+)$', re.IGNORECASE)
+
+PAGE_SIZE = 5
+INLINE_PAGE_SIZE = 20
+
+
+def parse_search_query(text: str) -> Dict[str, Any]:
+    query: Dict[str, Any] = {'terms': [], 'price_min': None, 'price_max': None, 'days': None}
+
+    for token in (text or '').split():
+        match = FILTER_PATTERN.match(token)
+        if match:
+            name, value = match.group(1).lower(), int(match.group(2))
+            if name == 'от':
+                query['price_min'] = value
+            elif name == 'до':
+                query['price_max'] = value
+            else:
+                query['days'] = value
+            continue
+
+        query['terms'].extend(word.lower() for word in WORD_PATTERN.findall(token))
+
+    return query
+
+
+def match_expression(terms: List[str]) -> Optional[str]:
+    if not terms:
+        return None
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
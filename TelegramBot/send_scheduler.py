@@ -0,0 +1,186 @@
+import time
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+from typing import Dict, Any, Callable, Awaitable, Deque, Optional, Tuple
+from telegram.error import RetryAfter, TimedOut, NetworkError
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SWEEP_INTERVAL = 60.0
+
+
+def percentile(values, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[position]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        now = time.monotonic()
+        self._refill(now)
+
+        if now < self.paused_until:
+            return self.paused_until - now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self) -> None:
+        while True:
+            delay = self.reserve()
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    def is_idle(self, now: float) -> bool:
+        return now >= self.paused_until and self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class SendScheduler:
+    def __init__(self, send: Callable[..., Awaitable[Any]], global_rate: float = 30, per_chat_rate: float = 1,
+                 max_retries: int = 3, latency_window: int = 10000):
+        self.send = send
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.max_retries = max_retries
+        self.chat_buckets: Dict[int, TokenBucket] = {}
+        self.chat_queues: Dict[int, Deque[Tuple[Dict[str, Any], asyncio.Future, float]]] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.swept_at = time.monotonic()
+        self.latencies: Deque[float] = deque(maxlen=latency_window)
+        self.pending = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+    def submit(self, chat_id: int, **kwargs) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self.chat_queues.setdefault(chat_id, deque()).append((kwargs, future, time.monotonic()))
+        self.pending += 1
+        self._evict_idle_buckets()
+
+        worker = self.workers.get(chat_id)
+        if worker is None or worker.done():
+            self.workers[chat_id] = loop.create_task(self._chat_worker(chat_id))
+
+        return future
+
+    async def _chat_worker(self, chat_id: int) -> None:
+        queue = self.chat_queues[chat_id]
+        bucket = self.chat_buckets.setdefault(chat_id, TokenBucket(self.per_chat_rate, 1))
+
+        try:
+            while queue:
+                kwargs, future, enqueued_at = queue.popleft()
+                self.pending -= 1
+                self.in_flight += 1
+                try:
+                    result = await self._deliver(chat_id, bucket, kwargs)
+                except Exception as e:
+                    self.failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    self.sent += 1
+                    self.latencies.append(time.monotonic() - enqueued_at)
+                    if not future.done():
+                        future.set_result(result)
+                finally:
+                    self.in_flight -= 1
+        finally:
+            if not queue:
+                self.chat_queues.pop(chat_id, None)
+            if self.workers.get(chat_id) is asyncio.current_task():
+                del self.workers[chat_id]
+
+    def _evict_idle_buckets(self) -> None:
+        now = time.monotonic()
+        if now - self.swept_at < BUCKET_SWEEP_INTERVAL:
+            return
+        self.swept_at = now
+        for chat_id, bucket in list(self.chat_buckets.items()):
+            if chat_id not in self.chat_queues and bucket.is_idle(now):
+                del self.chat_buckets[chat_id]
+
+    async def _deliver(self, chat_id: int, bucket: TokenBucket, kwargs: Dict[str, Any]) -> Any:
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            await self.global_bucket.acquire()
+            try:
+                return await self.send(chat_id=chat_id, **kwargs)
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, timedelta):
+                    retry_after = retry_after.total_seconds()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Ограничение Telegram для чата {chat_id}: повтор через {retry_after} с")
+                self.global_bucket.pause(float(retry_after))
+                bucket.pause(float(retry_after))
+            except (TimedOut, NetworkError) as e:
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Сетевая ошибка при отправке в чат {chat_id}: {e}, попытка {attempt}")
+                await asyncio.sleep(min(2 ** attempt, 30))
+
+    async def join(self) -> None:
+        while self.workers:
+            await asyncio.gather(*list(self.workers.values()), return_exceptions=True)
+
+    async def close(self) -> None:
+        for worker in list(self.workers.values()):
+            worker.cancel()
+        await asyncio.gather(*list(self.workers.values()), return_exceptions=True)
+        for queue in self.chat_queues.values():
+            for _, future, _ in queue:
+                if not future.done():
+                    future.cancel()
+        self.chat_queues.clear()
+        self.chat_buckets.clear()
+        self.workers.clear()
+        self.pending = 0
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            'queue_depth': self.pending,
+            'in_flight': self.in_flight,
+            'active_chats': len(self.workers),
+            'sent': self.sent,
+            'failed': self.failed,
+            'retries': self.retries,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_p99': percentile(latencies, 0.99)
+        }
@@ -0,0 +1,83 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+def copy_settings(settings: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(settings)
+    for key in ('keywords', 'price_filters'):
+        if key in result:
+            result[key] = list(result[key])
+    return result
+
+
+class SettingsCache:
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[int, Dict[str, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._entries
+
+    def get(self, user_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            settings = self._entries.get(user_id)
+            if settings is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return copy_settings(settings)
+
+    def put(self, user_id: int, settings: Dict[str, Any]) -> None:
+        if self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[user_id] = copy_settings(settings)
+            self._entries.move_to_end(user_id)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def update(self, user_id: int, **fields) -> None:
+        with self._lock:
+            settings = self._entries.get(user_id)
+            if settings is not None:
+                settings.update(copy_settings(fields))
+
+    def advance_cursors(self, seq: int, initialize: bool = True) -> None:
+        with self._lock:
+            for settings in self._entries.values():
+                if settings.get('notifications_enabled') == 1:
+                    current = settings.get('last_sent_seq')
+                    if (current is None and initialize) or (current is not None and current < seq):
+                        settings['last_sent_seq'] = seq
+
+    def invalidate(self, user_id: Optional[int] = None) -> None:
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / requests if requests else 0.0
+            }
@@ -0,0 +1,166 @@
+import bisect
+from typing import Dict, List, Any, Iterable, Set
+
+
+def normalize_keyword(keyword: str) -> str:
+    return keyword.strip().lower()
+
+
+def task_text(task: Dict[str, Any]) -> str:
+    return task.get('full_description') or task.get('description', '')
+
+
+def task_matches_settings(task: Dict[str, Any], user_settings: Dict[str, Any]) -> bool:
+    keywords = user_settings.get('keywords', [])
+    if keywords:
+        description = task_text(task).lower()
+        if not any(keyword.lower() in description for keyword in keywords):
+            return False
+
+    price_filters = user_settings.get('price_filters', ['any'])
+    price = task.get('price', 0)
+    price_text = task.get('price_text', '').lower()
+
+    if 'any' in price_filters:
+        return True
+
+    if 'negotiated' in price_filters and 'договоренности' in price_text:
+        return True
+
+    if 'min_price' in price_filters:
+        min_price = user_settings.get('price_min', 0)
+        if price >= min_price:
+            return True
+
+    return False
+
+
+class SubscriptionIndex:
+    def __init__(self):
+        self.any_users: Set[int] = set()
+        self.negotiated_users: Set[int] = set()
+        self.thresholds: List[int] = []
+        self.threshold_users: List[int] = []
+        self.user_thresholds: Dict[int, int] = {}
+        self.keyword_users: Dict[str, Set[int]] = {}
+        self.user_keywords: Dict[int, List[str]] = {}
+        self.no_keyword_users: Set[int] = set()
+        self.match_cache: Dict[str, Set[int]] = {}
+
+    @classmethod
+    def from_users(cls, users: Iterable[Dict[str, Any]]) -> 'SubscriptionIndex':
+        index = cls()
+        for user in users:
+            index.add_user(user['user_id'], user, keep_sorted=False)
+        index.rebuild_thresholds()
+        return index
+
+    def __len__(self) -> int:
+        return len(self.user_keywords)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self.user_keywords
+
+    def rebuild_thresholds(self) -> None:
+        ordered = sorted(self.user_thresholds.items(), key=lambda item: item[1])
+        self.thresholds = [threshold for _, threshold in ordered]
+        self.threshold_users = [user_id for user_id, _ in ordered]
+
+    def add_user(self, user_id: int, settings: Dict[str, Any], keep_sorted: bool = True) -> None:
+        if user_id in self.user_keywords:
+            self.remove_user(user_id)
+
+        price_filters = settings.get('price_filters', ['any'])
+        if 'any' in price_filters:
+            self.any_users.add(user_id)
+        if 'negotiated' in price_filters:
+            self.negotiated_users.add(user_id)
+        if 'min_price' in price_filters:
+            threshold = int(settings.get('price_min', 0) or 0)
+            self.user_thresholds[user_id] = threshold
+            if keep_sorted:
+                position = bisect.bisect_right(self.thresholds, threshold)
+                self.thresholds.insert(position, threshold)
+                self.threshold_users.insert(position, user_id)
+
+        keywords = sorted({normalize_keyword(k) for k in settings.get('keywords', []) if k.strip()})
+        self.user_keywords[user_id] = keywords
+        if keywords:
+            for keyword in keywords:
+                self.keyword_users.setdefault(keyword, set()).add(user_id)
+        else:
+            self.no_keyword_users.add(user_id)
+
+        self.match_cache.clear()
+
+    def remove_user(self, user_id: int) -> None:
+        keywords = self.user_keywords.pop(user_id, None)
+        if keywords is None:
+            return
+
+        self.any_users.discard(user_id)
+        self.negotiated_users.discard(user_id)
+
+        threshold = self.user_thresholds.pop(user_id, None)
+        if threshold is not None:
+            start = bisect.bisect_left(self.thresholds, threshold)
+            end = bisect.bisect_right(self.thresholds, threshold)
+            position = self.threshold_users.index(user_id, start, end)
+            del self.thresholds[position]
+            del self.threshold_users[position]
+
+        for keyword in keywords:
+            users = self.keyword_users.get(keyword)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.keyword_users[keyword]
+        self.no_keyword_users.discard(user_id)
+
+        self.match_cache.clear()
+
+    def users_for_price(self, price: int, price_text: str) -> Set[int]:
+        eligible = set(self.any_users)
+
+        if 'договоренности' in price_text.lower():
+            eligible |= self.negotiated_users
+
+        position = bisect.bisect_right(self.thresholds, price or 0)
+        if position:
+            eligible.update(self.threshold_users[:position])
+
+        return eligible
+
+    def users_for_description(self, description: str, candidates: Set[int]) -> Set[int]:
+        matched = candidates & self.no_keyword_users
+        if len(matched) == len(candidates):
+            return matched
+
+        description = description.lower()
+        for keyword, users in self.keyword_users.items():
+            if keyword in description:
+                matched |= candidates & users
+        return matched
+
+    def match(self, task: Dict[str, Any]) -> Set[int]:
+        candidates = self.users_for_price(task.get('price', 0), task.get('price_text', ''))
+        if not candidates:
+            return candidates
+        return self.users_for_description(task_text(task), candidates)
+
+    def matching_users(self, task_id: str, task: Dict[str, Any]) -> Set[int]:
+        users = self.match_cache.get(task_id)
+        if users is None:
+            users = self.match(task)
+            self.match_cache[task_id] = users
+        return users
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'users': len(self.user_keywords),
+            'any': len(self.any_users),
+            'negotiated': len(self.negotiated_users),
+            'min_price': len(self.thresholds),
+            'keywords': len(self.keyword_users),
+            'without_keywords': len(self.no_keyword_users)
+        }
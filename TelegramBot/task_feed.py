@@ -0,0 +1,60 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Any, Optional, Tuple
+
+HEAD_SIZE = 4096
+
+
+class TaskFeedReader:
+    def __init__(self, feed_path: str):
+        self.feed_path = os.path.abspath(feed_path)
+        self.feed_name = os.path.basename(self.feed_path)
+
+    def exists(self) -> bool:
+        return os.path.exists(self.feed_path)
+
+    def _head_fingerprint(self, f) -> str:
+        f.seek(0)
+        head = f.read(HEAD_SIZE).split(b'\n', 1)[0]
+        return hashlib.blake2b(head, digest_size=16).hexdigest()
+
+    def read_new(self, state: Optional[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any], bool]:
+        state = state or {}
+        offset = state.get('offset', 0)
+
+        with open(self.feed_path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            head = self._head_fingerprint(f)
+
+            resync = (
+                not state
+                or stat.st_size < offset
+                or state.get('inode') != stat.st_ino
+                or (offset > 0 and state.get('head') != head)
+            )
+            if resync:
+                offset = 0
+
+            f.seek(offset)
+            chunk = f.read()
+
+        end = chunk.rfind(b'\n')
+        if end == -1:
+            return [], {'offset': offset, 'inode': stat.st_ino, 'head': head}, resync
+
+        records = []
+        for line in chunk[:end].split(b'\n'):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line.decode('utf-8'))
+            except (ValueError, UnicodeDecodeError) as e:
+                print(f"Пропущена поврежденная запись в ленте заказов: {e}")
+                continue
+            if isinstance(record, dict) and record.get('id'):
+                records.append(record)
+
+        new_state = {'offset': offset + end + 1, 'inode': stat.st_ino, 'head': head}
+        return records, new_state, resync
@@ -1,23 +1,56 @@
 import os
 import json
 import time
-import re
-from typing import Dict, List, Any, Optional, Tuple
-from pathlib import Path
+import asyncio
+import hashlib
+from typing import Dict, List, Any, Optional, Tuple, Set, Iterable
 from dotenv import load_dotenv
 from ai_processor import AIProcessor
-from datetime import datetime
+from subscription_index import SubscriptionIndex, task_matches_settings, task_text
+from task_feed import TaskFeedReader
+from timeline import TaskTimeline
+from common.metrics import REGISTRY
+from common.tracing import SUMMARIZED
+from common.task_model import Task, publication_timestamp
 
 load_dotenv()
 
+AI_SUMMARY_SECONDS = REGISTRY.histogram('fl_bot_ai_summary_seconds', 'Время получения краткого описания заказа от OpenAI')
+
+def description_fingerprint(description: str) -> Optional[int]:
+    normalized = ' '.join(description.lower().split())
+    if not normalized:
+        return None
+    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def as_tasks(rows: List[Tuple[int, str, Dict[str, Any]]]) -> List[Tuple[int, str, Task]]:
+    return [(seq, task_id, Task.from_record(record, task_id)) for seq, task_id, record in rows]
+
+def task_fingerprints(task: Dict[str, Any]) -> List[int]:
+    fingerprints = []
+    description = description_fingerprint(task.get('full_description', ''))
+    if description is not None:
+        fingerprints.append(description)
+    cluster_id = task.get('cluster_id')
+    if cluster_id:
+        fingerprints.append(description_fingerprint(f"cluster:{cluster_id}"))
+    return fingerprints
+
 class TaskProcessor:
     def __init__(self, db):
         self.data_file_path = os.getenv("DATA_FILE_PATH")
+        self.feed_path = os.getenv("TASK_FEED_PATH") or os.path.splitext(self.data_file_path)[0] + '.jsonl'
+        self.feed_reader = TaskFeedReader(self.feed_path)
         self.db = db
         self.ai_processor = AIProcessor()
-        self.last_processed_id = None
+        self.ai_concurrency = int(os.getenv("AI_CONCURRENCY", "4"))
+        self.fingerprints = {}
+        self.traces = {}
+        self.summaries: Dict[str, Tuple[str, float]] = {}
+        self.timeline = None
         
-    def read_tasks(self) -> Dict[str, Any]:
+    def read_data_file(self) -> Dict[str, Any]:
         try:
             with open(self.data_file_path, 'r', encoding='utf-8') as file:
                 return json.load(file)
@@ -25,89 +58,95 @@ class TaskProcessor:
             print(f"Ошибка при чтении файла с заказами: {e}")
             return {}
     
+    def ingest(self) -> List[str]:
+        if not self.feed_reader.exists():
+            records = [{'id': task_id, **task} for task_id, task in self.read_data_file().items()]
+            records.sort(key=lambda record: (record.get('seq') or 0, publication_timestamp(record)))
+            new_ids = self.db.ingest_tasks(records)
+        else:
+            feed = self.feed_reader.feed_name
+            state = self.db.get_feed_state(feed)
+            records, new_state, resync = self.feed_reader.read_new(state)
+            if resync and state:
+                print("Лента заказов была перезаписана или усечена, выполняется полная синхронизация")
+            new_ids = self.db.ingest_tasks(records, feed, new_state)
+        
+        if new_ids and self.timeline is not None:
+            self._sync_timeline()
+        
+        return new_ids
+    
+    def ingest_records(self, records: List[Dict[str, Any]]) -> List[str]:
+        new_ids = self.db.ingest_tasks(records)
+        if new_ids and self.timeline is not None:
+            self._sync_timeline()
+        return new_ids
+    
+    def _sync_timeline(self) -> TaskTimeline:
+        if self.timeline is None:
+            self.timeline = TaskTimeline()
+        for seq, published_ts in self.db.get_task_timestamps(self.timeline.last_seq):
+            self.timeline.add(seq, published_ts or 0.0)
+        return self.timeline
+    
+    def tasks_between(self, start: float, end: float) -> List[Tuple[int, str, Task]]:
+        return as_tasks(self.db.get_tasks_by_seqs(self._sync_timeline().tasks_between(start, end)))
+    
+    def latest(self, count: int) -> List[Tuple[int, str, Task]]:
+        return as_tasks(self.db.get_tasks_by_seqs(self._sync_timeline().latest(count)))
+    
+    def since(self, published_ts: float) -> List[Tuple[int, str, Task]]:
+        return as_tasks(self.db.get_tasks_by_seqs(self._sync_timeline().since(published_ts)))
+    
+    def get_latest_seq(self) -> Optional[int]:
+        return self.db.get_latest_seq()
+    
     def get_latest_task_id(self) -> Optional[str]:
-        tasks = self.read_tasks()
-        if not tasks:
+        latest = self._sync_timeline().latest(1)
+        if not latest:
             return None
-        
-        latest_task_id = None
-        latest_date = None
-        
-        for task_id, task in tasks.items():
-            publication_date = task.get('publication_date', '')
-            if not publication_date:
-                continue
-                
-            date_obj = self.parse_publication_date(publication_date)
-            
-            if latest_date is None or date_obj > latest_date:
-                latest_date = date_obj
-                latest_task_id = task_id
-        
-        return latest_task_id
-    
-    def get_new_tasks(self, last_id: Optional[str] = None) -> Dict[str, Any]:
-        if last_id is None and self.last_processed_id is not None:
-            last_id = self.last_processed_id
-            
-        tasks = self.read_tasks()
-        if not tasks:
-            return {}
-        
-        if not last_id or last_id not in tasks:
-            latest_id = self.get_latest_task_id()
-            return {latest_id: tasks[latest_id]} if latest_id else {}
-        
-        sorted_tasks = []
-        for task_id, task in tasks.items():
-            sorted_tasks.append((task_id, task))
-        
-        sorted_tasks.sort(key=lambda x: self.parse_publication_date(x[1].get('publication_date', '')))
-        
-        last_index = -1
-        for index, (task_id, _) in enumerate(sorted_tasks):
-            if task_id == last_id:
-                last_index = index
-                break
-                
-        if last_index == -1:
-            return {}
-        
-        new_tasks = {}
-        for i in range(last_index + 1, len(sorted_tasks)):
-            task_id, task = sorted_tasks[i]
-            new_tasks[task_id] = task
-        
-        return new_tasks
+        tasks = self.db.get_tasks_by_seqs(latest)
+        return tasks[0][1] if tasks else None
+    
+    def get_new_tasks(self, after_seq: int, until_seq: Optional[int] = None) -> List[Tuple[int, str, Task]]:
+        tasks = as_tasks(self.db.get_tasks_since(after_seq, until_seq))
+        self.fingerprints = {task_id: task_fingerprints(task) for _, task_id, task in tasks}
+        self.traces = self.db.get_task_traces([task_id for _, task_id, _ in tasks])
+        self.summaries = {}
+        return tasks
     
     def filter_task_for_user(self, task: Dict[str, Any], user_settings: Dict[str, Any]) -> bool:
-        keywords = user_settings.get('keywords', [])
-        if keywords:
-            description = task.get('full_description', '').lower()
-            if not any(keyword.lower() in description for keyword in keywords):
-                return False
-        
-        price_filters = user_settings.get('price_filters', ['any'])
-        price = task.get('price', 0)
-        price_text = task.get('price_text', '').lower()
-        
-        if 'any' in price_filters:
-            return True
-        
-        if 'negotiated' in price_filters and 'договоренности' in price_text:
-            return True
+        return task_matches_settings(task, user_settings)
+    
+    def task_matches_user(self, task_id: str, task: Dict[str, Any], user_settings: Dict[str, Any],
+                          index: Optional[SubscriptionIndex] = None) -> bool:
+        user_id = user_settings.get('user_id')
+        if index is not None and user_id in index:
+            return user_id in index.matching_users(task_id, task)
+        return self.filter_task_for_user(task, user_settings)
+    
+    def summarize(self, task: Dict[str, Any]) -> Tuple[str, float]:
+        with AI_SUMMARY_SECONDS.time():
+            summary = self.ai_processor.process_task_description(task_text(task))
+        return summary, time.time()
+    
+    async def summarize_tasks(self, tasks: Dict[str, Dict[str, Any]]) -> None:
+        semaphore = asyncio.Semaphore(self.ai_concurrency)
         
-        if 'min_price' in price_filters:
-            min_price = user_settings.get('price_min', 0)
-            if price >= min_price:
-                return True
+        async def summarize_one(task_id: str, task: Dict[str, Any]) -> None:
+            async with semaphore:
+                self.summaries[task_id] = await asyncio.to_thread(self.summarize, task)
         
-        return False
+        await asyncio.gather(*(
+            summarize_one(task_id, task) for task_id, task in tasks.items() if task_id not in self.summaries
+        ))
     
     def process_task_for_notification(self, task_id: str, task: Dict[str, Any]) -> Dict[str, Any]:
-        ai_description = self.ai_processor.process_task_description(task.get('full_description', ''))
+        ai_description, summarized_at = self.summaries[task_id]
+        trace = {**self.traces.get(task_id, {}), SUMMARIZED: summarized_at}
         
         return {
+            'trace': trace,
             'task_id': task_id,
             'ai_description': ai_description,
             'price_text': task.get('price_text', 'Цена не указана'),
@@ -116,110 +155,41 @@ class TaskProcessor:
             'url': task.get('url', '')
         }
     
-    def parse_publication_date(self, date_str: str) -> datetime:
-        if not date_str or date_str.strip() == '':
-            return datetime.now()
-            
-        try:
-            main_date_str = date_str.split('[')[0].strip()
-            
-            pattern = r'(\d{2}\.\d{2}\.\d{4})\s*\|\s*(\d{2}:\d{2})'
-            match = re.search(pattern, main_date_str)
-            
-            if match:
-                date_part, time_part = match.groups()
-                return datetime.strptime(f"{date_part} {time_part}", "%d.%m.%Y %H:%M")
-            
-            return datetime.strptime(main_date_str, "%d.%m.%Y | %H:%M")
-            
-        except Exception as e:
-            print(f"Ошибка при парсинге даты '{date_str}': {e}")
-            return datetime.now()
-    
-    def get_notifications_for_user(self, user_id: int) -> List[Dict[str, Any]]:
-        user_settings = self.db.get_user_settings(user_id)
-        if not user_settings:
-            return []
-        
-        notifications = []
-        last_sent_id = user_settings.get('last_sent_id', None)
-        last_sent_descriptions = set()
-        
-        tasks = self.read_tasks()
-        if not tasks:
+    def match_tasks(self, user_settings: Dict[str, Any], tasks: List[Tuple[int, str, Dict[str, Any]]],
+                    index: Optional[SubscriptionIndex] = None) -> List[Tuple[int, str, Dict[str, Any]]]:
+        cursor = user_settings.get('last_sent_seq')
+        if cursor is None:
             return []
-            
-        id_to_description = {task_id: task.get('full_description', '') 
-                           for task_id, task in tasks.items()}
-        
-        is_first_run = not last_sent_id or last_sent_id not in tasks
-        
-        if not is_first_run:
-            sorted_tasks = []
-            for task_id, task in tasks.items():
-                sorted_tasks.append((task_id, task))
-            
-            sorted_tasks.sort(key=lambda x: self.parse_publication_date(x[1].get('publication_date', '')))
-            
-            last_index = -1
-            for index, (task_id, _) in enumerate(sorted_tasks):
-                if task_id == last_sent_id:
-                    last_index = index
-                    break
-                    
-            for i in range(last_index + 1):
-                task_id, _ = sorted_tasks[i]
-                description = id_to_description.get(task_id, '')
-                if description:
-                    last_sent_descriptions.add(description)
-        
-        if is_first_run:
-            sorted_tasks = []
-            for task_id, task in tasks.items():
-                sorted_tasks.append((task_id, task))
-            
-            sorted_tasks.sort(key=lambda x: self.parse_publication_date(x[1].get('publication_date', '')))
-            
-            if sorted_tasks:
-                task_id, task = sorted_tasks[-1]
-                if self.filter_task_for_user(task, user_settings):
-                    notification = self.process_task_for_notification(task_id, task)
-                    notifications.append(notification)
-            return notifications
-        
-        sorted_tasks = []
-        for task_id, task in tasks.items():
-            sorted_tasks.append((task_id, task))
-        
-        sorted_tasks.sort(key=lambda x: self.parse_publication_date(x[1].get('publication_date', '')))
         
-        last_index = -1
-        for index, (task_id, _) in enumerate(sorted_tasks):
-            if task_id == last_sent_id:
-                last_index = index
-                break
-        
-        if last_index == -1:
-            if sorted_tasks:
-                task_id, task = sorted_tasks[-1]
-                if self.filter_task_for_user(task, user_settings):
-                    notification = self.process_task_for_notification(task_id, task)
-                    notifications.append(notification)
-            return notifications
-        
-        for i in range(last_index + 1, len(sorted_tasks)):
-            task_id, task = sorted_tasks[i]
-            
-            current_description = task.get('full_description', '')
-            
-            if current_description in last_sent_descriptions:
+        matched = [
+            (seq, task_id, task) for seq, task_id, task in tasks
+            if seq > cursor and self.task_matches_user(task_id, task, user_settings, index)
+        ]
+        for _, task_id, task in matched:
+            if task_id not in self.fingerprints:
+                self.fingerprints[task_id] = task_fingerprints(task)
+        return matched
+    
+    def matched_fingerprints(self, matched: List[Tuple[int, str, Dict[str, Any]]]) -> Set[int]:
+        return {fingerprint for _, task_id, _ in matched for fingerprint in self.fingerprints[task_id]}
+    
+    def drop_delivered(self, matched: List[Tuple[int, str, Dict[str, Any]]],
+                       delivered: Iterable[int]) -> List[Tuple[int, str, Dict[str, Any]]]:
+        seen = set(delivered)
+        fresh = []
+        for seq, task_id, task in matched:
+            if any(fingerprint in seen for fingerprint in self.fingerprints[task_id]):
                 continue
-                
-            if self.filter_task_for_user(task, user_settings):
-                notification = self.process_task_for_notification(task_id, task)
-                notifications.append(notification)
-                
-                if current_description:
-                    last_sent_descriptions.add(current_description)
-                
-        return notifications 
\ No newline at end of file
+            seen.update(self.fingerprints[task_id])
+            fresh.append((seq, task_id, task))
+        return fresh
+    
+    async def build_notifications(self, matched: List[Tuple[int, str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        await self.summarize_tasks({task_id: task for _, task_id, task in matched})
+        notifications = []
+        for seq, task_id, task in matched:
+            notification = self.process_task_for_notification(task_id, task)
+            notification['seq'] = seq
+            notification['fingerprints'] = self.fingerprints[task_id]
+            notifications.append(notification)
+        return notifications
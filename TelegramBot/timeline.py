@@ -0,0 +1,36 @@
+from bisect import bisect_left, bisect_right
+from typing import List
+
+
+class TaskTimeline:
+    def __init__(self):
+        self.timestamps: List[float] = []
+        self.seqs: List[int] = []
+        self.last_seq = 0
+
+    def __len__(self) -> int:
+        return len(self.seqs)
+
+    def add(self, seq: int, published_ts: float) -> None:
+        if seq <= self.last_seq:
+            return
+
+        if not self.timestamps or published_ts >= self.timestamps[-1]:
+            self.timestamps.append(published_ts)
+            self.seqs.append(seq)
+        else:
+            position = bisect_right(self.timestamps, published_ts)
+            self.timestamps.insert(position, published_ts)
+            self.seqs.insert(position, seq)
+        self.last_seq = seq
+
+    def tasks_between(self, start: float, end: float) -> List[int]:
+        return self.seqs[bisect_left(self.timestamps, start):bisect_right(self.timestamps, end)]
+
+    def since(self, published_ts: float) -> List[int]:
+        return self.seqs[bisect_left(self.timestamps, published_ts):]
+
+    def latest(self, count: int) -> List[int]:
+        if count <= 0:
+            return []
+        return self.seqs[-count:][::-1]
@@ -0,0 +1,99 @@
+import time
+import hmac
+import logging
+from collections import deque
+from typing import Dict, Any, Optional
+from aiohttp import web
+from telegram import Update
+from send_scheduler import percentile
+from common.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+UPDATE_SECONDS = REGISTRY.histogram('fl_bot_webhook_update_seconds', 'Время обработки обновления, полученного через вебхук')
+WEBHOOK_REQUESTS = REGISTRY.counter('fl_bot_webhook_requests', 'Запросы к вебхуку по результату')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+
+
+class WebhookServer:
+    def __init__(self, application, host: str = '0.0.0.0', port: int = 8443, path: str = '/telegram',
+                 secret_token: Optional[str] = None, latency_window: int = 10000):
+        self.application = application
+        self.host = host
+        self.port = port
+        self.path = path if path.startswith('/') else f'/{path}'
+        self.secret_token = secret_token
+        self.latencies = deque(maxlen=latency_window)
+        self.updates = 0
+        self.rejected = 0
+        self.errors = 0
+        self.runner = None
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        if self.secret_token and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, ''), self.secret_token
+        ):
+            self.rejected += 1
+            WEBHOOK_REQUESTS.inc(result='forbidden')
+            return web.Response(status=403)
+
+        try:
+            data = await request.json()
+        except ValueError:
+            self.rejected += 1
+            WEBHOOK_REQUESTS.inc(result='bad_request')
+            return web.Response(status=400)
+
+        started = time.perf_counter()
+        try:
+            update = Update.de_json(data, self.application.bot)
+            await self.application.process_update(update)
+        except Exception as e:
+            self.errors += 1
+            WEBHOOK_REQUESTS.inc(result='error')
+            logger.error(f"Ошибка при обработке обновления через вебхук: {e}")
+        else:
+            WEBHOOK_REQUESTS.inc(result='ok')
+        finally:
+            elapsed = time.perf_counter() - started
+            self.latencies.append(elapsed)
+            UPDATE_SECONDS.observe(elapsed)
+            self.updates += 1
+
+        return web.Response()
+
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats())
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = list(self.latencies)
+        return {
+            'updates': self.updates,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'latency_p50': percentile(latencies, 0.5),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_p99': percentile(latencies, 0.99)
+        }
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.path, self.handle_update)
+        app.router.add_get(f'{self.path.rstrip("/")}/stats', self.handle_stats)
+
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        try:
+            await site.start()
+        except OSError:
+            await self.runner.cleanup()
+            self.runner = None
+            raise
+        logger.info(f"Вебхук-сервер слушает {self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
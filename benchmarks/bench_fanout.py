@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Any
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / "TelegramBot"))
+
+from bot import FLNotifyBot
+from database import Database
+from bench_subscription_index import VOCABULARY, generate_users
+from fake_telegram_api import FakeTelegramAPI
+from fake_openai_api import FakeOpenAI
+
+FILLER = [
+    "нужно", "сделать", "доработать", "проект", "срочно", "бюджет", "опыт", "задача", "подробности",
+    "в", "личных", "сообщениях", "интеграция", "сервис", "клиент", "требуется", "исполнитель"
+]
+
+
+def generate_tasks(count: int, start_seq: int, rng: random.Random) -> List[Dict[str, Any]]:
+    tasks = []
+    for seq in range(start_seq, start_seq + count):
+        words = rng.choices(FILLER, k=rng.randint(30, 80)) + rng.sample(VOCABULARY, rng.randint(1, 4))
+        rng.shuffle(words)
+        roll = rng.random()
+        if roll < 0.2:
+            price, price_text, payment_type = 0, "По договоренности", "negotiated"
+        elif roll < 0.35:
+            price = rng.choice([500, 800, 1000, 1500])
+            price_text, payment_type = f"{price} ₽/час", "hourly"
+        else:
+            price = rng.choice([2000, 5000, 8000, 15000, 30000, 60000, 120000])
+            price_text, payment_type = f"{price} ₽", "fixed"
+        published = time.time() - rng.randint(0, 600)
+        tasks.append({
+            'id': f"bench{seq}",
+            'seq': seq,
+            'title': ' '.join(words[:6]),
+            'description': ' '.join(words[:20]),
+            'full_description': ' '.join(words),
+            'price': price,
+            'price_text': price_text,
+            'payment_type': payment_type,
+            'url': f"https://www.fl.ru/projects/{seq}/bench.html",
+            'publication_date': time.strftime('%d.%m.%Y | %H:%M', time.localtime(published)),
+            'published_ts': published,
+            'processed_at': time.strftime('%Y-%m-%dT%H:%M:%S')
+        })
+    return tasks
+
+
+def populate(db_path: str, count: int, digest_share: float, seed: int) -> None:
+    rng = random.Random(seed)
+    db = Database(db_path)
+    with db.transaction():
+        for user in generate_users(count, seed):
+            user_id = user['user_id']
+            db.add_user(user_id)
+            db.update_keywords(user_id, user['keywords'])
+            db.update_price_filters(user_id, user['price_filters'], user['price_min'])
+            db.toggle_notifications(user_id, True)
+            if rng.random() < digest_share:
+                db.toggle_digest(user_id, True)
+            db.set_cursor(user_id, 0)
+    db.close()
+
+
+def append_feed(feed_path: str, tasks: List[Dict[str, Any]]) -> None:
+    with open(feed_path, 'a', encoding='utf-8') as f:
+        for task in tasks:
+            f.write(json.dumps(task, ensure_ascii=False) + '\n')
+
+
+def instrument(bot: FLNotifyBot, timings: Counter, db_times: Counter) -> None:
+    processor = bot.task_processor
+    summarize = processor.ai_processor.process_task_description
+    match_tasks = processor.match_tasks
+
+    def timed_summary(description):
+        started = time.perf_counter()
+        try:
+            return summarize(description)
+        finally:
+            timings['ai'] += time.perf_counter() - started
+            timings['ai_calls'] += 1
+
+    def timed_match(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return match_tasks(*args, **kwargs)
+        finally:
+            timings['users'] += time.perf_counter() - started
+            timings['user_calls'] += 1
+
+    def observe(method: str, seconds: float) -> None:
+        db_times[method] += seconds
+
+    processor.ai_processor.process_task_description = timed_summary
+    processor.match_tasks = timed_match
+    bot.adb.observer = observe
+
+
+async def run_population(args, users: int, telegram_api: FakeTelegramAPI) -> None:
+    rng = random.Random(args.seed)
+    workdir = os.getcwd()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        feed_path = os.path.join(data_dir, 'processed_tasks.jsonl')
+        os.environ['DATA_FILE_PATH'] = os.path.join(data_dir, 'processed_tasks.json')
+        os.environ['TASK_FEED_PATH'] = feed_path
+        open(feed_path, 'w').close()
+
+        started = time.perf_counter()
+        populate(os.path.join(data_dir, 'user_data.db'), users, args.digest_share, args.seed)
+        print(f"\nПользователей: {users} (база заполнена за {time.perf_counter() - started:.1f} с)")
+
+        bot = FLNotifyBot()
+        application = bot.build_application()
+        await application.initialize()
+        timings: Counter = Counter()
+        db_times: Counter = Counter()
+        instrument(bot, timings, db_times)
+
+        try:
+            seq = 1
+            for number in range(1, args.passes + 1):
+                tasks = generate_tasks(args.tasks, seq, rng)
+                seq += len(tasks)
+                append_feed(feed_path, tasks)
+
+                timings.clear()
+                db_times.clear()
+                sent_before = bot.sender.sent
+                messages_before = telegram_api.calls['sendMessage']
+
+                started = time.perf_counter()
+                await bot.check_for_updates()
+                notified = time.perf_counter() - started
+                await bot.digest.flush_all()
+                elapsed = time.perf_counter() - started
+
+                sent = bot.sender.sent - sent_before
+                match_time = timings['users']
+                print(f"  Проход {number}: заказов {len(tasks)}, сообщений {sent} "
+                      f"(в Bot API {telegram_api.calls['sendMessage'] - messages_before}), "
+                      f"рассылка {notified:.2f} с, с подборками {elapsed:.2f} с, "
+                      f"{sent / max(elapsed, 1e-9):.0f} сообщений/с")
+                print(f"    сопоставление {match_time / max(timings['user_calls'], 1) * 1e6:.1f} мкс/пользователя, "
+                      f"OpenAI {timings['ai']:.2f} с ({timings['ai_calls']} вызовов), "
+                      f"БД {sum(db_times.values()):.2f} с: "
+                      + ', '.join(f"{method} {seconds * 1000:.0f} мс" for method, seconds in db_times.most_common(4)))
+        finally:
+            await application.shutdown()
+            await bot.sender.close()
+            bot.adb.close()
+            os.chdir(workdir)
+
+
+async def run(args) -> None:
+    telegram_api = FakeTelegramAPI(port=args.telegram_port, latency=args.telegram_latency)
+    openai_api = FakeOpenAI(port=args.openai_port, latency=args.openai_latency)
+    await telegram_api.start()
+    openai_api.start_in_thread()
+
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': '100000001:bench',
+        'TELEGRAM_API_BASE_URL': telegram_api.base_url,
+        'OPENAI_API_KEY': 'bench',
+        'OPENAI_BASE_URL': openai_api.base_url,
+        'SEND_GLOBAL_RATE': str(args.send_rate),
+        'SEND_PER_CHAT_RATE': str(args.send_rate),
+        'DIGEST_WINDOW': '3600'
+    })
+    os.environ.pop('TASK_CHANNEL_ADDRESS', None)
+
+    try:
+        for users in args.users:
+            await run_population(args, users, telegram_api)
+    finally:
+        openai_api.stop_thread()
+        await telegram_api.stop()
+
+    print(f"\nВызовы Bot API: {dict(telegram_api.calls)}")
+    print(f"Вызовы OpenAI: {dict(openai_api.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный бенчмарк рассылки уведомлений бота")
+    parser.add_argument("--users", type=int, nargs="+", default=[1_000, 10_000])
+    parser.add_argument("--tasks", type=int, default=20, help="Новых заказов за проход")
+    parser.add_argument("--passes", type=int, default=2)
+    parser.add_argument("--digest-share", type=float, default=0.2, help="Доля пользователей с подборками")
+    parser.add_argument("--send-rate", type=float, default=100000, help="Лимит отправки сообщений в секунду")
+    parser.add_argument("--telegram-port", type=int, default=8081)
+    parser.add_argument("--telegram-latency", type=float, default=0.0)
+    parser.add_argument("--openai-port", type=int, default=8082)
+    parser.add_argument("--openai-latency", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="Показывать журнал бота")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / "FL"))
+
+from near_duplicates import NearDuplicateIndex, simhash, HASH_BITS
+
+VOCABULARY = [
+    "нужно", "сделать", "сайт", "бот", "telegram", "python", "парсер", "интеграция", "api",
+    "crm", "битрикс", "дизайн", "лендинг", "магазин", "каталог", "оплата", "доработать",
+    "верстка", "адаптивная", "мобильная", "версия", "срочно", "бюджет", "опыт", "работы",
+    "портфолио", "техническое", "задание", "django", "react", "wordpress", "база", "данных",
+    "нейросеть", "chatgpt", "автоматизация", "отчеты", "выгрузка", "excel", "таблицы",
+    "google", "sheets", "интерфейс", "админка", "личный", "кабинет", "уведомления", "рассылка"
+]
+
+
+WORDS = VOCABULARY + [f"{word}{suffix}" for word in VOCABULARY for suffix in range(100)]
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def generate_description(rng: random.Random) -> str:
+    return ' '.join(rng.choices(WORDS, WEIGHTS, k=rng.randint(40, 120)))
+
+
+def edit_description(rng: random.Random, text: str, edits: int) -> str:
+    words = text.split()
+    for _ in range(edits):
+        position = rng.randrange(len(words))
+        if rng.random() < 0.5:
+            words[position] = rng.choice(WORDS)
+        else:
+            words.insert(position, rng.choice(WORDS))
+    return ' '.join(words)
+
+
+def linear_find(hashes, value, max_distance):
+    best_key, best_distance = None, max_distance + 1
+    for key, stored in hashes.items():
+        distance = bin(value ^ stored).count('1')
+        if distance < best_distance:
+            best_key, best_distance = key, distance
+    return best_key
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса похожих заказов")
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--edits", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    descriptions = [generate_description(rng) for _ in range(args.tasks)]
+
+    started = time.perf_counter()
+    hashes = [simhash(text) for text in descriptions]
+    hash_time = time.perf_counter() - started
+
+    index = NearDuplicateIndex(args.threshold)
+    started = time.perf_counter()
+    for task_id, value in enumerate(hashes):
+        index.add(str(task_id), value)
+    build_time = time.perf_counter() - started
+    stats = index.stats()
+
+    print(f"Заказов в индексе: {len(index)}")
+    print(f"  Порог сходства: {args.threshold} (до {index.max_distance} из {HASH_BITS} бит), полос: {stats['bands']}")
+    print(f"  SimHash: {hash_time * 1000:.1f} мс ({hash_time / args.tasks * 1_000_000:.1f} мкс/заказ)")
+    print(f"  Построение: {build_time * 1000:.1f} мс, кластеров: {stats['clusters']}, "
+          f"средний размер корзины: {stats['avg_bucket']:.1f}")
+
+    sources = rng.sample(range(args.tasks), min(args.queries, args.tasks))
+    reposts = [simhash(edit_description(rng, descriptions[source], args.edits)) for source in sources]
+    fresh = [simhash(generate_description(rng)) for _ in sources]
+
+    started = time.perf_counter()
+    found = [index.find(value) for value in reposts]
+    false_positives = sum(1 for value in fresh if index.find(value) is not None)
+    index_time = time.perf_counter() - started
+
+    stored = {str(task_id): value for task_id, value in enumerate(hashes)}
+    started = time.perf_counter()
+    expected = [linear_find(stored, value, index.max_distance) for value in reposts]
+    for value in fresh:
+        linear_find(stored, value, index.max_distance)
+    linear_time = time.perf_counter() - started
+
+    within_threshold = sum(1 for key in expected if key is not None)
+    matched = sum(1 for key, truth in zip(found, expected) if truth is not None and key is not None)
+    recall_sources = sum(1 for key, source in zip(found, sources) if key is not None and
+                         index.cluster_of(key) == index.cluster_of(str(source)))
+
+    if matched != within_threshold:
+        print(f"[ОШИБКА] Индекс пропустил кандидатов в пределах порога: {matched} != {within_threshold}")
+        sys.exit(1)
+
+    queries = len(reposts) + len(fresh)
+    print(f"\nЗапросов: {queries} (повторы с {args.edits} правками и новые заказы)")
+    print(f"  Найдено повторов: {recall_sources}/{len(reposts)}, ложных совпадений: {false_positives}/{len(fresh)}")
+    print(f"  Перебор: {linear_time * 1000:.1f} мс ({linear_time / queries * 1000:.3f} мс/запрос)")
+    print(f"  Индекс: {index_time * 1000:.1f} мс ({index_time / queries * 1000:.3f} мс/запрос)")
+    print(f"  Ускорение: x{linear_time / index_time:.1f}" if index_time else "")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import io
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from typing import Dict, List, Any
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / "FL"))
+
+from parser import WorkzilaParser
+from replay import ReplayServer, listing_elements
+from common.task_model import Task
+
+SITE_URL = "https://www.fl.ru"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def replay(parser: WorkzilaParser, server: ReplayServer, rounds: int, concurrency: int) -> Dict[str, Any]:
+    timings: Dict[str, List[float]] = {'listing': [], 'detail': [], 'save': [], 'total': []}
+    counts = {'tasks': 0, 'saved': 0, 'empty_details': 0, 'has_executor': 0}
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(task: Task) -> Dict[str, Any]:
+        async with semaphore:
+            started = time.perf_counter()
+            detailed_info = await parser.parse_detailed_task(server.url_for(task.url))
+            return {'info': detailed_info, 'elapsed': time.perf_counter() - started}
+
+    started = time.perf_counter()
+    for round_number in range(rounds):
+        for html in server.listings:
+            tasks = []
+            extract_times = []
+            for element in listing_elements(html, SITE_URL):
+                extract_started = time.perf_counter()
+                task_id = element.get_attribute('id').replace('project-item', '')
+                task = parser.extract_listing_task(element, task_id)
+                extract_times.append(time.perf_counter() - extract_started)
+                if round_number:
+                    task.id = f"{task_id}-{round_number}"
+                tasks.append(task)
+
+            timings['listing'].extend(extract_times)
+            details = await asyncio.gather(*(fetch(task) for task in tasks))
+            for extract_time, task, detail in zip(extract_times, tasks, details):
+                counts['tasks'] += 1
+                timings['detail'].append(detail['elapsed'])
+                info = detail['info']
+                if info.get('has_executor'):
+                    counts['has_executor'] += 1
+                    timings['total'].append(extract_time + detail['elapsed'])
+                    continue
+                if not info.get('full_description'):
+                    counts['empty_details'] += 1
+
+                task.full_description = info.get('full_description', '')
+                task.publication_date = info.get('publication_date', '')
+                save_started = time.perf_counter()
+                if parser.save_task(task):
+                    counts['saved'] += 1
+                save_time = time.perf_counter() - save_started
+                timings['save'].append(save_time)
+                timings['total'].append(extract_time + detail['elapsed'] + save_time)
+
+    return {'timings': timings, 'counts': counts, 'elapsed': time.perf_counter() - started}
+
+
+async def run(args) -> None:
+    server = ReplayServer(args.fixtures, port=args.port, latency=args.latency,
+                          jitter=args.jitter, error_rate=args.error_rate)
+    await server.start()
+    if not server.listings:
+        await server.stop()
+        print(f"В {args.fixtures} нет записанных страниц ленты, запустите parser.py --record")
+        return
+
+    output = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with tempfile.TemporaryDirectory() as data_dir, contextlib.redirect_stdout(output):
+            parser = WorkzilaParser(
+                config_path=str(PROJECT_DIR / "FL" / "config.json"),
+                cookies_path=str(PROJECT_DIR / "FL" / "www.fl.ru_cookies.example.txt"),
+                data_dir=data_dir
+            )
+            parser.request_delay = (0, 0)
+            try:
+                result = await replay(parser, server, args.rounds, args.concurrency)
+            finally:
+                await parser.close_session()
+    finally:
+        await server.stop()
+
+    counts, timings = result['counts'], result['timings']
+    print(f"Записанных лент: {len(server.listings)}, страниц заказов: {len(server.pages)}, кругов: {args.rounds}")
+    print(f"Заказов: {counts['tasks']}, сохранено: {counts['saved']}, с исполнителем: {counts['has_executor']}, "
+          f"без описания: {counts['empty_details']}")
+    print(f"Запросы к заглушке: {dict(server.requests)}")
+    print(f"Пропускная способность: {counts['tasks'] / max(result['elapsed'], 1e-9):.1f} заказов/с "
+          f"за {result['elapsed']:.2f} с")
+    for name, label in (('listing', 'Разбор карточки'), ('detail', 'Страница заказа'),
+                        ('save', 'Сохранение'), ('total', 'Весь путь')):
+        values = timings[name]
+        print(f"  {label:<16} p50={percentile(values, 0.5) * 1000:8.2f} мс  "
+              f"p99={percentile(values, 0.99) * 1000:8.2f} мс  n={len(values)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк парсера на записанных страницах FL.ru")
+    parser.add_argument("fixtures", help="Каталог, записанный parser.py --record")
+    parser.add_argument("--rounds", type=int, default=5, help="Сколько раз прогнать записанные ленты")
+    parser.add_argument("--concurrency", type=int, default=1, help="Одновременных запросов страниц заказов")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа заглушки, с")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Разброс задержки, с")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Доля ответов 503")
+    parser.add_argument("--verbose", action="store_true", help="Показывать вывод парсера")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
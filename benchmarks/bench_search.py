@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / "TelegramBot"))
+sys.path.insert(0, str(PROJECT_DIR))
+
+from database import Database
+from search import parse_search_query, match_expression
+
+VOCABULARY = [
+    "telegram", "бот", "бота", "парсер", "сайт", "лендинг", "python", "django", "react", "wordpress",
+    "интернет-магазин", "дизайн", "логотип", "верстка", "битрикс", "crm", "интеграция", "api",
+    "нейросеть", "chatgpt", "автоматизация", "excel", "google", "таблицы", "доработка", "мобильное",
+    "приложение", "android", "ios", "админка", "оплата", "рассылка", "скрипт", "база", "данных"
+]
+
+WORDS = VOCABULARY + [f"слово{number}" for number in range(20_000)]
+WEIGHTS = [1.0 / (rank + 1) for rank in range(len(WORDS))]
+
+QUERIES = [
+    "telegram бот", "парсер сайт от:5000", "wordpress доработка", "нейросеть chatgpt дней:7",
+    "интеграция crm api до:30000", "мобильное приложение android", "python", "дизайн логотип"
+]
+
+
+def generate_tasks(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    for task_id in range(1, count + 1):
+        words = rng.choices(WORDS, WEIGHTS, k=rng.randint(30, 90))
+        price = rng.choice([0, 1000, 3000, 5000, 10000, 20000, 50000])
+        yield {
+            'id': str(task_id),
+            'title': ' '.join(words[:5]),
+            'description': ' '.join(words[:20]),
+            'full_description': ' '.join(words),
+            'price': price,
+            'price_text': f"{price} ₽" if price else "По договоренности",
+            'payment_type': 'negotiated' if not price else 'fixed',
+            'seq': task_id
+        }
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк полнотекстового поиска по заказам")
+    parser.add_argument("--tasks", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        db = Database(os.path.join(directory, "search.db"))
+
+        started = time.perf_counter()
+        batch = []
+        for task in generate_tasks(args.tasks):
+            batch.append(task)
+            if len(batch) == 5000:
+                db.ingest_tasks(batch)
+                batch = []
+        db.ingest_tasks(batch)
+        ingest_time = time.perf_counter() - started
+        print(f"Заказов в базе: {args.tasks}, загрузка с индексированием: {ingest_time:.1f} с")
+
+        for text in QUERIES:
+            search = parse_search_query(text)
+            since = None
+            if search['days']:
+                since = 0.0
+
+            timings = []
+            for page in range(args.repeat):
+                started = time.perf_counter()
+                results = db.search_tasks(
+                    match_expression(search['terms']), search['price_min'], search['price_max'],
+                    since, limit=6, offset=(page % 5) * 5
+                )
+                timings.append(time.perf_counter() - started)
+
+            print(f"  {text!r}: найдено на странице {len(results)}, "
+                  f"p50={percentile(timings, 0.5) * 1000:.2f} мс p99={percentile(timings, 0.99) * 1000:.2f} мс")
+
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
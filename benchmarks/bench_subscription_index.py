@@ -0,0 +1,102 @@
+import sys
+import json
+import time
+import random
+import argparse
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(PROJECT_DIR / "TelegramBot"))
+sys.path.insert(0, str(PROJECT_DIR))
+
+from subscription_index import SubscriptionIndex, task_matches_settings
+
+VOCABULARY = [
+    "python", "telegram", "бот", "парсинг", "сайт", "wordpress", "django", "react",
+    "дизайн", "логотип", "1с", "битрикс", "ai", "нейросеть", "chatgpt", "верстка",
+    "android", "ios", "unity", "скрипт", "api", "crm", "интернет-магазин", "seo"
+]
+
+
+def generate_users(count: int, seed: int = 42):
+    rng = random.Random(seed)
+    users = []
+    for user_id in range(1, count + 1):
+        roll = rng.random()
+        if roll < 0.35:
+            price_filters = ['any']
+        elif roll < 0.55:
+            price_filters = ['negotiated']
+        elif roll < 0.85:
+            price_filters = ['min_price']
+        else:
+            price_filters = ['negotiated', 'min_price']
+
+        keywords = rng.sample(VOCABULARY, rng.choice([0, 1, 2, 3, 5]))
+        users.append({
+            'user_id': user_id,
+            'keywords': keywords,
+            'price_filters': price_filters,
+            'price_min': rng.choice([1000, 3000, 5000, 10000, 20000, 50000]),
+            'notifications_enabled': 1
+        })
+    return users
+
+
+def load_tasks(limit: int):
+    tasks_path = PROJECT_DIR / "FL" / "processed_tasks.json"
+    with open(tasks_path, 'r', encoding='utf-8') as f:
+        tasks = json.load(f)
+    return list(tasks.items())[:limit]
+
+
+def bench_naive(users, tasks):
+    started = time.perf_counter()
+    matches = 0
+    for _, task in tasks:
+        for user in users:
+            if task_matches_settings(task, user):
+                matches += 1
+    return time.perf_counter() - started, matches
+
+
+def bench_index(users, tasks):
+    started = time.perf_counter()
+    index = SubscriptionIndex.from_users(users)
+    build_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    matches = 0
+    for task_id, task in tasks:
+        matches += len(index.matching_users(task_id, task))
+    return build_time, time.perf_counter() - started, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк индекса подписок")
+    parser.add_argument("--users", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--tasks", type=int, default=50)
+    args = parser.parse_args()
+
+    tasks = load_tasks(args.tasks)
+    print(f"Заказов в прогоне: {len(tasks)}")
+
+    for count in args.users:
+        users = generate_users(count)
+        naive_time, naive_matches = bench_naive(users, tasks)
+        build_time, index_time, index_matches = bench_index(users, tasks)
+
+        if naive_matches != index_matches:
+            print(f"[ОШИБКА] Расхождение результатов: {naive_matches} != {index_matches}")
+            sys.exit(1)
+
+        print(f"\nПользователей: {count}")
+        print(f"  Совпадений: {index_matches}")
+        print(f"  Перебор: {naive_time * 1000:.1f} мс ({naive_time / len(tasks) * 1000:.2f} мс/заказ)")
+        print(f"  Индекс: построение {build_time * 1000:.1f} мс, "
+              f"поиск {index_time * 1000:.1f} мс ({index_time / len(tasks) * 1000:.2f} мс/заказ)")
+        print(f"  Ускорение: x{naive_time / index_time:.1f}" if index_time else "")
+
+
+if __name__ == "__main__":
+    main()
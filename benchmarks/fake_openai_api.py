@@ -0,0 +1,105 @@
+import time
+import asyncio
+import argparse
+import threading
+from collections import Counter
+
+from aiohttp import web
+
+SUMMARY = "Нужно доработать проект заказчика: {words}. Сроки и бюджет обсуждаются."
+
+
+class FakeOpenAI:
+    def __init__(self, host: str = '127.0.0.1', port: int = 8082, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.runner = None
+        self.loop = None
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/v1'
+
+    async def chat_completions(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        self.calls['chat.completions'] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        prompt = body.get('messages', [{}])[-1].get('content', '')
+        words = ' '.join(prompt.split()[5:13])
+        content = SUMMARY.format(words=words)
+        return web.json_response({
+            'id': f"chatcmpl-{self.calls['chat.completions']}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o-mini'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(content.split()),
+                      'total_tokens': len(prompt.split()) + len(content.split())}
+        })
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post('/v1/chat/completions', self.chat_completions)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def start_in_thread(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fake-openai', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self.start(), self.loop).result()
+
+    def stop_thread(self) -> None:
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+
+async def serve(host: str, port: int, latency: float) -> None:
+    api = FakeOpenAI(host, port, latency)
+    await api.start()
+    print(f"Заглушка OpenAI: {api.base_url} (OPENAI_BASE_URL)")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            if api.calls:
+                print(f"Вызовы: {dict(api.calls)}")
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка OpenAI API для локальных прогонов бота")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8082)
+    parser.add_argument("--latency", type=float, default=0.0, help="Искусственная задержка ответа, с")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import Dict, Any
+
+from aiohttp import web
+
+BOT_USER = {
+    'id': 100000001,
+    'is_bot': True,
+    'first_name': 'FL Scout',
+    'username': 'fl_scout_bot',
+    'can_join_groups': False,
+    'can_read_all_group_messages': False,
+    'supports_inline_queries': True
+}
+
+
+class FakeTelegramAPI:
+    def __init__(self, host: str = '127.0.0.1', port: int = 8081, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.messages = 0
+        self.webhook: Dict[str, Any] = {}
+        self.runner = None
+
+    @property
+    def base_url(self) -> str:
+        return f'http://{self.host}:{self.port}/bot'
+
+    async def read_params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == 'application/json':
+            try:
+                return await request.json()
+            except ValueError:
+                return {}
+
+        params = dict(request.query)
+        params.update(await request.post())
+        for key, value in list(params.items()):
+            if isinstance(value, str) and value[:1] in '{[':
+                try:
+                    params[key] = json.loads(value)
+                except ValueError:
+                    pass
+        return params
+
+    def message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.messages += 1
+        chat_id = int(params.get('chat_id') or 0)
+        return {
+            'message_id': self.messages,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+            'text': params.get('text', '')
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method']
+        params = await self.read_params(request)
+        self.calls[method] += 1
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if method == 'getMe':
+            result: Any = BOT_USER
+        elif method == 'getUpdates':
+            await asyncio.sleep(min(float(params.get('timeout') or 0), 1.0))
+            result = []
+        elif method == 'setWebhook':
+            self.webhook = {'url': params.get('url', ''), 'secret_token': params.get('secret_token')}
+            result = True
+        elif method == 'deleteWebhook':
+            self.webhook = {}
+            result = True
+        elif method == 'getWebhookInfo':
+            result = {'url': self.webhook.get('url', ''), 'has_custom_certificate': False, 'pending_update_count': 0}
+        elif method in ('sendMessage', 'editMessageText'):
+            result = self.message(params)
+        else:
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route('*', '/bot{token}/{method}', self.handle)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, self.host, self.port).start()
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def serve(host: str, port: int, latency: float) -> None:
+    api = FakeTelegramAPI(host, port, latency)
+    await api.start()
+    print(f"Заглушка Bot API: {api.base_url} (TELEGRAM_API_BASE_URL)")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            if api.calls:
+                print(f"Вызовы: {dict(api.calls)}")
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Заглушка Telegram Bot API для локальных прогонов бота")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="Искусственная задержка ответа, с")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.latency))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import time
+import random
+import asyncio
+import argparse
+from typing import Dict, Any, List
+
+import aiohttp
+
+from fake_telegram_api import FakeTelegramAPI
+
+COMMANDS = ["/start", "/menu", "/recent 5", "/search telegram бот", "/search парсер от:5000"]
+CALLBACKS = ["menu", "search_page_5"]
+
+
+def user(user_id: int) -> Dict[str, Any]:
+    return {'id': user_id, 'is_bot': False, 'first_name': f'Пользователь {user_id}', 'language_code': 'ru'}
+
+
+def message_update(update_id: int, user_id: int, text: str) -> Dict[str, Any]:
+    command = text.split()[0]
+    return {
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': user(user_id),
+            'text': text,
+            'entities': [{'type': 'bot_command', 'offset': 0, 'length': len(command)}]
+        }
+    }
+
+
+def callback_update(update_id: int, user_id: int, data: str) -> Dict[str, Any]:
+    return {
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id),
+            'from': user(user_id),
+            'chat_instance': str(user_id),
+            'data': data,
+            'message': {
+                'message_id': update_id,
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'Меню'
+            }
+        }
+    }
+
+
+def generate_updates(count: int, users: int, seed: int = 42) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    updates = []
+    for update_id in range(1, count + 1):
+        user_id = 1000 + rng.randrange(users)
+        if rng.random() < 0.3:
+            updates.append(callback_update(update_id, user_id, rng.choice(CALLBACKS)))
+        else:
+            updates.append(message_update(update_id, user_id, rng.choice(COMMANDS)))
+    return updates
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+async def post_updates(url: str, secret: str, updates: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for update in updates:
+        queue.put_nowait(update)
+
+    async with aiohttp.ClientSession(headers={'X-Telegram-Bot-Api-Secret-Token': secret}) as session:
+        async def worker():
+            while not queue.empty():
+                update = queue.get_nowait()
+                started = time.perf_counter()
+                async with session.post(url, json=update) as response:
+                    await response.read()
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        async with session.get(f"{url.rstrip('/')}/stats") as response:
+            server_stats = await response.json() if response.status == 200 else {}
+
+    return {'latencies': latencies, 'statuses': statuses, 'elapsed': elapsed, 'server': server_stats}
+
+
+async def run(args) -> None:
+    api = None
+    if args.api_port:
+        api = FakeTelegramAPI(port=args.api_port, latency=args.api_latency)
+        await api.start()
+        print(f"Заглушка Bot API запущена: {api.base_url}")
+        print("Запустите бота с BOT_MODE=webhook и TELEGRAM_API_BASE_URL, указывающим на заглушку")
+        await asyncio.sleep(args.warmup)
+
+    try:
+        updates = generate_updates(args.updates, args.users)
+        result = await post_updates(args.url, args.secret, updates, args.concurrency)
+    finally:
+        if api is not None:
+            await api.stop()
+
+    latencies = result['latencies']
+    print(f"Отправлено обновлений: {len(latencies)} за {result['elapsed']:.2f} с "
+          f"({len(latencies) / max(result['elapsed'], 1e-9):.0f} в секунду)")
+    print(f"Коды ответов: {result['statuses']}")
+    print(f"Задержка ответа вебхука: p50={percentile(latencies, 0.5) * 1000:.1f} мс "
+          f"p99={percentile(latencies, 0.99) * 1000:.1f} мс")
+    if result['server']:
+        server = result['server']
+        print(f"Статистика сервера: обработано {server['updates']}, отклонено {server['rejected']}, "
+              f"ошибок {server['errors']}, p50={server['latency_p50'] * 1000:.1f} мс "
+              f"p99={server['latency_p99'] * 1000:.1f} мс")
+    if api is not None:
+        print(f"Вызовы Bot API: {dict(api.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка поддельных обновлений в вебхук бота")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram")
+    parser.add_argument("--secret", required=True, help="Значение WEBHOOK_SECRET бота")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--api-port", type=int, default=0, help="Поднять заглушку Bot API на этом порту")
+    parser.add_argument("--api-latency", type=float, default=0.0)
+    parser.add_argument("--warmup", type=float, default=5.0, help="Пауза перед отправкой, с")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+import os
+import re
+import sys
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Dict, List, Optional, Deque, TextIO
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40, 'CRITICAL': 50}
+
+LEVEL_PATTERN = re.compile(r' - (DEBUG|INFO|WARNING|ERROR|CRITICAL) - ')
+ERROR_MARKERS = ('Traceback', 'Ошибка', 'ошибка', 'ОШИБКА', 'Error', 'Exception')
+WARNING_MARKERS = ('Предупреждение', 'ПРЕДУПРЕЖДЕНИЕ', 'Warning', '✗')
+
+
+def detect_level(line: str) -> int:
+    match = LEVEL_PATTERN.search(line)
+    if match:
+        return LEVELS[match.group(1)]
+    if any(marker in line for marker in ERROR_MARKERS):
+        return LEVELS['ERROR']
+    if any(marker in line for marker in WARNING_MARKERS):
+        return LEVELS['WARNING']
+    return LEVELS['INFO']
+
+
+class RotatingFile:
+    def __init__(self, path: str, max_bytes: int, backups: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, 'a', encoding='utf-8')
+        self.size = self.file.tell()
+
+    def rotate(self) -> None:
+        self.file.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backups > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, 'a', encoding='utf-8')
+        self.size = 0
+
+    def write(self, text: str) -> None:
+        if self.max_bytes and self.size and self.size + len(text) > self.max_bytes:
+            self.rotate()
+        self.file.write(text)
+        self.file.flush()
+        self.size += len(text)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class LogMultiplexer:
+    def __init__(self, stream: Optional[TextIO] = None, level: str = 'INFO', ring_size: int = 500,
+                 flush_interval: float = 0.1, max_pending: int = 10000, log_dir: Optional[str] = None,
+                 max_bytes: int = 10 * 1024 * 1024, backups: int = 5):
+        self.stream = stream or sys.stdout
+        self.level = LEVELS.get(level.upper(), LEVELS['INFO'])
+        self.ring_size = ring_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.rings: Dict[str, Deque[str]] = {}
+        self.console: Deque[str] = deque()
+        self.files: Dict[str, RotatingFile] = {}
+        self.file_pending: Dict[str, List[str]] = {}
+        self.dropped = 0
+        self.lines = 0
+        self.flusher = None
+
+        reconfigure = getattr(self.stream, 'reconfigure', None)
+        if reconfigure is not None:
+            try:
+                reconfigure(errors='replace')
+            except (ValueError, OSError):
+                pass
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+
+    def start(self) -> None:
+        if self.flusher is None:
+            self.flusher = asyncio.get_running_loop().create_task(self.flush_periodically())
+
+    def write(self, component: str, prefix: str, line: str, level: Optional[int] = None) -> None:
+        self.lines += 1
+        ring = self.rings.get(component)
+        if ring is None:
+            ring = self.rings[component] = deque(maxlen=self.ring_size)
+        ring.append(line)
+
+        if self.log_dir:
+            stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            self.file_pending.setdefault(component, []).append(f'{stamp} {line}\n')
+
+        if (level if level is not None else detect_level(line)) < self.level:
+            return
+
+        if len(self.console) >= self.max_pending:
+            self.console.popleft()
+            self.dropped += 1
+        self.console.append(f'{prefix} {line}')
+
+    async def pump(self, component: str, prefix: str, reader: asyncio.StreamReader) -> None:
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError:
+                self.write(component, prefix, '[строка вывода слишком длинная и пропущена]', LEVELS['WARNING'])
+                continue
+            except Exception as e:
+                self.write(component, prefix, f'[ОШИБКА ЧТЕНИЯ] {e}', LEVELS['ERROR'])
+                return
+
+            if not line:
+                return
+            line = line.decode('utf-8', errors='replace').rstrip()
+            if line:
+                self.write(component, prefix, line)
+
+    def recent(self, component: str, count: Optional[int] = None) -> List[str]:
+        lines = list(self.rings.get(component, ()))
+        return lines[-count:] if count else lines
+
+    def take_console(self) -> List[str]:
+        batch = list(self.console)
+        self.console.clear()
+        if self.dropped:
+            batch.append(f'[ЛОГИ] Пропущено строк из-за переполнения буфера: {self.dropped}')
+            self.dropped = 0
+        return batch
+
+    def write_console(self, batch: List[str]) -> None:
+        if not batch:
+            return
+        try:
+            self.stream.write('\n'.join(batch) + '\n')
+            self.stream.flush()
+        except (OSError, ValueError):
+            pass
+
+    def flush_console(self) -> None:
+        self.write_console(self.take_console())
+
+    def flush_files(self, pending: Dict[str, List[str]]) -> None:
+        for component, lines in pending.items():
+            file = self.files.get(component)
+            if file is None:
+                file = self.files[component] = RotatingFile(
+                    os.path.join(self.log_dir, f'{component}.log'), self.max_bytes, self.backups
+                )
+            file.write(''.join(lines))
+
+    async def flush(self) -> None:
+        batch = self.take_console()
+        if batch:
+            await asyncio.to_thread(self.write_console, batch)
+        if self.file_pending:
+            pending, self.file_pending = self.file_pending, {}
+            await asyncio.to_thread(self.flush_files, pending)
+
+    async def flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except OSError as e:
+                print(f"[ЛОГИ] Ошибка записи логов: {e}")
+
+    async def close(self) -> None:
+        if self.flusher is not None:
+            self.flusher.cancel()
+            await asyncio.gather(self.flusher, return_exceptions=True)
+            self.flusher = None
+        await self.flush()
+        for file in self.files.values():
+            file.close()
+        self.files = {}
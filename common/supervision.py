@@ -0,0 +1,61 @@
+import os
+import json
+import time
+from typing import Dict, Any, Optional
+
+STATUS_DIR_ENV = 'SUPERVISOR_STATUS_DIR'
+
+STARTING = 'starting'
+READY = 'ready'
+
+
+def status_path(status_dir: str, component: str) -> str:
+    return os.path.join(status_dir, f'{component}.json')
+
+
+def read_status(status_dir: str, component: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(status_path(status_dir, component), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Heartbeat:
+    def __init__(self, component: str, status_dir: Optional[str] = None):
+        self.component = component
+        self.status_dir = status_dir or os.getenv(STATUS_DIR_ENV)
+        self.state = STARTING
+        self.ready_at = None
+        self.details: Dict[str, Any] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.status_dir)
+
+    def ready(self, **details) -> None:
+        self.state = READY
+        self.ready_at = time.time()
+        self.beat(**details)
+
+    def beat(self, **details) -> None:
+        self.details.update(details)
+        if not self.enabled:
+            return
+
+        path = status_path(self.status_dir, self.component)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        status = {
+            'component': self.component,
+            'pid': os.getpid(),
+            'state': self.state,
+            'ready_at': self.ready_at,
+            'last_beat': time.time(),
+            'details': self.details
+        }
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(status, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Не удалось записать состояние {self.component}: {e}")
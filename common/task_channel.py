@@ -0,0 +1,186 @@
+import json
+import asyncio
+from collections import deque
+from typing import Dict, List, Any, Optional, Tuple, Callable, Awaitable
+
+DEFAULT_BACKLOG = 1000
+SUBSCRIBER_QUEUE_SIZE = 1000
+LINE_LIMIT = 4 * 1024 * 1024
+
+TASK = 'task'
+RESYNC = 'resync'
+SUBSCRIBE = 'subscribe'
+
+
+def parse_address(address: str) -> Tuple[str, Any]:
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+
+    address = address.split('://', 1)[-1]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+class TaskChannelPublisher:
+    def __init__(self, address: str, latest_seq: int = 0, backlog: int = DEFAULT_BACKLOG):
+        self.address = address
+        self.latest_seq = latest_seq
+        self.backlog: deque = deque(maxlen=backlog)
+        self.subscribers: Dict[asyncio.StreamWriter, asyncio.Queue] = {}
+        self.server = None
+        self.published = 0
+        self.dropped = 0
+
+    async def start(self) -> None:
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            self.server = await asyncio.start_unix_server(self.handle_subscriber, path=target, limit=LINE_LIMIT)
+        else:
+            self.server = await asyncio.start_server(self.handle_subscriber, *target, limit=LINE_LIMIT)
+        print(f"Канал заказов открыт: {self.address}")
+
+    async def stop(self) -> None:
+        if self.server is None:
+            return
+
+        self.server.close()
+        for queue in list(self.subscribers.values()):
+            self.disconnect(queue)
+        await self.server.wait_closed()
+        self.server = None
+        print("Канал заказов закрыт")
+
+    def publish(self, seq: int, task: Dict[str, Any]) -> None:
+        message = encode({'type': TASK, 'seq': seq, 'task': task})
+        self.backlog.append((seq, message))
+        self.latest_seq = max(self.latest_seq, seq)
+        self.published += 1
+
+        for writer, queue in list(self.subscribers.items()):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self.dropped += 1
+                print("Подписчик канала не успевает читать заказы, соединение будет закрыто")
+                self.subscribers.pop(writer, None)
+                self.disconnect(queue)
+
+    def disconnect(self, queue: asyncio.Queue) -> None:
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(None)
+
+    def replay(self, cursor: int) -> Optional[List[bytes]]:
+        if cursor >= self.latest_seq:
+            return []
+        if self.backlog and cursor >= self.backlog[0][0] - 1:
+            return [message for seq, message in self.backlog if seq > cursor]
+        return None
+
+    async def handle_subscriber(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        try:
+            hello = json.loads(await reader.readline() or b'{}')
+            cursor = int(hello.get('cursor') or 0) if hello.get('type') == SUBSCRIBE else 0
+
+            backlog = self.replay(cursor)
+            if backlog is None:
+                writer.write(encode({'type': RESYNC, 'seq': self.latest_seq}))
+            else:
+                writer.writelines(backlog)
+            self.subscribers[writer] = queue
+            print(f"Подписчик канала подключен с заказа #{cursor}, подписчиков: {len(self.subscribers)}")
+
+            while True:
+                batch = [await queue.get()]
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                if None in batch:
+                    return
+                writer.writelines(batch)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+
+class TaskChannelSubscriber:
+    def __init__(self, address: str, cursor: int,
+                 on_task: Callable[[Dict[str, Any]], Awaitable[None]],
+                 on_resync: Callable[[], Awaitable[None]],
+                 min_delay: float = 1.0, max_delay: float = 30.0):
+        self.address = address
+        self.cursor = cursor
+        self.on_task = on_task
+        self.on_resync = on_resync
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.connected = False
+        self.received = 0
+        self.resyncs = 0
+
+    async def connect(self) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        kind, target = parse_address(self.address)
+        if kind == 'unix':
+            return await asyncio.open_unix_connection(target, limit=LINE_LIMIT)
+        return await asyncio.open_connection(*target, limit=LINE_LIMIT)
+
+    async def run(self) -> None:
+        delay = self.min_delay
+        while True:
+            try:
+                reader, writer = await self.connect()
+            except OSError as e:
+                print(f"Канал заказов недоступен ({e}), заказы читаются из журнала, повтор через {delay:.0f} с")
+                await self.on_resync()
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_delay)
+                continue
+
+            delay = self.min_delay
+            self.connected = True
+            print(f"Подключен к каналу заказов {self.address}, курсор #{self.cursor}")
+            try:
+                writer.write(encode({'type': SUBSCRIBE, 'cursor': self.cursor}))
+                await writer.drain()
+                await self.consume(reader)
+                print("Канал заказов закрыт издателем")
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                print(f"Соединение с каналом заказов потеряно: {e}")
+            finally:
+                self.connected = False
+                writer.close()
+
+            await self.on_resync()
+            await asyncio.sleep(delay)
+
+    async def consume(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+
+            try:
+                message = json.loads(line)
+            except ValueError as e:
+                print(f"Пропущено поврежденное сообщение канала: {e}")
+                continue
+
+            if message.get('type') == RESYNC:
+                self.resyncs += 1
+                print(f"Канал не хранит заказы после #{self.cursor}, синхронизация по журналу")
+                await self.on_resync()
+                self.cursor = max(self.cursor, int(message.get('seq') or 0))
+            elif message.get('type') == TASK:
+                seq = int(message.get('seq') or 0)
+                if seq <= self.cursor:
+                    continue
+                self.received += 1
+                await self.on_task(message['task'])
+                self.cursor = seq
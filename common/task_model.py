@@ -0,0 +1,128 @@
+import re
+import sys
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple
+
+FIELDS = (
+    'id', 'seq', 'title', 'description', 'full_description', 'url', 'price', 'price_text', 'payment_type',
+    'posted_time', 'views', 'responses', 'publication_date', 'published_ts', 'parsed_at', 'processed_at',
+    'simhash', 'listing_simhash', 'cluster_id', 'near_duplicate_of', 'trace'
+)
+FIELD_SET = frozenset(FIELDS)
+DEFAULTS: Dict[str, Any] = {
+    'id': '', 'title': '', 'description': '', 'full_description': '', 'url': '', 'price': 0,
+    'price_text': '', 'payment_type': 'unknown', 'posted_time': '', 'publication_date': ''
+}
+
+HOURLY_MARKERS = ('₽/час', 'р/час', 'руб/час', 'р/ч')
+FIXED_MARKERS = ('/заказ', 'за проект')
+DATE_PATTERN = re.compile(r'(\d{2}\.\d{2}\.\d{4})\s*\|\s*(\d{2}:\d{2})')
+NUMBER_PATTERN = re.compile(r'\d+')
+
+
+def parse_price(price_text: str) -> Tuple[int, str]:
+    text = price_text.lower()
+    if 'договоренности' in text:
+        return 0, 'negotiated'
+
+    digits = ''.join(filter(str.isdigit, text.split('—')[0] if '—' in text else text))
+    if not digits:
+        return 0, 'unknown'
+
+    if any(marker in text for marker in HOURLY_MARKERS):
+        return int(digits), 'hourly'
+    return int(digits), 'fixed'
+
+
+def parse_count(text: Any) -> Optional[int]:
+    if isinstance(text, int) or text is None:
+        return text
+    match = NUMBER_PATTERN.search(str(text).replace(' ', '').replace('\xa0', ''))
+    return int(match.group()) if match else None
+
+
+def publication_timestamp(task: Any) -> float:
+    published_ts = task.get('published_ts')
+    if isinstance(published_ts, (int, float)):
+        return float(published_ts)
+
+    match = DATE_PATTERN.search(task.get('publication_date') or '')
+    if match:
+        try:
+            return datetime.strptime(' '.join(match.groups()), "%d.%m.%Y %H:%M").timestamp()
+        except ValueError:
+            pass
+
+    try:
+        return datetime.fromisoformat(task.get('processed_at') or '').timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class Task:
+    __slots__ = FIELDS + ('extra',)
+
+    def __init__(self, id: str = '', title: str = '', price_text: str = '', **fields):
+        for name in FIELDS:
+            setattr(self, name, fields.pop(name, DEFAULTS.get(name)))
+        self.id = id
+        self.title = title
+        self.price_text = price_text
+        self.extra = fields or None
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any], task_id: Optional[str] = None) -> 'Task':
+        task = cls.__new__(cls)
+        for name in FIELDS:
+            value = record.get(name)
+            setattr(task, name, DEFAULTS.get(name) if value is None else value)
+        if task_id is not None:
+            task.id = task_id
+
+        if not isinstance(task.price, int):
+            task.price = parse_count(task.price) or 0
+        task.views = parse_count(task.views)
+        task.responses = parse_count(task.responses)
+        task.payment_type = sys.intern(task.payment_type)
+        task.published_ts = publication_timestamp(task)
+
+        extra = {key: value for key, value in record.items() if key not in FIELD_SET}
+        task.extra = extra or None
+        return task
+
+    def to_record(self, with_id: bool = True) -> Dict[str, Any]:
+        record = {}
+        for name in FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                record[name] = value
+        if not with_id:
+            del record['id']
+        if self.extra:
+            for key, value in self.extra.items():
+                record.setdefault(key, value)
+        return record
+
+    def get(self, name: str, default: Any = None) -> Any:
+        if name in FIELD_SET:
+            value = getattr(self, name)
+        else:
+            value = self.extra.get(name) if self.extra else None
+        return default if value is None else value
+
+    def __getitem__(self, name: str) -> Any:
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __eq__(self, other: Any) -> bool:
+        if not isinstance(other, Task):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self) -> str:
+        return f"Task(id={self.id!r}, seq={self.seq!r}, title={self.title!r}, price={self.price!r})"
@@ -0,0 +1,122 @@
+import time
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from common.metrics import REGISTRY
+
+POSTED = 'posted'
+DISCOVERED = 'discovered'
+DETAILS_FETCHED = 'details_fetched'
+PERSISTED = 'persisted'
+INGESTED = 'ingested'
+SUMMARIZED = 'summarized'
+DELIVERED = 'delivered'
+
+STAGES = [POSTED, DISCOVERED, DETAILS_FETCHED, PERSISTED, INGESTED, SUMMARIZED, DELIVERED]
+PARSER_STAGES = (DISCOVERED, DETAILS_FETCHED, PERSISTED)
+BOT_STAGES = (INGESTED, SUMMARIZED, DELIVERED)
+END_TO_END = 'end_to_end'
+
+STAGE_LABELS = {
+    POSTED: 'Публикация на FL.ru',
+    DISCOVERED: 'Обнаружен парсером',
+    DETAILS_FETCHED: 'Загружены детали',
+    PERSISTED: 'Сохранен в журнал',
+    INGESTED: 'Загружен ботом',
+    SUMMARIZED: 'Получено описание',
+    DELIVERED: 'Доставлен пользователю',
+    END_TO_END: 'Итого от публикации'
+}
+
+LATENCY_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200, 21600, 86400)
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'fl_task_stage_seconds', 'Время заказа на этапе, от предыдущего этапа до указанного', buckets=LATENCY_BUCKETS
+)
+END_TO_END_SECONDS = REGISTRY.histogram(
+    'fl_task_end_to_end_seconds', 'Время от публикации заказа на FL.ru до доставки пользователю', buckets=LATENCY_BUCKETS
+)
+
+
+def mark(task: Any, stage: str, timestamp: Optional[float] = None) -> float:
+    timestamp = timestamp if timestamp is not None else time.time()
+    if isinstance(task, dict):
+        task.setdefault('trace', {})[stage] = timestamp
+    else:
+        if task.trace is None:
+            task.trace = {}
+        task.trace[stage] = timestamp
+    return timestamp
+
+
+def stage_durations(trace: Dict[str, float]) -> List[Tuple[str, float]]:
+    durations = []
+    previous = None
+    for stage in STAGES:
+        timestamp = trace.get(stage)
+        if not timestamp:
+            continue
+        if previous is not None:
+            durations.append((stage, max(0.0, timestamp - previous)))
+        previous = timestamp
+    return durations
+
+
+def observe_trace(trace: Dict[str, float], stages: Iterable[str]) -> None:
+    stages = set(stages)
+    for stage, seconds in stage_durations(trace):
+        if stage in stages:
+            STAGE_SECONDS.observe(seconds, stage=stage)
+
+    if DELIVERED in stages and trace.get(POSTED) and trace.get(DELIVERED):
+        END_TO_END_SECONDS.observe(max(0.0, trace[DELIVERED] - trace[POSTED]))
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0.0
+
+
+def format_duration(seconds: float) -> str:
+    if seconds < 60:
+        return f"{seconds:.1f} с"
+    if seconds < 3600:
+        return f"{seconds / 60:.1f} мин"
+    return f"{seconds / 3600:.1f} ч"
+
+
+class TraceReport:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES[1:] + [END_TO_END]}
+        self.tasks = 0
+        self.deliveries = 0
+
+    def add(self, trace: Dict[str, float], delivered: Iterable[float] = ()) -> None:
+        self.tasks += 1
+        delivered = list(delivered)
+        if not delivered:
+            delivered = [None]
+
+        for position, delivered_at in enumerate(delivered):
+            full_trace = dict(trace)
+            if delivered_at is not None:
+                full_trace[DELIVERED] = delivered_at
+                self.deliveries += 1
+            for stage, seconds in stage_durations(full_trace):
+                if stage == DELIVERED or position == 0:
+                    self.samples[stage].append(seconds)
+            if delivered_at is not None and trace.get(POSTED):
+                self.samples[END_TO_END].append(max(0.0, delivered_at - trace[POSTED]))
+
+    def render(self) -> str:
+        lines = [
+            f"Заказов: {self.tasks}, доставок: {self.deliveries}",
+            f"{'Этап':<26}{'n':>7}{'p50':>11}{'p90':>11}{'p99':>11}{'макс':>11}"
+        ]
+        for stage, values in self.samples.items():
+            if not values:
+                continue
+            lines.append(
+                f"{STAGE_LABELS[stage]:<26}{len(values):>7}"
+                f"{format_duration(percentile(values, 0.5)):>11}{format_duration(percentile(values, 0.9)):>11}"
+                f"{format_duration(percentile(values, 0.99)):>11}{format_duration(max(values)):>11}"
+            )
+        return '\n'.join(lines)
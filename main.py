@@ -2,106 +2,256 @@
 import os
 import sys
 import time
+import random
+import shutil
+import signal
 import asyncio
-import threading
-import subprocess
+import argparse
+import tempfile
+from collections import deque
 from dotenv import load_dotenv
 from pathlib import Path
 
 load_dotenv()
 
+PROJECT_DIR = Path(__file__).resolve().parent
+
+from common.supervision import STATUS_DIR_ENV, READY, read_status
+from common.log_multiplexer import LogMultiplexer
+
+READY_TIMEOUT = 180
+CHECK_INTERVAL = 1
+STATUS_INTERVAL = 300
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+STABLE_UPTIME = 300
+CRASH_LOOP_RESTARTS = 5
+CRASH_LOOP_WINDOW = 600
+CRASH_LOOP_COOLDOWN = 600
+DIAGNOSTIC_LINES = 30
+
+STATE_LABELS = {
+    'starting': 'запускается',
+    'ready': 'работает',
+    'backoff': 'ожидает перезапуска',
+    'crash_loop': 'циклические падения',
+    'stopped': 'остановлен'
+}
+
+class Component:
+    def __init__(self, key, name, script, prefix, liveness_timeout):
+        self.key = key
+        self.name = name
+        self.script = PROJECT_DIR / script
+        self.prefix = prefix
+        self.liveness_timeout = liveness_timeout
+        self.process = None
+        self.output = None
+        self.state = 'stopped'
+        self.started_at = None
+        self.ready_at = None
+        self.restarts = 0
+        self.failures = deque()
+        self.last_exit = None
+        self.next_start = None
+
 class ProjectLauncher:
-    def __init__(self):
-        self.processes = {}
-        self.stop_event = threading.Event()
+    def __init__(self, log_level="INFO", log_dir=None, ring_size=500):
+        self.components = [
+            Component("parser", "Парсер FL.ru", "FL/parser.py", "[ПАРСЕР]", liveness_timeout=900),
+            Component("telegram_bot", "Telegram бот", "TelegramBot/bot.py", "[ТГ-БОТ]", liveness_timeout=120)
+        ]
+        self.status_dir = None
+        self.stop_event = None
+        self.log_level = log_level
+        self.log_dir = log_dir
+        self.ring_size = ring_size
+        self.logs = None
+    
+    async def spawn(self, component):
+        print(f"\n[ЗАПУСК] Запускаем {component.name}...")
         
-    def start_parser(self):
-        print("\n[ЗАПУСК] Запускаем парсер FL.ru...")
+        if not component.script.exists():
+            print(f"[ОШИБКА] Файл не найден: {component.script}")
+            return False
         
-        parser_path = Path("FL/parser.py").absolute()
-        if not parser_path.exists():
-            print(f"[ОШИБКА] Файл парсера не найден: {parser_path}")
-            return None
-            
         env = os.environ.copy()
         env["PYTHONIOENCODING"] = "utf-8"
+        env["PYTHONUNBUFFERED"] = "1"
+        env[STATUS_DIR_ENV] = self.status_dir
+        
+        try:
+            os.remove(os.path.join(self.status_dir, f"{component.key}.json"))
+        except OSError:
+            pass
         
         try:
-            process = subprocess.Popen(
-                [sys.executable, str(parser_path)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
+            component.process = await asyncio.create_subprocess_exec(
+                sys.executable, str(component.script),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
                 env=env,
-                cwd=os.path.dirname(parser_path)
+                cwd=str(component.script.parent)
             )
+        except Exception as e:
+            print(f"[КРИТИЧЕСКАЯ ОШИБКА] Не удалось запустить {component.name}: {e}")
+            return False
+        
+        component.state = 'starting'
+        component.started_at = time.time()
+        component.ready_at = None
+        component.output = asyncio.create_task(
+            self.logs.pump(component.key, component.prefix, component.process.stdout)
+        )
+        print(f"[ЗАПУЩЕН] {component.name} (PID: {component.process.pid}), ожидаем готовности...")
+        return True
+    
+    def heartbeat(self, component):
+        status = read_status(self.status_dir, component.key)
+        if status and status.get('pid') == component.process.pid:
+            return status
+        return None
+    
+    async def wait_ready(self, component):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if component.process.returncode is not None:
+                return False
             
-            self.processes["parser"] = process
-            print(f"[УСПЕХ] Парсер FL.ru запущен (PID: {process.pid})")
+            status = self.heartbeat(component)
+            if status and status.get('state') == READY:
+                component.state = 'ready'
+                component.ready_at = time.time()
+                print(f"[ГОТОВ] {component.name} готов к работе за {component.ready_at - component.started_at:.1f} с")
+                return True
             
-            threading.Thread(
-                target=self._read_output,
-                args=(process, "[ПАРСЕР]"),
-                daemon=True
-            ).start()
+            await asyncio.sleep(0.2)
+        
+        print(f"[ПРЕДУПРЕЖДЕНИЕ] {component.name} не сообщил о готовности за {READY_TIMEOUT} с")
+        return False
+    
+    async def watch(self, component):
+        while component.process.returncode is None:
+            status = self.heartbeat(component)
+            last_beat = status.get('last_beat', 0) if status else component.ready_at
+            if time.time() - last_beat > component.liveness_timeout:
+                print(f"[ЗАВИС] {component.name} не отвечает {time.time() - last_beat:.0f} с, перезапуск...")
+                return
             
-            return process
+            try:
+                await asyncio.wait_for(component.process.wait(), timeout=CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def terminate(self, component):
+        process = component.process
+        if process is None or process.returncode is not None:
+            return
+        
+        print(f"[ОСТАНОВКА] Останавливаем {component.name}...")
+        try:
+            process.terminate()
+            await asyncio.wait_for(process.wait(), timeout=5)
+            print(f"[ОСТАНОВЛЕН] {component.name} успешно остановлен")
+        except asyncio.TimeoutError:
+            print(f"[ПРИНУДИТЕЛЬНО] {component.name} не завершился, принудительное завершение...")
+            process.kill()
+            await process.wait()
+        except ProcessLookupError:
+            pass
         except Exception as e:
-            print(f"[КРИТИЧЕСКАЯ ОШИБКА] Не удалось запустить парсер: {e}")
-            return None
+            print(f"[ОШИБКА] Ошибка при остановке {component.name}: {e}")
     
-    def start_telegram_bot(self):
-        print("\n[ЗАПУСК] Запускаем Telegram бота...")
+    def restart_delay(self, component):
+        now = time.time()
+        uptime = now - (component.started_at or now)
+        if uptime >= STABLE_UPTIME:
+            component.failures.clear()
         
-        bot_path = Path("TelegramBot/bot.py").absolute()
-        if not bot_path.exists():
-            print(f"[ОШИБКА] Файл Telegram бота не найден: {bot_path}")
-            return None
+        component.failures.append(now)
+        while component.failures and now - component.failures[0] > CRASH_LOOP_WINDOW:
+            component.failures.popleft()
         
-        env = os.environ.copy()
-        env["PYTHONIOENCODING"] = "utf-8"
+        if len(component.failures) >= CRASH_LOOP_RESTARTS:
+            component.state = 'crash_loop'
+            component.failures.clear()
+            print(f"\n[ЦИКЛИЧЕСКИЕ ПАДЕНИЯ] {component.name} упал {CRASH_LOOP_RESTARTS} раз за "
+                  f"{CRASH_LOOP_WINDOW // 60} мин. Следующая попытка через {CRASH_LOOP_COOLDOWN // 60} мин")
+            return CRASH_LOOP_COOLDOWN
         
-        try:
-            process = subprocess.Popen(
-                [sys.executable, str(bot_path)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                text=True,
-                bufsize=1,
-                env=env,
-                cwd=os.path.dirname(bot_path)
-            )
+        component.state = 'backoff'
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (len(component.failures) - 1))
+        return delay * random.uniform(0.8, 1.2)
+    
+    async def supervise(self, component):
+        while not self.stop_event.is_set():
+            if await self.spawn(component):
+                if await self.wait_ready(component):
+                    await self.watch(component)
+                await self.terminate(component)
+                component.last_exit = component.process.returncode
+                if not self.stop_event.is_set():
+                    await self.print_diagnostics(component)
             
-            self.processes["telegram_bot"] = process
-            print(f"[УСПЕХ] Telegram бот запущен (PID: {process.pid})")
+            if self.stop_event.is_set():
+                break
             
-            threading.Thread(
-                target=self._read_output,
-                args=(process, "[ТГ-БОТ]"),
-                daemon=True
-            ).start()
+            delay = self.restart_delay(component)
+            component.next_start = time.time() + delay
+            print(f"[ПЕРЕЗАПУСК] {component.name} будет перезапущен через {delay:.1f} с")
+            try:
+                await asyncio.wait_for(self.stop_event.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                component.restarts += 1
+            component.next_start = None
+    
+    async def print_diagnostics(self, component):
+        if component.output is not None:
+            await asyncio.wait([component.output], timeout=1)
+        self.logs.flush_console()
+        
+        print(f"\n[ПРЕДУПРЕЖДЕНИЕ] {component.name} завершился с кодом {component.last_exit}")
+        lines = self.logs.recent(component.key, DIAGNOSTIC_LINES)
+        if lines:
+            print(f"[ДИАГНОСТИКА] Последние строки вывода ({len(lines)}):")
+            for line in lines:
+                print(f"  {line}")
+    
+    def format_age(self, seconds):
+        if seconds is None:
+            return "—"
+        seconds = int(seconds)
+        return f"{seconds // 3600}ч {seconds % 3600 // 60}м {seconds % 60}с"
+    
+    def print_status(self):
+        now = time.time()
+        print(f"\n{'='*50}")
+        print("СОСТОЯНИЕ КОМПОНЕНТОВ:")
+        print(f"{'='*50}")
+        for component in self.components:
+            print(f"{component.name}: {STATE_LABELS.get(component.state, component.state)}")
+            running = component.process is not None and component.process.returncode is None
+            if running:
+                print(f"  • PID: {component.process.pid}")
+            if running and component.ready_at:
+                print(f"  • Время работы: {self.format_age(now - component.ready_at)}")
+            print(f"  • Перезапусков: {component.restarts}")
+            if component.last_exit is not None:
+                print(f"  • Последний код завершения: {component.last_exit}")
+            if component.next_start:
+                print(f"  • Перезапуск через: {self.format_age(component.next_start - now)}")
             
-            return process
-        except Exception as e:
-            print(f"[КРИТИЧЕСКАЯ ОШИБКА] Не удалось запустить Telegram бота: {e}")
-            return None
+            status = self.heartbeat(component) if running else None
+            if status:
+                print(f"  • Последний сигнал активности: {self.format_age(now - status['last_beat'])} назад")
+                for key, value in status.get('details', {}).items():
+                    print(f"  • {key}: {value}")
+        print(f"{'='*50}")
     
-    def _read_output(self, process, prefix):
-        try:
-            for line in iter(process.stdout.readline, ''):
-                if self.stop_event.is_set():
-                    break
-                if line:
-                    try:
-                        print(f"{prefix} {line.rstrip()}")
-                    except UnicodeEncodeError:
-                        try:
-                            print(f"{prefix} {line.encode('cp866', errors='replace').decode('cp866', errors='replace').rstrip()}")
-                        except:
-                            print(f"{prefix} [Ошибка отображения строки вывода]")
-        except Exception as e:
-            print(f"{prefix} [ОШИБКА ЧТЕНИЯ] {e}")
+    async def report_status(self):
+        while True:
+            await asyncio.sleep(STATUS_INTERVAL)
+            self.print_status()
     
     def start_all(self):
         print("\n=== ЗАПУСК КОМПОНЕНТОВ ПРОЕКТА ===")
@@ -114,70 +264,161 @@ class ProjectLauncher:
             print("[РЕКОМЕНДАЦИЯ] Переместите проект в директорию с латинскими символами в пути (например, C:\\Projects\\FLParser).")
             print("[ИНФОРМАЦИЯ] Попытка запуска будет продолжена, но могут возникнуть ошибки.\n")
         
-        parser = self.start_parser()
-        time.sleep(2)
-        
-        bot = self.start_telegram_bot()
-        time.sleep(2)
+        try:
+            asyncio.run(self.run_supervisor())
+        except KeyboardInterrupt:
+            pass
         
-        components = {
-            "Парсер FL.ru": parser,
-            "Telegram бот": bot,
-        }
+        print("\n=== ВСЕ КОМПОНЕНТЫ ОСТАНОВЛЕНЫ ===")
+    
+    async def run_supervisor(self):
+        self.status_dir = tempfile.mkdtemp(prefix="fl_scout_status_")
+        self.stop_event = asyncio.Event()
+        self.logs = LogMultiplexer(level=self.log_level, ring_size=self.ring_size, log_dir=self.log_dir)
+        self.logs.start()
+        if self.log_dir:
+            print(f"[ИНФОРМАЦИЯ] Логи компонентов записываются в {self.log_dir}")
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signal_number, self.stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
         
-        failed_components = [name for name, proc in components.items() if proc is None]
+        supervisors = [asyncio.create_task(self.supervise(component)) for component in self.components]
+        reporter = asyncio.create_task(self.report_status())
         
-        if failed_components:
-            print("\n[ПРЕДУПРЕЖДЕНИЕ] Не удалось запустить следующие компоненты:")
-            for name in failed_components:
-                print(f"  - {name}")
-            print("\nРекомендации:")
-            print("1. Проверьте наличие всех необходимых файлов")
-            print("2. Установите требуемые зависимости: pip install -r requirements.txt")
-            print("3. Переместите проект в директорию без кириллицы в пути")
-        else:
-            print("\n[УСПЕХ] Все компоненты успешно запущены!")
+        try:
+            ready = await asyncio.gather(*(self.wait_started(component) for component in self.components))
+            if all(ready):
+                print("\n[УСПЕХ] Все компоненты успешно запущены!")
+            else:
+                print("\n[ПРЕДУПРЕЖДЕНИЕ] Не удалось запустить следующие компоненты:")
+                for component, started in zip(self.components, ready):
+                    if not started:
+                        print(f"  - {component.name}")
+                print("\nРекомендации:")
+                print("1. Проверьте наличие всех необходимых файлов")
+                print("2. Установите требуемые зависимости: pip install -r requirements.txt")
+                print("3. Переместите проект в директорию без кириллицы в пути")
+                print("Компоненты будут перезапускаться автоматически")
+            
+            self.print_status()
+            print("Нажмите Ctrl+C для остановки всех процессов")
+            await self.stop_event.wait()
+        finally:
+            self.stop_all()
+            for task in (*supervisors, reporter):
+                task.cancel()
+            await asyncio.gather(*supervisors, reporter, return_exceptions=True)
+            for component in self.components:
+                await self.terminate(component)
+                component.state = 'stopped'
+            await asyncio.gather(
+                *(component.output for component in self.components if component.output is not None),
+                return_exceptions=True
+            )
+            await self.logs.close()
+            shutil.rmtree(self.status_dir, ignore_errors=True)
+    
+    async def wait_started(self, component):
+        while component.state != 'ready':
+            if component.state in ('backoff', 'crash_loop') or self.stop_event.is_set():
+                return False
+            await asyncio.sleep(0.2)
+        return True
+    
+    def start_single_process(self, queue_size=1000):
+        print("\n=== ЗАПУСК КОМПОНЕНТОВ В ОДНОМ ПРОЦЕССЕ ===")
+        print(f"[ИНФОРМАЦИЯ] Размер очереди заказов: {queue_size}")
         
-        print("\n=== ВСЕ КОМПОНЕНТЫ ЗАПУЩЕНЫ ===")
-        print("Нажмите Ctrl+C для остановки всех процессов")
+        sys.path.insert(0, str(PROJECT_DIR / "FL"))
+        sys.path.insert(0, str(PROJECT_DIR / "TelegramBot"))
+        sys.path.append(str(PROJECT_DIR))
+        os.chdir(PROJECT_DIR / "TelegramBot")
         
         try:
-            while True:
-                for name, process in list(self.processes.items()):
-                    if process.poll() is not None:
-                        print(f"\n[ПРЕДУПРЕЖДЕНИЕ] Процесс {name} завершился с кодом {process.poll()}")
-                        del self.processes[name]
-                
-                if not self.processes:
-                    print("\n[ПРЕДУПРЕЖДЕНИЕ] Все процессы завершились. Программа будет остановлена.")
-                    break
-                    
-                time.sleep(1)
+            asyncio.run(self.run_single_process(queue_size))
         except KeyboardInterrupt:
-            self.stop_all()
+            pass
+        
+        print("\n=== ВСЕ КОМПОНЕНТЫ ОСТАНОВЛЕНЫ ===")
     
-    def stop_all(self):
-        print("\n\n=== ОСТАНОВКА КОМПОНЕНТОВ ПРОЕКТА ===")
-        self.stop_event.set()
+    async def run_single_process(self, queue_size):
+        from FL.parser import ParserManager
+        from bot import FLNotifyBot
+        
+        task_queue = asyncio.Queue(maxsize=queue_size)
+        bot = FLNotifyBot(task_queue=task_queue)
+        application = bot.build_application()
+        manager = ParserManager(task_queue=task_queue)
         
-        for name, process in self.processes.items():
-            print(f"[ОСТАНОВКА] Останавливаем {name}...")
+        stop_event = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
             try:
-                process.terminate()
-                process.wait(timeout=5)
-                print(f"[ОСТАНОВЛЕН] {name} успешно остановлен")
-            except subprocess.TimeoutExpired:
-                print(f"[ПРИНУДИТЕЛЬНО] {name} не завершился, принудительное завершение...")
-                process.kill()
-            except Exception as e:
-                print(f"[ОШИБКА] Ошибка при остановке {name}: {e}")
+                loop.add_signal_handler(signal_number, stop_event.set)
+            except (NotImplementedError, RuntimeError):
+                pass
         
-        print("\n=== ВСЕ КОМПОНЕНТЫ ОСТАНОВЛЕНЫ ===")
+        bot_task = asyncio.create_task(bot.serve(application, stop_event))
+        parser_task = asyncio.create_task(manager.run_parser())
+        stop_task = asyncio.create_task(stop_event.wait())
+        print("[УСПЕХ] Парсер и Telegram бот запущены в одном процессе")
+        print("Нажмите Ctrl+C для остановки")
+        
+        try:
+            done, _ = await asyncio.wait(
+                {bot_task, parser_task, stop_task},
+                return_when=asyncio.FIRST_COMPLETED
+            )
+            for name, task in (("Парсер FL.ru", parser_task), ("Telegram бот", bot_task)):
+                if task in done:
+                    error = task.exception()
+                    print(f"\n[ПРЕДУПРЕЖДЕНИЕ] {name} завершился{f' с ошибкой: {error}' if error else ''}")
+        finally:
+            print("\n\n=== ОСТАНОВКА КОМПОНЕНТОВ ПРОЕКТА ===")
+            manager.is_running = False
+            parser_task.cancel()
+            await asyncio.gather(parser_task, return_exceptions=True)
+            await manager.parser.close_session()
+            print("[ОСТАНОВЛЕН] Парсер FL.ru остановлен")
+            
+            if not bot_task.done():
+                try:
+                    await asyncio.wait_for(task_queue.join(), timeout=10)
+                except asyncio.TimeoutError:
+                    print(f"[ПРЕДУПРЕЖДЕНИЕ] В очереди остались необработанные заказы: {task_queue.qsize()}")
+            
+            stop_event.set()
+            stop_task.cancel()
+            await asyncio.gather(bot_task, stop_task, return_exceptions=True)
+            print("[ОСТАНОВЛЕН] Telegram бот остановлен")
+    
+    def stop_all(self):
+        print("\n\n=== ОСТАНОВКА КОМПОНЕНТОВ ПРОЕКТА ===")
+        if self.stop_event is not None:
+            self.stop_event.set()
 
 if __name__ == "__main__":
+    argument_parser = argparse.ArgumentParser(description="Запуск парсера FL.ru и Telegram бота")
+    argument_parser.add_argument("--single-process", action="store_true",
+                                 help="Запустить парсер и бота в одном процессе с общей очередью заказов")
+    argument_parser.add_argument("--queue-size", type=int, default=1000,
+                                 help="Размер очереди заказов между парсером и ботом")
+    argument_parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"],
+                                 help="Минимальный уровень строк вывода компонентов в консоли")
+    argument_parser.add_argument("--log-dir", help="Каталог для файлов логов компонентов с ротацией")
+    argument_parser.add_argument("--log-ring", type=int, default=500,
+                                 help="Сколько последних строк каждого компонента хранить для диагностики")
+    args = argument_parser.parse_args()
+    
     try:
-        launcher = ProjectLauncher()
-        launcher.start_all()
+        launcher = ProjectLauncher(args.log_level, args.log_dir, args.log_ring)
+        if args.single_process:
+            launcher.start_single_process(args.queue_size)
+        else:
+            launcher.start_all()
     except Exception as e:
         print(f"\n[КРИТИЧЕСКАЯ ОШИБКА] Произошла непредвиденная ошибка: {e}")
         import traceback
@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+sys.path.insert(0, os.path.join(PROJECT_DIR, 'TelegramBot'))
+
+from database import Database
+
+
+class LegacyCursorMigrationTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, 'user_data.db')
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            keywords TEXT,
+            price_filters TEXT,
+            price_min INTEGER DEFAULT 0,
+            notifications_enabled INTEGER DEFAULT 0,
+            last_sent_id TEXT
+        )
+        ''')
+        conn.executemany(
+            'INSERT INTO users (user_id, keywords, price_filters, notifications_enabled, last_sent_id) '
+            'VALUES (?, ?, ?, 1, ?)',
+            [(1, '["python"]', '["any"]', 'task_2'), (2, '[]', '["any"]', 'task_missing'), (3, '[]', '["any"]', None)]
+        )
+        conn.commit()
+        conn.close()
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_pending_tasks_survive_upgrade(self):
+        self.db = Database(self.db_path)
+        self.assertIsNone(self.db.get_user_settings(1)['last_sent_seq'])
+
+        records = [{'id': f'task_{index}', 'title': f'Заказ {index}', 'price_text': '1000 ₽'} for index in range(1, 6)]
+        self.db.ingest_tasks(records)
+
+        seqs = {task_id: seq for seq, task_id in self.db.connection.execute('SELECT seq, task_id FROM tasks')}
+        self.assertEqual(self.db.get_user_settings(1)['last_sent_seq'], seqs['task_2'])
+        self.assertEqual(self.db.get_user_settings(2)['last_sent_seq'], seqs['task_5'])
+        self.assertIsNone(self.db.get_user_settings(3)['last_sent_seq'])
+
+        pending = self.db.connection.execute(
+            'SELECT task_id FROM tasks WHERE seq > ? ORDER BY seq', (seqs['task_2'],)
+        ).fetchall()
+        self.assertEqual([row[0] for row in pending], ['task_3', 'task_4', 'task_5'])
+
+
+if __name__ == '__main__':
+    unittest.main()